@@ -0,0 +1,106 @@
+"""
+EdgeZLib decode benchmark: in-app decoder (serial / threaded) vs `hdk compress d`.
+
+    python benchmarks/bench_edgezlib.py [--size-mb 64] [--hdk path/to/hdk] [--input file]
+
+With --hdk the sample is compressed by hdk itself, so the run also checks
+that the Python decoder reads hdk's output byte-for-byte.
+"""
+import argparse
+import os
+import random
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import hdk_engine as hdk  # noqa: E402
+
+
+def make_sample(size):
+    """Mixed, moderately compressible data (XML-ish text with binary runs)."""
+    rng = random.Random(1234)
+    words = [b"<Object", b"name=", b"\"texture\"", b"/>", b"local:USRDIR/", b"0.000000", b"\n"]
+    out = bytearray()
+    while len(out) < size:
+        if rng.random() < 0.2:
+            out += rng.randbytes(rng.randint(16, 512))
+        else:
+            out += b" ".join(rng.choice(words) for _ in range(rng.randint(4, 40)))
+    return bytes(out[:size])
+
+
+def edgezlib_compress(data):
+    """Reference encoder matching hdk_engine.edgezlib_segments()."""
+    out = bytearray()
+    for i in range(0, len(data), hdk.EDGEZLIB_SEGMENT_SIZE):
+        seg = data[i:i + hdk.EDGEZLIB_SEGMENT_SIZE]
+        c = zlib.compressobj(9, zlib.DEFLATED, -15)
+        comp = c.compress(seg) + c.flush()
+        if len(comp) >= len(seg):
+            comp = seg
+        out += struct.pack('>HH', len(comp) & 0xFFFF, len(seg) & 0xFFFF) + comp
+    return bytes(out)
+
+
+def timed(label, fn, raw_size, repeat=3):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"  {label:<28} {best * 1000:9.1f} ms   {raw_size / best / 1e6:8.1f} MB/s")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--hdk", help="hdk binary to compare against (and to produce the sample)")
+    parser.add_argument("--input", help="existing EdgeZLib file instead of a synthetic sample")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        raw_path = os.path.join(tmp, "sample.raw")
+        comp_path = os.path.join(tmp, "sample.edgezlib")
+        out_path = os.path.join(tmp, "sample.out")
+
+        if args.input:
+            comp_path = args.input
+            raw = None
+        else:
+            raw = make_sample(args.size_mb * 1024 * 1024)
+            with open(raw_path, 'wb') as f:
+                f.write(raw)
+            if args.hdk:
+                subprocess.run([args.hdk, "compress", "c", "-a", "zlib", "-i", raw_path, "-o", comp_path], check=True)
+            else:
+                with open(comp_path, 'wb') as f:
+                    f.write(edgezlib_compress(raw))
+
+        with open(comp_path, 'rb') as f:
+            comp = f.read()
+        decoded = hdk.edgezlib_decompress(comp)
+        if raw is not None and decoded != raw:
+            sys.exit("Decoder output does not match the original sample!")
+
+        segments = len(hdk.edgezlib_segments(comp))
+        print(f"Input: {hdk.format_size(len(comp))} compressed, {hdk.format_size(len(decoded))} raw, "
+              f"{segments} segments, {os.cpu_count()} CPUs")
+
+        timed("python, 1 thread", lambda: hdk.edgezlib_decompress(comp, workers=1), len(decoded), args.repeat)
+        timed(f"python, {hdk.DECODE_WORKERS} threads", lambda: hdk.edgezlib_decompress(comp), len(decoded), args.repeat)
+        timed("python, stream to disk", lambda: hdk.edgezlib_decompress_file(comp_path, out_path), len(decoded), args.repeat)
+        if args.hdk:
+            timed("hdk compress d", lambda: subprocess.run(
+                [args.hdk, "compress", "d", "-a", "zlib", "-i", comp_path, "-o", out_path],
+                check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL), len(decoded), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Orchestration benchmark: the launcher's own overhead around the external tools.
+
+    python benchmarks/bench_orchestration.py [--files 2000] [--luac 500] [--latency 0.005]
+                                             [--output-kb 4] [--out results.json] [--compare old.json]
+
+Builds a synthetic scene tree (every asset type Auto-Optimize compresses, plus
+fake .luac files) and stub `hdk`, `hdk-resharc` and `java` executables that
+sleep for --latency seconds and print --output-kb of output. Then it times
+batch compress, LUAC decompile, Re-SHARC, keyword search, tree export and
+console logging. Stub latency is known, so whatever remains is orchestration
+cost. Results are JSON (--out) and --compare prints the change against an
+earlier run.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import hdk_engine as hdk  # noqa: E402
+
+STUB = r'''#!{python}
+import os, shutil, sys, time
+args = sys.argv[1:]
+time.sleep(float(os.environ.get("BENCH_STUB_LATENCY", "0")))
+volume = int(os.environ.get("BENCH_STUB_OUTPUT", "0"))
+tool = {tool!r}
+if tool == "java":
+    sys.stdout.write("-- decompiled\n" + "local save_data = load()\n" * (volume // 25 + 1))
+elif tool == "resharc":
+    for path in args:
+        base = os.path.splitext(path)[0]
+        shutil.copyfile(path, base + ".normalized.sdat")
+        open(base + ".normalized.txt", "w").write(str(time.time()))
+elif args[:1] == ["--version"]:
+    print("hdk 0.0.0-bench")
+elif args[:1] == ["compress"]:
+    shutil.copyfile(args[args.index("-i") + 1], args[args.index("-o") + 1])
+    sys.stdout.write("." * volume)
+else:
+    sys.stdout.write("." * volume)
+'''
+
+
+def make_stubs(bin_dir):
+    """Write the stub tools. Returns {'hdk': path, 'resharc': path}; `java` is found through PATH."""
+    os.makedirs(bin_dir, exist_ok=True)
+    paths = {}
+    for tool, name in (("hdk", "hdk"), ("resharc", "hdk-resharc"), ("java", "java")):
+        script = os.path.join(bin_dir, name + (".py" if hdk.IS_WINDOWS else ""))
+        with open(script, 'w', encoding='utf-8') as f:
+            f.write(STUB.format(python=sys.executable, tool=tool))
+        os.chmod(script, 0o755)
+        if hdk.IS_WINDOWS:
+            wrapper = os.path.join(bin_dir, name + ".cmd")
+            with open(wrapper, 'w', encoding='utf-8') as f:
+                f.write(f'@"{sys.executable}" "{script}" %*\n')
+            script = wrapper
+        paths[tool] = script
+    return paths
+
+
+def make_tree(root, files, luac, file_kb, seed=1234):
+    """Synthetic scene: `files` assets spread over nested folders plus `luac` scripts. Returns total bytes."""
+    rng = random.Random(seed)
+    extensions = list(hdk.COMPRESSIBLE_EXTENSIONS) + [""]
+    total = 0
+    for i in range(files + luac):
+        folder = os.path.join(root, "USRDIR", f"zone{i % 8}", f"set{i % 37}")
+        os.makedirs(folder, exist_ok=True)
+        ext = ".luac" if i >= files else extensions[i % len(extensions)]
+        size = max(64, int(rng.expovariate(1 / (file_kb * 1024))))
+        with open(os.path.join(folder, f"asset{i:05d}{ext}"), 'wb') as f:
+            f.write(rng.randbytes(size))
+        total += size
+    return total
+
+
+def process_latencies(telemetry_path, op):
+    walls = [r['wall'] for r in hdk.read_journal(telemetry_path)
+             if r.get('type') == 'process' and r.get('op') == op]
+    if not walls:
+        return {}
+    walls.sort()
+    return {'process_mean_ms': round(statistics.mean(walls) * 1000, 2),
+            'process_p50_ms': round(walls[len(walls) // 2] * 1000, 2),
+            'process_p95_ms': round(walls[int(len(walls) * 0.95)] * 1000, 2)}
+
+
+def measure(name, fn, items, nbytes=0, stub_latency=0.0, workers=1):
+    started = time.perf_counter()
+    fn()
+    wall = time.perf_counter() - started
+    result = {'bench': name, 'wall_s': round(wall, 4), 'items': items,
+              'items_per_s': round(items / wall, 1) if wall else None,
+              'bytes_per_s': round(nbytes / wall) if wall and nbytes else None}
+    if stub_latency and items:
+        # Time per item beyond the stub's own sleep: process spawn + Python bookkeeping
+        result['overhead_ms_per_item'] = round((wall * workers / items - stub_latency) * 1000, 2)
+    print(f"  {name:<22} {wall:8.2f} s  {result['items_per_s'] or 0:9.1f} items/s"
+          + (f"  {result['overhead_ms_per_item']:7.2f} ms overhead/item" if 'overhead_ms_per_item' in result else ""))
+    return result
+
+
+def bench_console(lines):
+    """Insert `lines` log lines into a Tk text widget like the launcher's console (needs a display)."""
+    try:
+        import tkinter as tk
+        from tkinter import scrolledtext
+        root = tk.Tk()
+    except Exception as e:
+        print(f"  {'console logging':<22} skipped ({e.__class__.__name__}: no display)")
+        return {'bench': 'console logging', 'skipped': str(e)}
+    root.withdraw()
+    console = scrolledtext.ScrolledText(root, height=10)
+    console.tag_configure("success", foreground="#44ff44")
+
+    def run():
+        for i in range(lines):
+            console.insert(tk.END, f"  Decompiled: USRDIR/zone{i % 8}/asset{i:05d}.luac\n", "success")
+            console.see(tk.END)
+        root.update()
+
+    result = measure("console logging", run, lines)
+    root.destroy()
+    return result
+
+
+def compare(results, previous_path):
+    with open(previous_path, 'r', encoding='utf-8') as f:
+        previous = {r['bench']: r for r in json.load(f)['results']}
+    print(f"\nChange vs {previous_path} (wall time, negative is faster):")
+    for r in results:
+        old = previous.get(r['bench'])
+        if old and old.get('wall_s') and r.get('wall_s'):
+            print(f"  {r['bench']:<22} {(r['wall_s'] / old['wall_s'] - 1) * 100:+7.1f} %")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=2000, help="assets to compress")
+    parser.add_argument("--luac", type=int, default=500, help="fake .luac scripts")
+    parser.add_argument("--file-kb", type=float, default=8, help="mean synthetic file size")
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds each stub call sleeps")
+    parser.add_argument("--output-kb", type=float, default=4, help="stdout volume of each stub call")
+    parser.add_argument("--workers", type=int, default=4, help="LUAC decompile workers")
+    parser.add_argument("--log-lines", type=int, default=5000)
+    parser.add_argument("--out", help="write results as JSON here")
+    parser.add_argument("--compare", help="earlier --out file to compare against")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="hdk-bench-") as tmp:
+        # Keep journals and telemetry of the run out of the real hdk_cache
+        hdk.JOBS_DIR = os.path.join(tmp, "jobs")
+        hdk.TELEMETRY_FILE = os.path.join(tmp, "telemetry.jsonl")
+        stubs = make_stubs(os.path.join(tmp, "bin"))
+        os.environ["PATH"] = os.path.dirname(stubs['hdk']) + os.pathsep + os.environ.get("PATH", "")
+        os.environ["BENCH_STUB_LATENCY"] = str(args.latency)
+        os.environ["BENCH_STUB_OUTPUT"] = str(int(args.output_kb * 1024))
+
+        scene = os.path.join(tmp, "scene")
+        total = make_tree(scene, args.files, args.luac, args.file_kb)
+        print(f"Synthetic scene: {args.files} assets + {args.luac} .luac, {hdk.format_size(total)}, "
+              f"stub latency {args.latency * 1000:.1f} ms, {os.cpu_count()} CPUs")
+
+        luac_out = os.path.join(tmp, "lua")
+        sdats = []
+        for i in range(min(50, args.files)):
+            path = os.path.join(tmp, "sdat", f"scene{i:03d}.sdat")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(b"\0" * 4096)
+            sdats.append(path)
+        compressible = hdk.find_compressible(scene)
+
+        results = [
+            measure("batch compress", lambda: hdk.batch_compress(stubs['hdk'], scene, "lzma"),
+                    len(compressible), sum(os.path.getsize(p) for p in compressible), args.latency),
+            measure("luac decompile", lambda: hdk.decompile_luac("unluac.jar", scene, luac_out, args.workers),
+                    args.luac, 0, args.latency, args.workers),
+            measure("resharc", lambda: hdk.run_resharc(stubs['resharc'], sdats), len(sdats), 4096 * len(sdats),
+                    args.latency),
+            measure("keyword search", lambda: hdk.search_keywords(luac_out, ["save", "load", "persist"]), args.luac),
+            measure("tree export", lambda: hdk.export_tree(scene, os.path.join(tmp, "tree"), sizes=True, hashes=True),
+                    args.files + args.luac, total),
+            bench_console(args.log_lines),
+        ]
+        results[0].update(process_latencies(hdk.TELEMETRY_FILE, "hdk compress c"))
+        results[1].update(process_latencies(hdk.TELEMETRY_FILE, "java unluac"))
+
+    try:
+        version = subprocess.run(["git", "-C", ROOT, "describe", "--always", "--dirty"],
+                                 capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        version = None
+    report = {'version': version, 'python': platform.python_version(), 'platform': platform.platform(),
+              'cpus': os.cpu_count(), 'params': vars(args), 'results': results}
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults: {args.out}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+GUI cold-start benchmark: time from a fresh interpreter to the first painted window.
+
+    python benchmarks/bench_startup.py [--repeat 5] [--eager]
+
+Each run is a new Python process, so module imports are cold. --eager also
+builds every tab up front, which is what startup cost before tabs were
+built lazily. Needs a display (use xvfb-run on a headless box).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {root!r})
+import hdk_launcher
+t1 = time.perf_counter()
+hdk_launcher.messagebox.showinfo = lambda *a, **k: None  # no "Setup Required" popup mid-run
+app = hdk_launcher.HDKCommander()
+if {eager!r}:
+    app.build_all_tabs()
+t2 = time.perf_counter()
+app.update()
+t3 = time.perf_counter()
+app.destroy()
+print(json.dumps({{"import": t1 - t0, "construct": t2 - t1, "first_paint": t3 - t2, "total": t3 - t0}}))
+"""
+
+
+def run_once(eager):
+    code = CHILD.format(root=ROOT, eager=eager)
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SystemExit(f"startup run failed:\n{result.stderr.strip()}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--eager", action="store_true", help="also time building every tab at startup")
+    args = parser.parse_args()
+
+    modes = [("lazy", False)] + ([("eager", True)] if args.eager else [])
+    for label, eager in modes:
+        runs = [run_once(eager) for _ in range(args.repeat)]
+        print(f"{label:>6}: " + "  ".join(
+            f"{key} {statistics.median(r[key] for r in runs) * 1000:7.1f} ms"
+            for key in ("import", "construct", "first_paint", "total")))
+
+
+if __name__ == "__main__":
+    main()
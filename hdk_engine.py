@@ -0,0 +1,5376 @@
+"""
+HDK Commander engine — every operation the GUI offers, without Tk.
+
+hdk_launcher.py is a thin client over this module. It can also be driven
+directly from a shell, cron or a build server:
+
+    python hdk_launcher.py --headless <command> [options]
+    python hdk_engine.py <command> [options]
+
+Results are printed as JSON on stdout; progress goes to stderr.
+"""
+import subprocess
+import threading
+import os
+import stat
+import sys
+import shutil
+import platform
+import time
+import json
+import struct
+import zlib
+import fnmatch
+import re
+import hashlib
+import random
+import mmap
+import errno
+import zipfile
+import argparse
+import socket
+import socketserver
+import queue
+import tempfile
+import hmac
+import ipaddress
+import contextlib
+import functools
+import cProfile
+import pstats
+import io
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# =========================================================================
+# CONFIGURATION
+# =========================================================================
+DEFAULT_HDK_PATH = r""
+DEFAULT_RESHARC_PATH = r""
+DEFAULT_UNLUAC_PATH = r""
+
+# Settings file — lives next to the script
+SETTINGS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hdk_settings.json")
+
+# Hash → original path dictionary learned from previous Map runs
+NAMES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hdk_names.json")
+
+# Per-project caches (patch state, stage outputs...) — never inside the project itself
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hdk_cache")
+
+# =========================================================================
+# PLATFORM DETECTION
+# =========================================================================
+IS_WINDOWS = sys.platform == "win32"
+IS_MAC = sys.platform == "darwin"
+IS_LINUX = sys.platform.startswith("linux")
+
+BIN_EXT = ".exe" if IS_WINDOWS else ""
+
+# =========================================================================
+# SETTINGS PERSISTENCE
+# =========================================================================
+def load_settings():
+    """Load saved settings from JSON file."""
+    try:
+        if os.path.exists(SETTINGS_FILE):
+            with open(SETTINGS_FILE, 'r') as f:
+                data = json.load(f)
+                if isinstance(data, dict):
+                    return data
+    except Exception:
+        pass
+    return {}
+
+
+def save_settings(data):
+    """Write settings to JSON file (silently ignored if the folder is read-only)."""
+    try:
+        with open(SETTINGS_FILE, 'w') as f:
+            json.dump(data, f, indent=2)
+    except Exception:
+        pass
+
+
+# =========================================================================
+# BINARY RESOLUTION
+# =========================================================================
+HDK_CANDIDATES = [
+    f"hdk{BIN_EXT}",
+    os.path.join("hdk-cli", "target", "release", f"hdk{BIN_EXT}"),
+]
+RESHARC_CANDIDATES = [
+    f"hdk-resharc{BIN_EXT}",
+    os.path.join("hdk-resharc", "target", "release", f"hdk-resharc{BIN_EXT}"),
+]
+UNLUAC_CANDIDATES = [
+    "unluac-verbose.jar",
+    "unluac.jar",
+    os.path.join("tools", "unluac-verbose.jar"),
+    os.path.join("tools", "unluac.jar"),
+]
+
+
+def resolve_binary_path(settings, settings_key, name, manual_default, candidates):
+    """Try: saved setting → manual default → auto-detect."""
+    saved = settings.get(settings_key, "")
+    if saved and os.path.exists(saved):
+        return saved
+
+    if manual_default and os.path.exists(manual_default):
+        return manual_default
+
+    if IS_MAC or IS_LINUX:
+        home = os.path.expanduser("~")
+        candidates = candidates + [os.path.join(home, ".cargo", "bin", name)]
+
+    return find_binary(name, candidates)
+
+
+def resolve_jar_path(settings, settings_key, manual_default, candidates):
+    """Try: saved setting → manual default → search nearby."""
+    saved = settings.get(settings_key, "")
+    if saved and os.path.exists(saved):
+        return saved
+
+    if manual_default and os.path.exists(manual_default):
+        return manual_default
+
+    for candidate in candidates:
+        if os.path.isabs(candidate) and os.path.exists(candidate):
+            return candidate
+        full = os.path.join(os.getcwd(), candidate)
+        if os.path.exists(full):
+            return full
+        # Also check next to the script itself
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        beside = os.path.join(script_dir, candidate)
+        if os.path.exists(beside):
+            return beside
+
+    return None
+
+
+def find_binary(name, search_names):
+    """Search CWD-relative paths, then system PATH."""
+    for candidate in search_names:
+        if os.path.isabs(candidate) and os.path.exists(candidate):
+            return candidate
+        full = os.path.join(os.getcwd(), candidate)
+        if os.path.exists(full):
+            return full
+
+    found = shutil.which(name)
+    if found:
+        return found
+    return None
+
+
+def resolve_tools(settings):
+    """Resolve hdk, hdk-resharc, the unluac JAR and java the same way the GUI does. Missing tools are None."""
+    return {
+        'hdk': resolve_binary_path(settings, "hdk_path", "hdk", DEFAULT_HDK_PATH, HDK_CANDIDATES),
+        'resharc': resolve_binary_path(settings, "resharc_path", "hdk-resharc", DEFAULT_RESHARC_PATH,
+                                       RESHARC_CANDIDATES),
+        'unluac': resolve_jar_path(settings, "unluac_path", DEFAULT_UNLUAC_PATH, UNLUAC_CANDIDATES),
+        'java': shutil.which("java"),
+    }
+
+
+# =========================================================================
+# TOOL HEALTH CHECK
+# =========================================================================
+# A broken binary (wrong architecture, missing libraries, a JRE that is too
+# old) should be caught before a long batch starts, not halfway through it.
+# Probing costs a process launch (a whole JVM for java), so results are
+# cached by path + size + mtime and only re-run when the file changes.
+HEALTH_CACHE_FILE = os.path.join(CACHE_DIR, "tool_health.json")
+VERSION_PROBE_TIMEOUT = 5  # seconds; a hung binary must not stall startup
+HDK_SUBCOMMANDS = ("sdat", "bar", "sharc", "pkg", "compress", "map", "crypt")
+MIN_JAVA_VERSION = 8
+TOOL_LABELS = {'hdk': "hdk", 'resharc': "hdk-resharc", 'java': "Java", 'unluac': "unluac JAR"}
+_health_lock = threading.Lock()
+
+
+def _binary_signature(path):
+    st = os.stat(path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def _probe(cmd, timeout):
+    """Run a probe command. Returns (returncode, combined output); returncode is None if it could not run."""
+    try:
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                stdin=subprocess.DEVNULL, timeout=timeout, startupinfo=get_startupinfo())
+    except subprocess.TimeoutExpired:
+        return None, f"timed out after {timeout}s"
+    except OSError as e:
+        return None, str(e)
+    return result.returncode, result.stdout.decode('utf-8', errors='ignore')
+
+
+def _first_line(text):
+    for line in text.splitlines():
+        if line.strip():
+            return line.strip()
+    return None
+
+
+def parse_java_version(text):
+    """Major version from `java -version` output ("1.8.0_392" → 8, "17.0.2" → 17), or None."""
+    m = re.search(r'version "(\d+)(?:\.(\d+))?', text)
+    if not m:
+        return None
+    major = int(m.group(1))
+    if major == 1 and m.group(2):
+        major = int(m.group(2))
+    return major
+
+
+def parse_subcommands(help_text, known=HDK_SUBCOMMANDS):
+    """Subcommands from `known` that appear as entries in a --help listing."""
+    return [name for name in known if re.search(rf"^\s+{re.escape(name)}\b", help_text, re.M)]
+
+
+def _probe_cli(path, timeout, subcommands=None):
+    record = {'ok': False, 'version': None, 'error': None}
+    rc, out = _probe([path, "--version"], timeout)
+    if rc == 0:
+        record['ok'], record['version'] = True, _first_line(out)
+    if subcommands is not None or rc != 0:
+        help_rc, help_out = _probe([path, "--help"], timeout)
+        if help_rc == 0:
+            record['ok'] = True
+        if subcommands is not None:
+            record['subcommands'] = parse_subcommands(help_out, subcommands)
+        if not record['ok']:
+            record['error'] = _first_line(out if rc is None else help_out) or f"exit code {rc}"
+    return record
+
+
+def _probe_java(path, timeout):
+    rc, out = _probe([path, "-version"], timeout)
+    major = parse_java_version(out) if rc == 0 else None
+    record = {'ok': bool(major and major >= MIN_JAVA_VERSION), 'version': _first_line(out) if rc == 0 else None,
+              'major': major, 'error': None}
+    if rc != 0:
+        record['error'] = _first_line(out) or f"exit code {rc}"
+    elif not record['ok']:
+        record['error'] = f"Java {MIN_JAVA_VERSION}+ required"
+    return record
+
+
+def _probe_jar(path, timeout):
+    # No JVM start: a readable JAR that contains the unluac classes is enough
+    try:
+        with zipfile.ZipFile(path) as jar:
+            names = jar.namelist()
+    except (OSError, zipfile.BadZipFile) as e:
+        return {'ok': False, 'version': None, 'error': f"not a valid JAR: {e}"}
+    if not any(n.startswith("unluac/") for n in names):
+        return {'ok': False, 'version': None, 'error': "JAR does not contain unluac classes"}
+    return {'ok': True, 'version': None, 'error': None}
+
+
+def _load_health_cache():
+    try:
+        with open(HEALTH_CACHE_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+            if isinstance(data, dict):
+                return data
+    except Exception:
+        pass
+    return {}
+
+
+def _save_health_cache(cache):
+    tmp_path = HEALTH_CACHE_FILE + ".tmp"
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, HEALTH_CACHE_FILE)
+    except Exception:
+        pass
+
+
+def check_tool_health(tools, keys=None, timeout=VERSION_PROBE_TIMEOUT, refresh=False):
+    """Validate hdk, hdk-resharc, java and the unluac JAR, probing concurrently and only when a file changed.
+
+    Returns {key: {'path', 'ok', 'version', 'error', 'cached', ...}}; hdk also gets 'subcommands'
+    and java 'major'. Missing tools come back with ok False and error "not found".
+    Pass keys to check only some of the tools.
+    """
+    probes = {'hdk': lambda p: _probe_cli(p, timeout, HDK_SUBCOMMANDS),
+              'resharc': lambda p: _probe_cli(p, timeout),
+              'java': lambda p: _probe_java(p, timeout),
+              'unluac': lambda p: _probe_jar(p, timeout)}
+    paths = {'hdk': tools.get('hdk'), 'resharc': tools.get('resharc'),
+             'java': tools.get('java') or shutil.which("java"), 'unluac': tools.get('unluac')}
+    if keys:
+        paths = {key: paths[key] for key in keys}
+
+    with _health_lock:
+        cache = _load_health_cache()
+    health, pending = {}, {}
+    for key, path in paths.items():
+        if not path or not os.path.exists(path):
+            health[key] = {'path': path, 'ok': False, 'version': None, 'error': "not found", 'cached': False}
+            continue
+        path = os.path.realpath(path)
+        signature = _binary_signature(path)
+        entry = cache.get(f"{key}:{path}")
+        if not refresh and entry and entry.get('signature') == signature:
+            health[key] = dict(entry['result'], path=path, cached=True)
+        else:
+            pending[key] = (path, signature)
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=len(pending)) as pool:
+            futures = {key: pool.submit(probes[key], path) for key, (path, _) in pending.items()}
+            for key, future in futures.items():
+                path, signature = pending[key]
+                result = future.result()
+                health[key] = dict(result, path=path, cached=False)
+                # Timeouts may be a busy machine rather than a broken tool; probe again next time
+                if not (result['error'] or "").startswith("timed out"):
+                    cache[f"{key}:{path}"] = {'signature': signature, 'result': result}
+        with _health_lock:
+            _save_health_cache(cache)
+    return {key: health[key] for key in paths}
+
+
+def tool_problem(health, key, subcommand=None):
+    """Why a job can't use this tool (from a health report), or None if it looks fine."""
+    record = health.get(key)
+    label = TOOL_LABELS.get(key, key)
+    if not record or not record['ok']:
+        return f"{label}: {record['error'] if record else 'not checked'}"
+    supported = record.get('subcommands')
+    if subcommand and supported and subcommand not in supported:
+        return f"{label} does not support the '{subcommand}' subcommand (has: {', '.join(supported)})"
+    return None
+
+
+def format_health(health):
+    """One 'label: version' fragment per tool for status lines."""
+    parts = []
+    for key in ('hdk', 'resharc', 'java', 'unluac'):
+        record = health.get(key, {})
+        if record.get('ok'):
+            parts.append(f"{TOOL_LABELS[key]}: {record.get('version') or 'ok'}")
+        else:
+            parts.append(f"{TOOL_LABELS[key]}: ✗ {record.get('error') or 'n/a'}")
+    return parts
+
+
+# =========================================================================
+# ARCHIVE TABLE OF CONTENTS (lazy .bar browsing)
+# =========================================================================
+# BAR header: magic, flags, priority, user data (timestamp), file count.
+# Each TOC entry: name hash, data offset (low 2 bits = compression),
+# uncompressed size, compressed size.
+BAR_MAGIC = 0xADEF17E1
+BAR_HEADER_SIZE = 20
+BAR_TOC_ENTRY_SIZE = 16
+BAR_COMPRESSION_NAMES = {0: "none", 1: "zlib", 2: "edgezlib", 3: "encrypted"}
+
+
+class ArchiveFormatError(Exception):
+    """Raised when an archive cannot be read without hdk (encrypted TOC, unknown layout...)."""
+
+
+def read_archive_toc(path):
+    """Read only the header and TOC of a .bar/.sharc file. Returns (header, entries)."""
+    file_size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        raw_header = f.read(BAR_HEADER_SIZE)
+        if len(raw_header) < BAR_HEADER_SIZE:
+            raise ArchiveFormatError("File is too small to be an archive.")
+
+        for endian in ('>', '<'):
+            if struct.unpack(endian + 'I', raw_header[:4])[0] == BAR_MAGIC:
+                break
+        else:
+            raise ArchiveFormatError("Unknown archive magic (not a BAR/SHARC file).")
+
+        _, flags, priority, user_data, num_files = struct.unpack(endian + '5I', raw_header)
+        toc_size = num_files * BAR_TOC_ENTRY_SIZE
+        data_start = BAR_HEADER_SIZE + toc_size
+        if data_start > file_size:
+            raise ArchiveFormatError("TOC is encrypted or truncated (SHARC archives need a full extract).")
+
+        raw_toc = f.read(toc_size)
+
+    entries = []
+    for i in range(num_files):
+        name_hash, offset_word, size, compressed_size = struct.unpack_from(
+            endian + '4I', raw_toc, i * BAR_TOC_ENTRY_SIZE)
+        offset = offset_word & ~0x3
+        if data_start + offset + compressed_size > file_size:
+            raise ArchiveFormatError("TOC is encrypted or corrupt (entry points past end of file).")
+        entries.append({
+            'hash': name_hash,
+            'name': f"{name_hash:08X}",
+            'offset': data_start + offset,
+            'size': size,
+            'compressed_size': compressed_size,
+            'compression': BAR_COMPRESSION_NAMES[offset_word & 0x3],
+        })
+
+    header = {
+        'endian': 'big' if endian == '>' else 'little',
+        'flags': flags,
+        'priority': priority,
+        'timestamp': user_data,
+        'num_files': num_files,
+        'file_size': file_size,
+    }
+    return header, entries
+
+
+def select_archive_entries(entries, pattern):
+    """Entries whose displayed name matches a glob (case-insensitive). Comma-separate several globs."""
+    globs = [g.strip().lower() for g in pattern.split(',') if g.strip()]
+    return [e for e in entries if any(fnmatch.fnmatch(e['name'].lower(), g) for g in globs)]
+
+
+def extract_archive_entries(path, entries, output_dir):
+    """Inflate only the given TOC entries into output_dir. Returns the written paths."""
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+    with open(path, 'rb') as f:
+        for entry in entries:
+            if entry['compression'] == "encrypted":
+                raise ArchiveFormatError(f"{entry['name']} is encrypted — use a full extract.")
+
+            f.seek(entry['offset'])
+            raw = f.read(entry['compressed_size'])
+            if entry['compression'] == "zlib":
+                try:
+                    data = zlib.decompress(raw)
+                except zlib.error as e:
+                    raise ArchiveFormatError(f"Bad zlib data in {entry['name']}: {e}")
+            elif entry['compression'] == "edgezlib":
+                data = edgezlib_decompress(raw)
+            else:
+                data = raw
+
+            out_path = os.path.join(output_dir, entry['name'])
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+            with open(out_path, 'wb') as out:
+                out.write(data)
+            written.append(out_path)
+    return written
+
+
+def format_size(num_bytes):
+    """Human-readable byte count."""
+    size = float(num_bytes)
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+# =========================================================================
+# EDGEZLIB DECODER (parallel, in-process)
+# =========================================================================
+# EdgeZLib streams are a run of independent segments, each prefixed with
+# a big-endian (compressed size, uncompressed size) pair. A size of 0
+# means a full 64 KiB segment; equal sizes mean the segment is stored raw.
+# Segments inflate independently and zlib releases the GIL while it works,
+# so a plain thread pool scales across cores without extra processes.
+EDGEZLIB_SEGMENT_SIZE = 0x10000
+EDGEZLIB_PARALLEL_THRESHOLD = 4  # segments; below this a pool costs more than it saves
+DECODE_WORKERS = min(8, os.cpu_count() or 1)
+
+
+def edgezlib_segments(data, max_raw=None):
+    """Walk the segment headers. Returns a list of (offset, compressed size, raw size).
+
+    With `max_raw`, stop once the collected segments cover that many decoded bytes.
+    """
+    segments = []
+    pos = 0
+    covered = 0
+    while pos < len(data) and (max_raw is None or covered < max_raw):
+        if pos + 4 > len(data):
+            raise ArchiveFormatError("Truncated EdgeZLib segment header.")
+        comp_size, raw_size = struct.unpack_from('>HH', data, pos)
+        comp_size = comp_size or EDGEZLIB_SEGMENT_SIZE
+        raw_size = raw_size or EDGEZLIB_SEGMENT_SIZE
+        pos += 4
+        if pos + comp_size > len(data):
+            raise ArchiveFormatError("Truncated EdgeZLib segment (not EdgeZLib data?).")
+        segments.append((pos, comp_size, raw_size))
+        pos += comp_size
+        covered += raw_size
+    return segments
+
+
+def _inflate_segment(data, segment):
+    offset, comp_size, raw_size = segment
+    chunk = data[offset:offset + comp_size]
+    if comp_size == raw_size:
+        return bytes(chunk)
+    try:
+        out = zlib.decompress(chunk, -15)
+    except zlib.error as e:
+        raise ArchiveFormatError(f"Bad EdgeZLib segment at 0x{offset - 4:X}: {e}")
+    if len(out) != raw_size:
+        raise ArchiveFormatError(f"EdgeZLib segment at 0x{offset - 4:X} inflated to {len(out)} bytes, expected {raw_size}.")
+    return out
+
+
+def iter_edgezlib_decompress(data, workers=DECODE_WORKERS, max_raw=None):
+    """Yield decoded segments in order, inflating up to `workers` segments at once."""
+    segments = edgezlib_segments(data, max_raw)
+    if workers <= 1 or len(segments) < EDGEZLIB_PARALLEL_THRESHOLD:
+        for segment in segments:
+            yield _inflate_segment(data, segment)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # map() keeps order; submit in windows so output can stream without
+        # holding every decoded segment in memory at once.
+        window = workers * 4
+        for i in range(0, len(segments), window):
+            yield from pool.map(lambda seg: _inflate_segment(data, seg), segments[i:i + window])
+
+
+def edgezlib_decompress(data, workers=DECODE_WORKERS):
+    """Decode an EdgeZLib segment stream held in memory."""
+    return b"".join(iter_edgezlib_decompress(data, workers))
+
+
+def edgezlib_decompress_file(input_path, output_path, workers=DECODE_WORKERS):
+    """Stream-decode an EdgeZLib file to disk. Returns the number of bytes written."""
+    written = 0
+    tmp_path = output_path + ".tmp"
+    with open(input_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            data = b""
+        else:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            with open(tmp_path, 'wb') as out:
+                for chunk in iter_edgezlib_decompress(data, workers):
+                    out.write(chunk)
+                    written += len(chunk)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+    os.replace(tmp_path, output_path)
+    return written
+
+
+def edgezlib_preview(path, limit=256 * 1024, workers=DECODE_WORKERS):
+    """Decode just enough segments of an EdgeZLib file to show the first `limit` bytes."""
+    out = bytearray()
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for chunk in iter_edgezlib_decompress(data, workers, max_raw=limit):
+                out += chunk
+        finally:
+            data.close()
+    return bytes(out[:limit])
+
+
+def format_preview(data):
+    """Text if the bytes look like text, otherwise a hex dump."""
+    sample = data[:4096]
+    if sample and (b"\0" in sample or sum(b < 9 or 13 < b < 32 for b in sample) > len(sample) // 20):
+        lines = []
+        for i in range(0, min(len(data), 64 * 1024), 16):
+            row = data[i:i + 16]
+            hex_part = " ".join(f"{b:02X}" for b in row)
+            text_part = "".join(chr(b) if 32 <= b < 127 else "." for b in row)
+            lines.append(f"{i:08X}  {hex_part:<47}  {text_part}")
+        return "\n".join(lines)
+    return data.decode('utf-8', errors='replace')
+
+
+# =========================================================================
+# MAP NAME DICTIONARY
+# =========================================================================
+# Files hdk could not name yet are called after their 32-bit path hash,
+# optionally with an extension (e.g. 0A1B2C3D or 0A1B2C3D.xml).
+HASHED_NAME_RE = re.compile(r"^([0-9A-Fa-f]{8})(\.[A-Za-z0-9]+)?$")
+
+
+class NameDictionary:
+    """Persistent, growing hash → relative path table shared by every Map run."""
+
+    def __init__(self, path=NAMES_FILE):
+        self.path = path
+        self.names = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        try:
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                    if isinstance(data, dict):
+                        self.names = data
+        except Exception:
+            pass
+
+    def __len__(self):
+        return len(self.names)
+
+    def lookup(self, name_hash):
+        return self.names.get(name_hash.upper())
+
+    def learn(self, name_hash, rel_path):
+        """Record a mapping. Returns True if it was new."""
+        name_hash = name_hash.upper()
+        rel_path = rel_path.replace(os.sep, "/")
+        with self._lock:
+            if self.names.get(name_hash) == rel_path:
+                return False
+            self.names[name_hash] = rel_path
+            self._dirty = True
+            return True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            tmp_path = self.path + ".tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.names, f, indent=1, sort_keys=True)
+                os.replace(tmp_path, self.path)
+                self._dirty = False
+            except Exception:
+                pass
+
+
+def find_hashed_files(root):
+    """Yield (full path, hash) for every file still carrying a hashed name."""
+    for dirpath, _, files in os.walk(root):
+        for name in files:
+            m = HASHED_NAME_RE.match(name)
+            if m:
+                yield os.path.join(dirpath, name), m.group(1).upper()
+
+
+def apply_known_names(root, names):
+    """Cheap pre-pass: rename hashed files we've seen before. Returns (renamed, still hashed)."""
+    root_abs = os.path.abspath(root)
+    renamed, remaining = 0, 0
+    for full_path, name_hash in list(find_hashed_files(root)):
+        rel_path = names.lookup(name_hash)
+        if not rel_path:
+            remaining += 1
+            continue
+        target = os.path.abspath(os.path.join(root_abs, rel_path))
+        if not target.startswith(root_abs + os.sep) or os.path.exists(target):
+            remaining += 1
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(full_path, target)
+        renamed += 1
+    return renamed, remaining
+
+
+def snapshot_hashed_files(root):
+    """Remember hashed files by inode so renames done by hdk can be traced afterwards."""
+    snapshot = {}
+    for full_path, name_hash in find_hashed_files(root):
+        st = os.stat(full_path)
+        snapshot[(st.st_dev, st.st_ino)] = (full_path, name_hash)
+    return snapshot
+
+
+def learn_from_renames(root, snapshot, names):
+    """Diff the tree against a snapshot and record every hashed file that got a real name."""
+    learned = 0
+    for dirpath, _, files in os.walk(root):
+        for name in files:
+            full_path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(full_path)
+            except OSError:
+                continue
+            before = snapshot.get((st.st_dev, st.st_ino))
+            if before and before[0] != full_path and not HASHED_NAME_RE.match(name):
+                if names.learn(before[1], os.path.relpath(full_path, root)):
+                    learned += 1
+    return learned
+
+
+# =========================================================================
+# OFFLINE PATCH (URL rewriting)
+# =========================================================================
+# One rule per line: "find => replace". Prefix the find side with "re:" for
+# a regular expression. Lines starting with # are ignored.
+DEFAULT_PATCH_RULES = "https://cdn.destinationhome.live/ => local:USRDIR/"
+PATCH_EXTENSIONS = ('.xml', '.lua', '.txt', '.sdc')
+PATCH_WORKERS = min(16, (os.cpu_count() or 1) * 2)
+
+
+def parse_patch_rules(text):
+    """Parse the rules box into (label, compiled bytes regex, bytes replacement) tuples."""
+    rules = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if "=>" not in line:
+            raise ValueError(f"Rule needs 'find => replace': {line}")
+        find, replace = (part.strip() for part in line.split("=>", 1))
+        if find.startswith("re:"):
+            pattern = re.compile(find[3:].encode('utf-8'))
+            replacement = replace.encode('utf-8')
+        else:
+            pattern = re.compile(re.escape(find.encode('utf-8')))
+            replacement = replace.encode('utf-8').replace(b"\\", b"\\\\")
+        rules.append((line, pattern, replacement))
+    if not rules:
+        raise ValueError("No patch rules given.")
+    return rules
+
+
+def patch_file(path, rules, dry_run=False):
+    """Apply every rule to one file. Returns per-rule match counts; writes atomically if anything matched."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    counts = []
+    for _, pattern, replacement in rules:
+        data, n = pattern.subn(replacement, data)
+        counts.append(n)
+
+    if any(counts) and not dry_run:
+        tmp_path = path + ".patch.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    return counts
+
+
+def _patch_state_path(root):
+    key = hashlib.sha1(os.path.abspath(root).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, "patch", f"{key}.json")
+
+
+def patch_tree(root, rules_text, dry_run=False, incremental=False, workers=PATCH_WORKERS):
+    """Rewrite every text asset under root in parallel. Returns a summary dict."""
+    rules = parse_patch_rules(rules_text)
+    rules_key = hashlib.sha1(rules_text.strip().encode('utf-8')).hexdigest()
+
+    state_path = _patch_state_path(root)
+    seen = {}
+    if incremental and os.path.exists(state_path):
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get("rules") == rules_key:
+                seen = state.get("files", {})
+        except Exception:
+            seen = {}
+
+    candidates, skipped = [], 0
+    for dirpath, _, files in os.walk(root):
+        for name in files:
+            if not name.lower().endswith(PATCH_EXTENSIONS):
+                continue
+            full_path = os.path.join(dirpath, name)
+            st = os.stat(full_path)
+            rel = os.path.relpath(full_path, root)
+            if seen.get(rel) == [st.st_size, st.st_mtime_ns]:
+                skipped += 1
+                continue
+            candidates.append((rel, full_path))
+
+    @traced("task", "patch file")
+    def work(item):
+        rel, full_path = item
+        try:
+            return rel, patch_file(full_path, rules, dry_run), None
+        except OSError as e:
+            return rel, None, str(e)
+
+    totals = [0] * len(rules)
+    changed, errors = [], []
+    with track_job("offline patch", items=len(candidates),
+                   input_bytes=sum(path_bytes(path) for _, path in candidates)) as job, \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+        for rel, counts, error in pool.map(work, candidates):
+            if error:
+                errors.append((rel, error))
+                continue
+            if any(counts):
+                changed.append((rel, sum(counts)))
+                totals = [t + c for t, c in zip(totals, counts)]
+            full_path = os.path.join(root, rel)
+            st = os.stat(full_path)
+            seen[rel] = [st.st_size, st.st_mtime_ns]
+        job['ok'] = not errors
+
+    if not dry_run:
+        os.makedirs(os.path.dirname(state_path), exist_ok=True)
+        tmp_path = state_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"root": os.path.abspath(root), "rules": rules_key, "files": seen}, f)
+        os.replace(tmp_path, state_path)
+
+    return {
+        'scanned': len(candidates),
+        'skipped': skipped,
+        'changed': changed,
+        'errors': errors,
+        'rules': [(label, total) for (label, _, _), total in zip(rules, totals)],
+    }
+
+
+# =========================================================================
+# JOB JOURNAL (write-ahead, crash-safe batches)
+# =========================================================================
+# Long batches (batch compress, LUAC decompile, Re-SHARC) log their plan
+# first, then "begin" (with the temp files about to be written and the state
+# of the file being replaced) before each item and "done" after it. Every
+# line is fsynced. After a crash the journal says exactly which items
+# finished, which temp files are orphans, and which begun item actually
+# completed (its target changed and its temp is gone) just before the crash.
+JOBS_DIR = os.path.join(CACHE_DIR, "jobs")
+
+
+def read_journal(path):
+    """Records of a JSONL journal; a line cut short by a crash is ignored."""
+    records = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    except OSError:
+        pass
+    return records
+
+
+def _file_signature(path):
+    try:
+        st = os.stat(path)
+        return [st.st_size, st.st_mtime_ns]
+    except OSError:
+        return None
+
+
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+STILL_ACTIVE = 259
+ERROR_ACCESS_DENIED = 5
+
+
+def _windows_pid_alive(pid):
+    """OpenProcess + GetExitCodeProcess (os.kill(pid, 0) would terminate the process there)."""
+    import ctypes
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, int(pid))
+    if not handle:
+        # Access denied means the process exists but belongs to someone else
+        return ctypes.get_last_error() == ERROR_ACCESS_DENIED
+    try:
+        code = ctypes.c_ulong()
+        if not kernel32.GetExitCodeProcess(handle, ctypes.byref(code)):
+            return True  # unknown: never treat a possibly running job as interrupted
+        return code.value == STILL_ACTIVE
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+def _pid_alive(pid):
+    if not pid or pid == os.getpid():
+        return False
+    if IS_WINDOWS:
+        return _windows_pid_alive(pid)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class JobJournal:
+    """Write-ahead log of one batch job: its plan, then begin / done records per item."""
+
+    def __init__(self, path):
+        self.path = path
+        self.kind = None
+        self.params = {}
+        self.items = []
+        self.done = set()
+        self.begun = {}
+        self.started = None
+        self.pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def job_id(self):
+        return os.path.splitext(os.path.basename(self.path))[0]
+
+    @classmethod
+    def start(cls, kind, params, items):
+        """Create a journal for a new job and write its plan."""
+        os.makedirs(JOBS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        journal = cls(os.path.join(JOBS_DIR, f"{kind}-{stamp}-{os.getpid()}-{threading.get_ident() % 10000}.jsonl"))
+        journal.kind, journal.params, journal.items = kind, params, [str(i) for i in items]
+        journal.started, journal.pid = datetime.now().isoformat(timespec='seconds'), os.getpid()
+        journal._append({'event': 'plan', 'kind': kind, 'params': params, 'items': journal.items,
+                         'started': journal.started, 'pid': journal.pid})
+        return journal
+
+    @classmethod
+    def load(cls, path):
+        """Rebuild a journal's state from disk (to resume or clean it up)."""
+        journal = cls(path)
+        for record in read_journal(path):
+            event = record.get('event')
+            if event == 'plan':
+                journal.kind, journal.params = record.get('kind'), record.get('params', {})
+                journal.items = record.get('items', [])
+                journal.started, journal.pid = record.get('started'), record.get('pid')
+            elif event == 'begin':
+                journal.begun[record['item']] = record
+            elif event == 'done':
+                journal.done.add(record['item'])
+            elif event == 'resume':
+                journal.pid = record.get('pid')
+        return journal
+
+    def _append(self, record):
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def begin(self, item, temps=(), target=None):
+        """Record intent before touching an item: temp files it will write and the file it will replace."""
+        record = {'event': 'begin', 'item': str(item), 'temps': [str(t) for t in temps],
+                  'target': str(target) if target else None,
+                  'signature': _file_signature(target) if target else None}
+        self.begun[record['item']] = record
+        self._append(record)
+
+    def complete(self, item, ok=True):
+        self.done.add(str(item))
+        self._append({'event': 'done', 'item': str(item), 'ok': ok})
+
+    def remaining(self):
+        return [item for item in self.items if item not in self.done]
+
+    def reconcile(self):
+        """After a crash: delete orphaned temp files and mark items that finished unrecorded. Returns temps removed."""
+        removed = 0
+        for item, record in list(self.begun.items()):
+            if item in self.done:
+                continue
+            leftovers = [t for t in record.get('temps', []) if os.path.exists(t)]
+            for temp in leftovers:
+                try:
+                    os.remove(temp)
+                    removed += 1
+                except OSError:
+                    pass
+            target = record.get('target')
+            if not leftovers and target and _file_signature(target) != record.get('signature'):
+                self.complete(item)
+        return removed
+
+    def resume(self):
+        """Take over an interrupted journal in this process."""
+        self.pid = os.getpid()
+        self._append({'event': 'resume', 'pid': self.pid, 'at': datetime.now().isoformat(timespec='seconds')})
+
+    def close(self):
+        """Finish the job: a completed journal is deleted, an interrupted one stays resumable."""
+        if not self.remaining():
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def discard(self):
+        """Give up on the job: clean its temp files and delete the journal. Returns temps removed."""
+        removed = self.reconcile()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+        return removed
+
+    def describe(self):
+        return (f"{self.kind} — {len(self.done)}/{len(self.items)} done, started {self.started} "
+                f"({self.params.get('directory') or self.params.get('project_dir') or ''})")
+
+
+def pending_jobs():
+    """Interrupted jobs (journals left behind by a process that is no longer running), oldest first."""
+    jobs = []
+    try:
+        names = sorted(os.listdir(JOBS_DIR))
+    except OSError:
+        return jobs
+    for name in names:
+        if name.endswith(".jsonl"):
+            journal = JobJournal.load(os.path.join(JOBS_DIR, name))
+            if journal.kind and not _pid_alive(journal.pid):
+                jobs.append(journal)
+    return jobs
+
+
+def resume_job(journal, log=None, should_stop=None, on_progress=None):
+    """Continue an interrupted job from its journal. Returns a short result dict."""
+    log = log or (lambda msg, tag=None: None)
+    journal.reconcile()
+    journal.resume()
+    params = journal.params
+    log(f"Resuming {journal.describe()}", "info")
+    if journal.kind == "compress":
+        count = batch_compress(params['hdk_path'], params['directory'], params['algo'], log=log, journal=journal)
+        return {'kind': journal.kind, 'compressed': count, 'remaining': len(journal.remaining())}
+    if journal.kind == "luac":
+        stats = decompile_luac(params['unluac'], params['project_dir'], params['output_dir'],
+                               params.get('workers', 4), log=log, should_stop=should_stop,
+                               on_progress=on_progress, journal=journal)
+        return dict(kind=journal.kind, remaining=len(journal.remaining()), **stats)
+    if journal.kind == "resharc":
+        returncode, _, _, outputs = run_resharc(params['resharc_path'], journal.remaining(), journal=journal)
+        return {'kind': journal.kind, 'returncode': returncode, 'remaining': len(journal.remaining())}
+    raise ValueError(f"Unknown job type: {journal.kind}")
+
+
+# =========================================================================
+# TELEMETRY (per-job and per-process metrics)
+# =========================================================================
+# Every child process and every batch job appends one JSON line to
+# hdk_cache/telemetry.jsonl: wall and CPU time, peak RSS, bytes in / out,
+# compression ratio and exit status. Child CPU and RSS come from wait4()
+# on POSIX, which run_tool calls itself once the child's pipes are drained
+# (before Popen could reap it); on Windows those fields are left empty. The Dashboard tab and
+# the `stats` command aggregate the file by operation type.
+TELEMETRY_FILE = os.path.join(CACHE_DIR, "telemetry.jsonl")
+TELEMETRY_MAX_BYTES = 8 * 1024 * 1024
+TELEMETRY_TREND_RUNS = 30
+_telemetry_lock = threading.Lock()
+_active_jobs = []
+
+
+def record_metrics(record):
+    """Append one metrics record (rotating the file to .1 once it grows past TELEMETRY_MAX_BYTES)."""
+    record.setdefault('ts', datetime.now().isoformat(timespec='seconds'))
+    line = json.dumps(record, default=str) + "\n"
+    with _telemetry_lock:
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            if os.path.exists(TELEMETRY_FILE) and os.path.getsize(TELEMETRY_FILE) > TELEMETRY_MAX_BYTES:
+                os.replace(TELEMETRY_FILE, TELEMETRY_FILE + ".1")
+            with open(TELEMETRY_FILE, 'a', encoding='utf-8') as f:
+                f.write(line)
+        except OSError:
+            pass  # metrics must never break a build
+
+
+def _maxrss_bytes(ru_maxrss):
+    # Linux reports KiB, macOS bytes
+    return ru_maxrss if IS_MAC else ru_maxrss * 1024
+
+
+def _reap(process):
+    """Wait for a child whose pipes are drained. Returns its rusage (None where wait4 is missing).
+
+    wait4() reaps the child itself and sets process.returncode, so Popen never waits on it again.
+    A child reaped elsewhere has an unknown exit status: that raises instead of passing for success.
+    """
+    if not hasattr(os, "wait4") or process.returncode is not None:
+        process.wait()
+        return None
+    try:
+        _, status, rusage = os.wait4(process.pid, 0)
+    except ChildProcessError:
+        raise ChildProcessError(errno.ECHILD, f"exit status of {process.args[0]} (pid {process.pid}) was lost")
+    process.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+    return rusage
+
+
+def path_bytes(path):
+    """Size of a file, or the total size of a folder (0 when it does not exist)."""
+    try:
+        if not os.path.isdir(path):
+            return os.path.getsize(path)
+    except OSError:
+        return 0
+    total, stack = 0, [path]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                else:
+                    total += entry.stat(follow_symlinks=False).st_size
+            except OSError:
+                continue
+    return total
+
+
+def _operation(cmd):
+    """Readable operation name of a command line: 'hdk sdat c', 'hdk compress c', 'java unluac', 'resharc'."""
+    tool = os.path.splitext(os.path.basename(cmd[0]))[0].lower()
+    if tool.startswith("java") and "-jar" in cmd:
+        return "java " + os.path.splitext(os.path.basename(cmd[cmd.index("-jar") + 1]))[0].lower()
+    if "resharc" in tool:
+        return "resharc"
+    words = [a for a in cmd[1:3] if not a.startswith("-")]
+    return " ".join(["hdk" if tool.startswith("hdk") else tool] + words)
+
+
+def _ratio(input_bytes, output_bytes):
+    return round(output_bytes / input_bytes, 4) if input_bytes and output_bytes else None
+
+
+def _io_paths(args):
+    """(input, output) paths of a tool command line: -i / -o, else the last argument as input."""
+    input_path = args[args.index("-i") + 1] if "-i" in args[:-1] else (args[-1] if len(args) > 1 else None)
+    output_path = args[args.index("-o") + 1] if "-o" in args[:-1] else None
+    return input_path, output_path
+
+
+def _record_process(cmd, process, wall, stdout_len, ru):
+    args = list(cmd)
+    input_path, output_path = _io_paths(args)
+    input_bytes = path_bytes(input_path) if input_path and os.path.exists(input_path) else None
+    output_bytes = path_bytes(output_path) if output_path else stdout_len
+    record_metrics({
+        'type': 'process', 'op': _operation(args), 'wall': round(wall, 4),
+        'cpu': round(ru.ru_utime + ru.ru_stime, 4) if ru else None,
+        'peak_rss': _maxrss_bytes(ru.ru_maxrss) if ru else None,
+        'input_bytes': input_bytes, 'output_bytes': output_bytes,
+        'ratio': _ratio(input_bytes, output_bytes), 'exit_code': process.returncode,
+        'job': _active_jobs[-1]['op'] if _active_jobs else None,
+    })
+
+
+class track_job:
+    """Context manager that records one 'job' metrics line. The body may fill in
+    input_bytes / output_bytes / items / ok on the yielded dict.
+
+    CPU time covers this process (all threads) plus children reaped during the job,
+    so it over-counts when two jobs overlap; 'overlapping' says how many were running.
+    """
+
+    def __init__(self, op, **info):
+        self.info = dict(info, type='job', op=op, ok=True)
+
+    def __enter__(self):
+        self.info['overlapping'] = len(_active_jobs)
+        _active_jobs.append(self.info)
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self._children = _children_cpu()
+        self._span = trace_span(self.info['op'], "job")
+        self._span.__enter__()
+        self._profiler = _start_profile()
+        return self.info
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            _active_jobs.remove(self.info)
+        except ValueError:
+            pass
+        info = self.info
+        if self._profiler:
+            info['profile'], top = _finish_profile(self._profiler, info['op'])
+            if self._profiler.on_done:
+                self._profiler.on_done(info['profile'], top)
+        self._span.__exit__(exc_type, exc, tb)
+        if exc_type is not None:
+            info['ok'] = False
+            info['error'] = str(exc)
+        info['wall'] = round(time.perf_counter() - self._wall, 4)
+        children = _children_cpu()
+        info['cpu'] = round(time.process_time() - self._cpu + (children - self._children if children is not None else 0), 4)
+        info['peak_rss'] = _peak_rss()
+        info['ratio'] = _ratio(info.get('input_bytes'), info.get('output_bytes'))
+        if info.get('input_bytes') and info['wall']:
+            info['throughput'] = round(info['input_bytes'] / info['wall'])
+        record_metrics({k: v for k, v in info.items() if k != 'overlapping' or v})
+        return False
+
+
+def _children_cpu():
+    if resource is None:
+        return None
+    ru = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return ru.ru_utime + ru.ru_stime
+
+
+def _peak_rss():
+    """Peak RSS of this process and of its largest child so far."""
+    if resource is None:
+        return None
+    return max(_maxrss_bytes(resource.getrusage(who).ru_maxrss)
+               for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN))
+
+
+def load_telemetry(path=TELEMETRY_FILE):
+    records = read_journal(path + ".1") + read_journal(path)
+    return records
+
+
+def summarize_telemetry(records, trend_runs=TELEMETRY_TREND_RUNS):
+    """Per operation: runs, failures, total / mean wall time, throughput (bytes/s), mean ratio, last runs."""
+    summary = {}
+    for record in records:
+        key = f"{record.get('type', 'job')}: {record.get('op')}"
+        row = summary.setdefault(key, {'type': record.get('type'), 'op': record.get('op'), 'runs': 0,
+                                       'failed': 0, 'wall': 0.0, 'cpu': 0.0, 'input_bytes': 0,
+                                       'peak_rss': 0, 'ratios': [], 'trend': [], 'last': None})
+        row['runs'] += 1
+        failed = record.get('exit_code') not in (0, None) or record.get('ok') is False
+        row['failed'] += failed
+        row['wall'] += record.get('wall') or 0
+        row['cpu'] += record.get('cpu') or 0
+        row['input_bytes'] += record.get('input_bytes') or 0
+        row['peak_rss'] = max(row['peak_rss'], record.get('peak_rss') or 0)
+        if record.get('ratio'):
+            row['ratios'].append(record['ratio'])
+        row['trend'].append((record.get('ts'), record.get('wall') or 0, not failed))
+        row['last'] = record.get('ts')
+    for row in summary.values():
+        row['mean_wall'] = row['wall'] / row['runs']
+        row['throughput'] = row['input_bytes'] / row['wall'] if row['wall'] and row['input_bytes'] else None
+        row['mean_ratio'] = sum(row['ratios']) / len(row['ratios']) if row['ratios'] else None
+        row['trend'] = row['trend'][-trend_runs:]
+        del row['ratios']
+    return summary
+
+
+def format_rate(bytes_per_second):
+    return f"{format_size(bytes_per_second)}/s" if bytes_per_second else "—"
+
+
+def format_telemetry(summary):
+    """One text line per operation, slowest total first."""
+    lines = [f"{'operation':<28} {'runs':>5} {'fail':>4} {'mean':>8} {'total':>9} {'throughput':>12} {'ratio':>6}"]
+    for key, row in sorted(summary.items(), key=lambda item: -item[1]['wall']):
+        ratio = f"{row['mean_ratio']:.2f}" if row['mean_ratio'] else "—"
+        lines.append(f"{key:<28} {row['runs']:>5} {row['failed']:>4} {row['mean_wall']:>7.2f}s {row['wall']:>8.1f}s "
+                     f"{format_rate(row['throughput']):>12} {ratio:>6}")
+    return lines
+
+
+# =========================================================================
+# TRACING (opt-in spans, Chrome trace export, cProfile)
+# =========================================================================
+# While tracing is on, jobs, worker tasks, child processes, file-system
+# walks and (in the GUI) Tk after() callbacks are recorded as spans and can
+# be exported as Chrome trace JSON — open it in chrome://tracing or
+# ui.perfetto.dev. When tracing is off, trace_span() is a shared no-op.
+PROFILE_DIR = os.path.join(CACHE_DIR, "profiles")
+_tracer = None
+_profile_next = None
+_NO_SPAN = contextlib.nullcontext()
+
+
+class Tracer:
+    """Collects Chrome trace events ('X' complete spans, 'C' counters) from any thread."""
+
+    def __init__(self):
+        self.events = []
+        self.thread_names = {}
+        self.pid = os.getpid()
+        self.t0 = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def _us(self, t):
+        return round((t - self.t0) * 1e6, 1)
+
+    def _add(self, event):
+        thread = threading.current_thread()
+        event.update(pid=self.pid, tid=thread.ident)
+        with self._lock:
+            self.thread_names.setdefault(thread.ident, thread.name)
+            self.events.append(event)
+
+    def complete(self, name, cat, start, end, args=None):
+        self._add({'name': name, 'cat': cat, 'ph': 'X', 'ts': self._us(start),
+                   'dur': round((end - start) * 1e6, 1), 'args': args or {}})
+
+    def counter(self, name, values):
+        self._add({'name': name, 'ph': 'C', 'ts': self._us(time.perf_counter()), 'args': values})
+
+    def export(self, path):
+        """Write the trace as Chrome trace JSON. Returns the number of events."""
+        with self._lock:
+            events = list(self.events)
+            names = dict(self.thread_names)
+        meta = [{'name': 'process_name', 'ph': 'M', 'pid': self.pid, 'args': {'name': "HDK Commander"}}]
+        meta += [{'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid, 'args': {'name': name}}
+                 for tid, name in names.items()]
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': meta + events, 'displayTimeUnit': 'ms'}, f, default=str)
+        os.replace(tmp_path, path)
+        return len(events)
+
+
+class _Span:
+    def __init__(self, tracer, name, cat, args):
+        self.tracer, self.name, self.cat, self.args = tracer, name, cat, args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self.args
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args['error'] = str(exc)
+        self.tracer.complete(self.name, self.cat, self.start, time.perf_counter(), self.args)
+        return False
+
+
+def start_tracing():
+    global _tracer
+    _tracer = Tracer()
+    return _tracer
+
+
+def stop_tracing():
+    """Stop recording. Returns the Tracer (or None) so its events can still be exported."""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def tracing_active():
+    return _tracer is not None
+
+
+def trace_span(name, cat="task", **args):
+    """Context manager recording one span while tracing is on; a no-op otherwise."""
+    tracer = _tracer
+    return _Span(tracer, name, cat, args) if tracer else _NO_SPAN
+
+
+def trace_counter(name, **values):
+    tracer = _tracer
+    if tracer:
+        tracer.counter(name, values)
+
+
+def traced(cat, name=None):
+    """Decorator: record every call of the function as a span of category `cat`."""
+    def wrap(func):
+        @functools.wraps(func)
+        def inner(*args, **kwargs):
+            if _tracer is None:
+                return func(*args, **kwargs)
+            with trace_span(name or func.__name__, cat):
+                return func(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def profile_next_job(enabled=True, on_done=None):
+    """Run the next track_job() under cProfile (only the thread that started the job is profiled).
+    on_done(path, top_functions_text) is called when that job finishes."""
+    global _profile_next
+    _profile_next = (on_done,) if enabled else None
+
+
+def _start_profile():
+    global _profile_next
+    request, _profile_next = _profile_next, None
+    if request is None:
+        return None
+    profiler = cProfile.Profile()
+    profiler.on_done = request[0]
+    try:
+        profiler.enable()
+    except ValueError:  # another profiler (e.g. headless --profile) is already running
+        return None
+    return profiler
+
+
+def _finish_profile(profiler, op):
+    """Save a profile to hdk_cache/profiles/ and return (path, top functions by cumulative time)."""
+    profiler.disable()
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(PROFILE_DIR, f"{re.sub(r'[^A-Za-z0-9]+', '-', op)}-{stamp}.prof")
+    profiler.dump_stats(path)
+    report = io.StringIO()
+    pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(15)
+    return path, report.getvalue()
+
+
+# =========================================================================
+# PROGRESS & ETA
+# =========================================================================
+# A Progress tracks one running job: items and bytes done out of the totals,
+# plus any percentage the tool prints. Its ETA blends the throughput seen so
+# far with the historical throughput of the same operation from telemetry.
+# History dominates at the start, and live numbers take over as the job
+# advances. A job with no countable progress (a single pack or extract
+# whose tool prints nothing) is estimated from elapsed time against its
+# expected duration. Live jobs are listed by active_progress(), which the
+# GUI status bar and the headless progress line poll.
+PROGRESS_HISTORY_RUNS = 20
+PROGRESS_PERCENT = re.compile(rb"(\d{1,3}(?:\.\d+)?)\s*%")
+PROGRESS_COUNT = re.compile(rb"\b(\d+)\s*/\s*(\d+)\b")
+_history = {'offset': 0, 'runs': {}}
+_progress_lock = threading.Lock()
+_active_progress = []
+
+
+def _operation_history(op):
+    """Last successful runs of an operation from telemetry as (wall, input_bytes, items, ratio) tuples.
+    Only lines appended since the previous call are read."""
+    with _progress_lock:
+        try:
+            size = os.path.getsize(TELEMETRY_FILE)
+            if size < _history['offset']:  # rotated
+                _history.update(offset=0, runs={})
+            with open(TELEMETRY_FILE, 'rb') as f:
+                f.seek(_history['offset'])
+                data = f.read()
+        except OSError:
+            data = b""
+        complete = data[:data.rfind(b"\n") + 1]
+        _history['offset'] += len(complete)
+        for line in complete.splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('wall') and record.get('ok', record.get('exit_code') == 0):
+                _history['runs'].setdefault(record.get('op'), deque(maxlen=PROGRESS_HISTORY_RUNS)).append(
+                    (record['wall'], record.get('input_bytes') or 0, record.get('items', 1) or 0, record.get('ratio')))
+        return list(_history['runs'].get(op) or ())
+
+
+def historical_rate(op):
+    """(bytes/s, items/s) over the last successful runs of an operation, from telemetry; None where unknown."""
+    runs = _operation_history(op)
+    if not runs:
+        return None, None
+    wall = sum(r[0] for r in runs)
+    nbytes = sum(r[1] for r in runs)
+    items = sum(r[2] for r in runs)
+    return (nbytes / wall if nbytes else None), (items / wall if items else None)
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return "--:--"
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    return f"{hours}:{rest // 60:02d}:{rest % 60:02d}" if hours else f"{rest // 60}:{rest % 60:02d}"
+
+
+class Progress:
+    """Thread-safe progress of one job. Use as a context manager to list it in active_progress()."""
+
+    def __init__(self, op, total_items=0, total_bytes=0, label=None):
+        self.op = op
+        self.label = label or op
+        self.total_items = total_items
+        self.total_bytes = total_bytes
+        self.items_done = 0
+        self.bytes_done = 0
+        self.tool_fraction = None
+        self.started = time.perf_counter()
+        self.history = historical_rate(op)
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        with _progress_lock:
+            _active_progress.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        with _progress_lock:
+            if self in _active_progress:
+                _active_progress.remove(self)
+        return False
+
+    def advance(self, items=1, nbytes=0):
+        with self._lock:
+            self.items_done += items
+            self.bytes_done += nbytes
+            self.tool_fraction = None  # a percentage printed for the previous item no longer applies
+
+    def parse_output(self, chunk):
+        """Pick up 'NN%' or 'N/M' progress printed by a tool (bytes of its stdout)."""
+        tail = chunk[-200:]
+        match = None
+        for match in PROGRESS_PERCENT.finditer(tail):
+            pass
+        if match:
+            self.tool_fraction = min(1.0, float(match.group(1)) / 100)
+            return
+        for match in PROGRESS_COUNT.finditer(tail):
+            pass
+        if match and 0 < int(match.group(2)) and int(match.group(1)) <= int(match.group(2)):
+            self.tool_fraction = int(match.group(1)) / int(match.group(2))
+
+    def snapshot(self):
+        """Current state: fraction, rates, ETA seconds and whether the figure is only an estimate."""
+        with self._lock:
+            items, nbytes, tool_fraction = self.items_done, self.bytes_done, self.tool_fraction
+        elapsed = time.perf_counter() - self.started
+        hist_bps, hist_ips = self.history
+        estimated = False
+        if self.total_bytes:
+            unit_done, unit_total, hist_rate = nbytes, self.total_bytes, hist_bps
+        else:
+            unit_done, unit_total, hist_rate = items, self.total_items, hist_ips
+        if tool_fraction is not None and self.total_items <= 1:
+            fraction = tool_fraction
+        elif unit_total:
+            fraction = min(1.0, unit_done / unit_total)
+        else:
+            fraction = 0.0
+
+        live_rate = unit_done / elapsed if elapsed > 0 and unit_done else None
+        rate = live_rate
+        if hist_rate and unit_total:
+            weight = min(1.0, fraction * 4)  # trust the live rate fully after 25 %
+            rate = weight * live_rate + (1 - weight) * hist_rate if live_rate else hist_rate
+
+        eta = None
+        if fraction >= 1.0:
+            eta = 0.0
+        elif tool_fraction and self.total_items <= 1:
+            eta = elapsed * (1 - tool_fraction) / tool_fraction
+        elif rate and unit_total:
+            eta = max(0.0, (unit_total - unit_done) / rate)
+            if not unit_done:
+                # Nothing countable finished yet: show progress against the expected duration
+                expected = unit_total / rate
+                fraction, eta, estimated = min(0.99, elapsed / expected), max(0.0, expected - elapsed), True
+        return {'op': self.op, 'label': self.label, 'items_done': items, 'total_items': self.total_items,
+                'bytes_done': nbytes, 'total_bytes': self.total_bytes, 'fraction': fraction,
+                'elapsed': elapsed, 'eta': eta, 'estimated': estimated,
+                'bytes_per_s': nbytes / elapsed if elapsed > 0 and nbytes else None,
+                'items_per_s': items / elapsed if elapsed > 0 and items else None}
+
+
+def active_progress():
+    with _progress_lock:
+        return list(_active_progress)
+
+
+def format_progress(snap):
+    parts = [snap['label']]
+    if snap['total_items'] > 1:
+        parts.append(f"{snap['items_done']}/{snap['total_items']}")
+    parts.append(f"{snap['fraction'] * 100:.0f}%" + ("~" if snap['estimated'] else ""))
+    if snap['bytes_per_s']:
+        parts.append(format_rate(snap['bytes_per_s']))
+    elif snap['items_per_s']:
+        parts.append(f"{snap['items_per_s']:.1f}/s")
+    parts.append(f"ETA {format_eta(snap['eta'])}")
+    return " · ".join(parts)
+
+
+# =========================================================================
+# RESOURCE GOVERNOR (priority, I/O priority, CPU affinity, memory ceiling)
+# =========================================================================
+# Every child process is classified by job type (compress, luac, pack...)
+# and started under that type's profile, so batch work runs in the
+# background and the GUI and RPCS3 stay responsive. A profile sets:
+#   nice       0-19, applied with setpriority (a lower priority class on Windows)
+#   io         "normal", "low" (best-effort level 7) or "idle" (Linux ioprio)
+#   cpus       affinity list such as "2-7" or "0,2,4" (Linux)
+#   memory_mb  per-process ceiling: -Xmx for the JVM, RLIMIT_AS for native tools
+#              (Linux; on macOS they apply only to the JVM)
+# Profiles come from DEFAULT_RESOURCE_PROFILES, overridden by the
+# "resource_profiles" entry in hdk_settings.json.
+DEFAULT_RESOURCE_PROFILES = {
+    'compress': {'nice': 10, 'io': "low", 'cpus': "", 'memory_mb': 0},
+    'luac': {'nice': 10, 'io': "low", 'cpus': "", 'memory_mb': 0},
+    'resharc': {'nice': 5, 'io': "low", 'cpus': "", 'memory_mb': 0},
+    'pack': {'nice': 5, 'io': "normal", 'cpus': "", 'memory_mb': 0},
+    'extract': {'nice': 5, 'io': "normal", 'cpus': "", 'memory_mb': 0},
+    'map': {'nice': 5, 'io': "normal", 'cpus': "", 'memory_mb': 0},
+    'other': {'nice': 0, 'io': "normal", 'cpus': "", 'memory_mb': 0},
+}
+IO_PRIORITIES = ("normal", "low", "idle")
+# ioprio_set syscall numbers by machine (no libc wrapper exists)
+IOPRIO_SET_SYSCALLS = {'x86_64': 251, 'amd64': 251, 'aarch64': 30, 'arm64': 30, 'i386': 289, 'i686': 289,
+                       'armv7l': 314, 'ppc64le': 273, 'riscv64': 30}
+_resource_profiles = None
+
+
+def job_type(cmd):
+    """Job type of a tool command line, for choosing its resource profile."""
+    op = _operation(cmd)
+    if op in ("java unluac", "resharc"):
+        return {'java unluac': 'luac', 'resharc': 'resharc'}[op]
+    words = op.split()
+    if words[0] == "hdk" and len(words) > 1:
+        if words[1] == "compress":
+            return 'compress'
+        if words[1] == "map":
+            return 'map'
+        if words[1] in ARCHIVE_TYPES.values() and len(words) > 2:
+            return {'c': 'pack', 'x': 'extract'}.get(words[2], 'other')
+    return 'other'
+
+
+def set_resource_profiles(overrides):
+    """Use DEFAULT_RESOURCE_PROFILES with `overrides` ({job type: {key: value}}) for every child from now on."""
+    global _resource_profiles
+    profiles = {kind: dict(profile) for kind, profile in DEFAULT_RESOURCE_PROFILES.items()}
+    for kind, profile in (overrides or {}).items():
+        if kind in profiles and isinstance(profile, dict):
+            profiles[kind].update({k: v for k, v in profile.items() if k in profiles[kind]})
+    _resource_profiles = profiles
+    return profiles
+
+
+def resource_profile(kind):
+    if _resource_profiles is None:
+        set_resource_profiles(load_settings().get("resource_profiles"))
+    return _resource_profiles.get(kind, _resource_profiles['other'])
+
+
+def parse_cpu_list(spec):
+    """'0-3,6' -> {0, 1, 2, 3, 6}; empty means no restriction."""
+    cpus = set()
+    for part in str(spec or "").replace(" ", "").split(","):
+        if not part:
+            continue
+        low, _, high = part.partition("-")
+        cpus.update(range(int(low), int(high or low) + 1))
+    return cpus
+
+
+def governed_command(cmd, profile):
+    """The JVM enforces its own heap ceiling; pass it as -Xmx unless one is already given."""
+    cmd = list(cmd)
+    memory_mb = int(profile.get('memory_mb') or 0)
+    if memory_mb and job_type(cmd) == 'luac' and not any(str(a).startswith("-Xmx") for a in cmd):
+        cmd.insert(1, f"-Xmx{memory_mb}m")
+    return cmd
+
+
+def priority_creationflags(profile):
+    """Popen creationflags: Windows has priority classes instead of nice values."""
+    if not IS_WINDOWS:
+        return 0
+    nice = int(profile.get('nice') or 0)
+    if nice >= 15:
+        return subprocess.IDLE_PRIORITY_CLASS
+    return subprocess.BELOW_NORMAL_PRIORITY_CLASS if nice > 0 else 0
+
+
+def _set_io_priority(pid, level):
+    """Linux ioprio_set: 'low' = best-effort class level 7, 'idle' = idle class."""
+    number = IOPRIO_SET_SYSCALLS.get(platform.machine().lower())
+    if not number or not IS_LINUX or level not in ("low", "idle"):
+        return False
+    import ctypes
+    ioprio = (3 << 13) if level == "idle" else ((2 << 13) | 7)
+    libc = ctypes.CDLL(None, use_errno=True)
+    return libc.syscall(number, 1, pid, ioprio) == 0  # IOPRIO_WHO_PROCESS
+
+
+def govern_process(pid, cmd, profile):
+    """Apply a profile to a just-started child. Returns the settings that took effect."""
+    applied = {}
+    if IS_WINDOWS:
+        return applied  # priority already set through creationflags
+    nice = int(profile.get('nice') or 0)
+    try:
+        if nice:
+            os.setpriority(os.PRIO_PROCESS, pid, min(19, max(0, nice)))
+            applied['nice'] = nice
+        if profile.get('io') in ("low", "idle") and _set_io_priority(pid, profile['io']):
+            applied['io'] = profile['io']
+        cpus = parse_cpu_list(profile.get('cpus')) & set(range(os.cpu_count() or 1))
+        if cpus and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(pid, cpus)
+            applied['cpus'] = sorted(cpus)
+        memory_mb = int(profile.get('memory_mb') or 0)
+        if memory_mb and job_type(cmd) != 'luac' and resource is not None and hasattr(resource, "prlimit"):
+            limit = memory_mb * 1024 * 1024
+            resource.prlimit(pid, resource.RLIMIT_AS, (limit, limit))
+            applied['memory_mb'] = memory_mb
+    except (OSError, ValueError):
+        pass  # the child may already have exited; never fail the job over its priority
+    return applied
+
+
+def governor_support():
+    """Which profile settings this platform can enforce."""
+    return {
+        'nice': True,
+        'io': IS_LINUX and platform.machine().lower() in IOPRIO_SET_SYSCALLS,
+        'cpus': hasattr(os, "sched_setaffinity"),
+        'memory_mb': "java + native" if resource is not None and hasattr(resource, "prlimit") else "java only",
+    }
+
+
+# =========================================================================
+# DISK SPACE PREFLIGHT (estimate output size, check free space, scratch volume)
+# =========================================================================
+# Before an extract or pack starts writing, its output size is estimated:
+#   .bar        exact, from the TOC's uncompressed entry sizes
+#   .pkg        the data size in the PKG header (contents are stored, not compressed)
+#   .sdat/.sharc  archive size x the extract ratio seen in telemetry for that
+#               operation, else the SDAT header's payload size x DEFAULT_EXTRACT_EXPANSION
+#   pack        input tree size (the archive is never larger than its input plus the TOC)
+# If the target volume cannot hold the estimate plus a margin, the job moves to the
+# scratch folder (setting "scratch_dir") when that volume can, and is refused
+# otherwise, before any file is written, or waits for space to free up when
+# the caller allows it. Jobs of at least "scratch_min_mb" always go to scratch.
+PREFLIGHT_MARGIN = 1.10
+PREFLIGHT_RESERVE = 256 * 1024 * 1024  # keep this much free on any volume
+DEFAULT_EXTRACT_EXPANSION = 3.0
+PKG_MAGIC = b"\x7fPKG"
+NPD_MAGIC = b"NPD\x00"
+NPD_HEADER_SIZE = 0x80  # NPD header, then the EDAT header: flags, block size, payload size
+PREFLIGHT_POLL_INTERVAL = 30
+
+
+class DiskSpaceError(OSError):
+    """Raised when a job's estimated output does not fit on the target (or scratch) volume."""
+
+    def __init__(self, message, check):
+        super().__init__(message)
+        self.errno = errno.ENOSPC
+        self.check = check
+
+
+def free_space(path):
+    """Free bytes on the volume holding `path` (the nearest existing parent if it does not exist yet)."""
+    path = os.path.abspath(path)
+    while not os.path.exists(path) and os.path.dirname(path) != path:
+        path = os.path.dirname(path)
+    return shutil.disk_usage(path).free
+
+
+def same_volume(a, b):
+    """Whether two paths (or their nearest existing parents) are on the same drive."""
+    def device(path):
+        path = os.path.abspath(path)
+        while not os.path.exists(path) and os.path.dirname(path) != path:
+            path = os.path.dirname(path)
+        return os.stat(path).st_dev
+    return device(a) == device(b)
+
+
+def _historical_ratio(op):
+    """Median output/input ratio of the operation's recent successful runs, or None."""
+    ratios = sorted(run[3] for run in _operation_history(op) if run[3])
+    return ratios[len(ratios) // 2] if ratios else None
+
+
+def estimate_extract_size(path):
+    """(estimated extracted bytes, how it was estimated) for an archive."""
+    file_size = os.path.getsize(path)
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".bar":
+        try:
+            _, entries = read_archive_toc(path)
+            return sum(e['size'] for e in entries), "TOC"
+        except ArchiveFormatError:
+            pass
+    with open(path, 'rb') as f:
+        header = f.read(NPD_HEADER_SIZE + 16)
+    if ext == ".pkg" and header[:4] == PKG_MAGIC and len(header) >= 0x30:
+        return struct.unpack_from('>Q', header, 0x28)[0], "PKG header"
+    ratio = _historical_ratio(f"hdk {ARCHIVE_TYPES.get(ext, '')} x".strip())
+    if ratio:
+        return int(file_size * ratio), "history"
+    if header[:4] == NPD_MAGIC and len(header) >= NPD_HEADER_SIZE + 16:
+        payload = struct.unpack_from('>Q', header, NPD_HEADER_SIZE + 8)[0]
+        if 0 < payload <= file_size * 2:  # sanity: the payload is the encrypted body
+            return int(payload * DEFAULT_EXTRACT_EXPANSION), "SDAT header"
+    return int(file_size * DEFAULT_EXTRACT_EXPANSION), "file size"
+
+
+def estimate_pack_size(folder):
+    return path_bytes(folder), "input size"
+
+
+def check_space(needed, target, scratch_dir=None, scratch_min=0):
+    """Decide where a job writing about `needed` bytes to `target` should write.
+    Returns a dict with ok, needed, free, volume ('target' or 'scratch') and reason."""
+    required = int(needed * PREFLIGHT_MARGIN) + PREFLIGHT_RESERVE
+    target_free = free_space(target)
+    check = {'ok': True, 'needed': needed, 'required': required, 'free': target_free, 'volume': "target",
+             'target': target, 'reason': ""}
+    use_scratch = bool(scratch_dir) and not same_volume(scratch_dir, target)
+    if use_scratch and (needed >= scratch_min > 0 or required > target_free):
+        scratch_free = free_space(scratch_dir)
+        if required <= scratch_free:
+            check.update(volume="scratch", free=scratch_free,
+                         reason="large job" if required <= target_free else "target volume is too full")
+            return check
+        check['scratch_free'] = scratch_free
+    if required > target_free:
+        check.update(ok=False, reason=f"needs about {format_size(required)} (estimate {format_size(needed)} + margin), "
+                                      f"only {format_size(target_free)} free on the target volume"
+                                      + (f" and {format_size(check['scratch_free'])} on scratch"
+                                         if 'scratch_free' in check else ""))
+    return check
+
+
+def preflight(kind, source, output, settings=None, log=None, wait=0, should_stop=None, copies=1):
+    """Estimate an extract ('extract', source = archive) or pack ('pack', source = folder) and check
+    space, re-checking for up to `wait` seconds while it does not fit. `copies` outputs of that size go
+    to the same folder. Returns (output path to use, check); raises DiskSpaceError before anything is written."""
+    settings = load_settings() if settings is None else settings
+    needed, method = estimate_extract_size(source) if kind == "extract" else estimate_pack_size(source)
+    needed *= copies
+    scratch_dir = settings.get("scratch_dir") or None
+    scratch_min = int(settings.get("scratch_min_mb") or 0) * 1024 * 1024
+    deadline = time.monotonic() + wait
+    while True:
+        check = check_space(needed, output, scratch_dir, scratch_min)
+        check['method'] = method
+        if check['ok'] or time.monotonic() >= deadline or (should_stop and should_stop()):
+            break
+        if log:
+            log(f"Waiting for disk space: {check['reason']}", "warning")
+        time.sleep(min(PREFLIGHT_POLL_INTERVAL, max(0.0, deadline - time.monotonic())))
+    if not check['ok']:
+        raise DiskSpaceError(f"Not enough disk space for {os.path.basename(source)}: {check['reason']}.", check)
+    if check['volume'] == "scratch":
+        output = os.path.join(scratch_dir, os.path.basename(output))
+        if log:
+            log(f"Writing to scratch volume ({check['reason']}): {output}", "info")
+    return output, check
+
+
+# =========================================================================
+# SHARED TOOL HELPERS
+# =========================================================================
+ARCHIVE_TYPES = {".sdat": "sdat", ".bar": "bar", ".sharc": "sharc", ".pkg": "pkg"}
+COMPRESSIBLE_EXTENSIONS = ['.bar', '.havok', '.hkx', '.dds', '.xml']
+
+
+def get_startupinfo():
+    """Hide console windows for child processes on Windows."""
+    if IS_WINDOWS:
+        si = subprocess.STARTUPINFO()
+        si.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        return si
+    return None
+
+
+def run_tool(cmd, input_data=None, progress=None):
+    """Run a child process to completion (recording its metrics). Returns (returncode, stdout, stderr) as text.
+    With a Progress, stdout is read as it arrives and any percentage the tool prints is passed on."""
+    profile = resource_profile(job_type(cmd))
+    cmd = governed_command(cmd, profile)
+    started = time.perf_counter()
+    with trace_span(_operation(cmd), "process", cmd=" ".join(map(str, cmd))):
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            stdin=subprocess.PIPE if input_data is not None else None,
+            text=False,
+            startupinfo=get_startupinfo(),
+            creationflags=priority_creationflags(profile)
+        )
+        govern_process(process.pid, cmd, profile)
+        stdout, stderr = _drain(process, input_data, progress)
+        rusage = _reap(process)
+    _record_process(cmd, process, time.perf_counter() - started, len(stdout), rusage)
+    return (process.returncode,
+            stdout.decode('utf-8', errors='ignore'),
+            stderr.decode('utf-8', errors='ignore'))
+
+
+def _drain(process, input_data, progress=None):
+    """communicate() without the wait: feed stdin, read stdout / stderr to EOF. Returns (stdout, stderr).
+    With a Progress, any percentage the tool prints is passed on as it arrives."""
+    stderr_parts = []
+
+    def feed_and_drain():
+        if input_data is not None:
+            try:
+                process.stdin.write(input_data)
+                process.stdin.close()
+            except OSError:
+                pass
+        stderr_parts.append(process.stderr.read())
+
+    helper = threading.Thread(target=feed_and_drain, daemon=True)
+    helper.start()
+    stdout = bytearray()
+    while True:
+        chunk = process.stdout.read1(65536)
+        if not chunk:
+            break
+        stdout += chunk
+        if progress is not None:
+            progress.parse_output(bytes(stdout[-200:]))
+    helper.join()
+    process.stdout.close()
+    process.stderr.close()
+    return bytes(stdout), b"".join(stderr_parts)
+
+
+def run_with_progress(cmd, input_data=None, label=None):
+    """run_tool for a single long tool call (pack, extract, map...), listed in active_progress()."""
+    input_path, _ = _io_paths(list(cmd))
+    total_bytes = path_bytes(input_path) if input_path and os.path.exists(input_path) else 0
+    with Progress(_operation(cmd), 1, total_bytes, label=label) as progress:
+        return run_tool(cmd, input_data, progress=progress)
+
+
+def run_checked(cmd):
+    """run_tool that raises CalledProcessError on a non-zero exit. Returns stdout."""
+    returncode, out_str, err_str = run_tool(cmd)
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd, out_str, err_str)
+    return out_str
+
+
+def clean_output_name(input_path, format_type):
+    """Default archive name for a folder: strip _extracted and any extension."""
+    base_name = os.path.basename(os.path.normpath(input_path))
+    if base_name.endswith("_extracted"):
+        base_name = base_name.replace("_extracted", "")
+    base_name, _ = os.path.splitext(base_name)
+    return f"{base_name}.{format_type}"
+
+
+def is_compressible(name):
+    """Asset types the Auto-Optimize pass runs through hdk compress (plus extensionless files)."""
+    return any(name.lower().endswith(ext) for ext in COMPRESSIBLE_EXTENSIONS) or "." not in name
+
+
+@traced("fs")
+def find_compressible(directory):
+    return [os.path.join(root, file) for root, _, files in os.walk(directory) for file in files
+            if is_compressible(file)]
+
+
+def batch_compress(hdk_path, directory, algo, log=None, journal=None):
+    """Compress every known asset under directory in place. Returns the number of files compressed.
+
+    Runs under a job journal (a new one unless one is passed to resume); journal=False disables it.
+    """
+    own_journal = journal is None
+    if own_journal:
+        journal = JobJournal.start("compress", {'hdk_path': hdk_path, 'directory': os.path.abspath(directory),
+                                                'algo': algo}, find_compressible(directory))
+    files = journal.remaining() if journal else find_compressible(directory)
+
+    count = 0
+    sizes = [path_bytes(f) for f in files]
+    with track_job("batch compress", algo=algo, items=len(files), input_bytes=sum(sizes)) as job, \
+            Progress("batch compress", len(files), sum(sizes), label="Compressing") as progress:
+        for full_path, size in zip(files, sizes):
+            temp_path = full_path + ".tmp"
+            if journal:
+                journal.begin(full_path, temps=[temp_path], target=full_path)
+            ok = False
+            try:
+                run_checked([hdk_path, "compress", "c", "-a", algo, "-i", full_path, "-o", temp_path])
+                shutil.move(temp_path, full_path)
+                count += 1
+                ok = True
+            except Exception:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            if journal:
+                journal.complete(full_path, ok)
+            progress.advance(1, size)
+        job['output_bytes'] = sum(path_bytes(f) for f in files)
+        job['ok'] = count == len(files)
+
+    if journal:
+        journal.close()
+    return count
+
+
+def map_folder(hdk_path, target_dir, names, full_scan=False, uuid_val="", use_names=True, log=None, verbose=False,
+               label=None):
+    """Known-name pre-pass, then hdk map for whatever is left; learns the new names afterwards."""
+    log = log or (lambda msg, tag=None: None)
+    label = label or os.path.basename(target_dir)
+    if use_names and len(names):
+        renamed, remaining = apply_known_names(target_dir, names)
+        log(f"[{label}] Learned names applied: {renamed} renamed, {remaining} still hashed", "info")
+        if renamed and not remaining:
+            log(f"[{label}] Fully resolved from the dictionary — hdk map skipped.", "success")
+            return True
+
+    snapshot = snapshot_hashed_files(target_dir)
+    cmd = [hdk_path, "map", "-i", target_dir]
+    if uuid_val:
+        cmd.extend(["-u", uuid_val])
+    if full_scan:
+        cmd.append("--full")
+    if verbose:
+        log(f"RUNNING: hdk {' '.join(cmd[1:])}")
+
+    returncode, out_str, err_str = run_with_progress(cmd, label=f"Map {label}")
+    if verbose:
+        if out_str.strip(): log(out_str)
+        if err_str.strip(): log("LOG: " + err_str)
+
+    learned = learn_from_renames(target_dir, snapshot, names)
+    names.save()
+
+    if returncode != 0:
+        log(f"[{label}] !!! MAP FAILED (Code {returncode}) !!!", "error")
+        return False
+    log(f"[{label}] Mapped — {learned} new name(s) learned.", "success")
+    return True
+
+
+# =========================================================================
+# MINIFICATION (XML / Lua, before packing)
+# =========================================================================
+# Scene XML drops comments, indentation (whitespace-only text holding a
+# line break) between elements and extra whitespace inside tags. Text
+# content, attribute values, CDATA and processing instructions stay byte
+# for byte, and so does whitespace that may be meaningful: the text of
+# leaf elements like <label> </label>, spaces on one line between inline
+# elements like <text><b>Hello</b> <i>world</i></text>, and any whitespace
+# inside an element that also holds other text (mixed content). Each result is parsed again
+# and compared element by element with the original, and a file that
+# differs, does not parse or uses xml:space or an internal DTD subset is
+# left alone. Lua source loses comments, indentation, blank lines and
+# repeated spaces, while strings (quoted and [[long]]) are copied verbatim.
+# Newlines between statements are kept, so nothing can merge into a
+# different statement; only line numbers in error messages change.
+# Minification always runs on a staging copy (hardlinks, and rewritten files
+# are replaced), never on the folder itself. Each pack gets its own copy,
+# removed afterwards, so two packs of one folder never share a stage.
+MINIFY_DIR = os.path.join(CACHE_DIR, "minify")
+MINIFY_XML_EXTENSIONS = ('.xml', '.scene', '.sdc', '.odc')
+MINIFY_WORKERS = PATCH_WORKERS
+_XML_TOKEN = re.compile(rb"<!\[CDATA\[.*?\]\]>|<!--.*?-->|<\?.*?\?>|<![^>]*>|<[^>]*>|[^<]+", re.S)
+_XML_TAG_SPACE = re.compile(rb"(\"[^\"]*\"|'[^']*')|\s+")
+_XML_LINE_BREAK = re.compile(r"[\r\n]")
+_LUA_LONG_BRACKET = re.compile(rb"\[(=*)\[")
+
+
+def _xml_signature(element):
+    """Comparable form of a parsed tree. Indentation (whitespace-only text with a line break) counts as
+    absent between tags; a leaf element's text and all text and tails of mixed content are compared exactly."""
+    children = list(element)
+    exact = not children or any(value and value.strip() for value in [element.text] + [c.tail for c in children])
+
+    def text(value):
+        return value or "" if exact or not value or not _XML_LINE_BREAK.search(value) else ""
+    return (element.tag, sorted(element.attrib.items()), text(element.text),
+            [(_xml_signature(child), text(child.tail)) for child in children])
+
+
+def minify_xml(data):
+    """Minified XML bytes, or None when the file is left as it is."""
+    if b"xml:space" in data:
+        return None
+    out, pos = [], 0
+    # Whitespace-only text right after a start tag is held back: it is kept if the element closes
+    # straight away (a leaf's value, e.g. <label> </label>). Otherwise whitespace between tags without
+    # a line break is kept, and indentation is kept only if the element it sits in turns out to hold
+    # other text (mixed content). It goes into `out` as (token, element frame), resolved at the end.
+    pending, after_start = [], False
+    stack = []  # one frame per open element: {'mixed': bool}
+    keep = {'mixed': True}
+
+    def hold(space):
+        return space, stack[-1] if b"\n" in space or b"\r" in space else keep
+    for match in _XML_TOKEN.finditer(data):
+        if match.start() != pos:
+            return None  # stray '<' or similar: not well-formed enough to touch
+        token = match.group()
+        pos = match.end()
+        if token.startswith(b"<!--"):
+            continue
+        if not token.startswith(b"<") and not token.strip():
+            if after_start:
+                pending.append(token)
+            elif stack:
+                out.append(hold(token))
+            continue
+        if token.startswith(b"</") and after_start:
+            out.extend(pending)
+        elif stack:
+            out.extend(hold(space) for space in pending)
+        pending, after_start = [], False
+        if stack and (token.startswith(b"<![CDATA[") or not token.startswith(b"<")):
+            stack[-1]['mixed'] = True
+        if token.startswith((b"<![CDATA[", b"<?")):
+            out.append(token)
+        elif token.startswith(b"<!"):
+            if b"[" in token:
+                return None  # internal DTD subset
+            out.append(token)
+        elif token.startswith(b"<"):
+            tag = _XML_TAG_SPACE.sub(lambda m: m.group(1) or b" ", token)
+            out.append(tag.replace(b" />", b"/>").replace(b" >", b">"))
+            after_start = not token.startswith(b"</") and not token.endswith(b"/>")
+            if token.startswith(b"</"):
+                if not stack:
+                    return None
+                stack.pop()
+            elif after_start:
+                stack.append({'mixed': False})
+        else:
+            out.append(token)
+    if pos != len(data):
+        return None
+    result = b"".join(part if isinstance(part, bytes) else part[0] if part[1]['mixed'] else b""
+                      for part in out)
+    import xml.etree.ElementTree as ElementTree
+    try:
+        if _xml_signature(ElementTree.fromstring(data)) != _xml_signature(ElementTree.fromstring(result)):
+            return None
+    except (ElementTree.ParseError, ValueError):
+        return None
+    return result
+
+
+def _lua_long_close(data, start):
+    """End index of the long bracket ([[, [==[ ...) opening at `start`, or None."""
+    match = _LUA_LONG_BRACKET.match(data, start)
+    if not match:
+        return None
+    end = data.find(b"]" + match.group(1) + b"]", match.end())
+    return None if end < 0 else end + len(match.group(1)) + 2
+
+
+def minify_lua(data):
+    """Lua source without comments, indentation, blank lines or repeated spaces; None if it cannot be tokenized."""
+    out = bytearray()
+    i, n = 0, len(data)
+    if data.startswith(b"#"):  # shebang line
+        i = data.find(b"\n")
+        i = n if i < 0 else i
+        out += data[:i]
+    while i < n:
+        c = data[i:i + 1]
+        if data.startswith(b"--", i):
+            end = _lua_long_close(data, i + 2)
+            if end is not None:
+                i = end
+                if out and out[-1:] not in (b" ", b"\n"):
+                    out += b" "
+            else:
+                i = data.find(b"\n", i)
+                i = n if i < 0 else i
+            continue
+        if c in (b'"', b"'"):
+            j = i + 1
+            while j < n and data[j:j + 1] != c:
+                if data[j:j + 1] == b"\\":
+                    j += 1
+                elif data[j:j + 1] == b"\n":
+                    return None
+                j += 1
+            if j >= n:
+                return None
+            out += data[i:j + 1]
+            i = j + 1
+            continue
+        if c == b"[":
+            end = _lua_long_close(data, i)
+            if end is None and _LUA_LONG_BRACKET.match(data, i):
+                return None  # unterminated long string
+            if end is not None:
+                out += data[i:end]
+                i = end
+                continue
+        if c in (b" ", b"\t", b"\r"):
+            if out and out[-1:] not in (b" ", b"\n"):
+                out += b" "
+            i += 1
+            continue
+        if c == b"\n":
+            while out[-1:] == b" ":
+                out.pop()
+            if out and out[-1:] != b"\n":
+                out += b"\n"
+            i += 1
+            continue
+        out += c
+        i += 1
+    while out[-1:] == b" ":
+        out.pop()
+    return bytes(out)
+
+
+def minify_file(path, lua=False):
+    """Minify one file in place (temp + rename). Returns (bytes before, bytes after); after == before when
+    the file was left alone."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    result = None
+    if b"\0" not in data[:4096]:  # compressed or encrypted files are binary
+        ext = os.path.splitext(path)[1].lower()
+        if ext in MINIFY_XML_EXTENSIONS:
+            result = minify_xml(data)
+        elif lua and ext == ".lua":
+            result = minify_lua(data)
+    if result is None or len(result) >= len(data):
+        return len(data), len(data)
+    tmp_path = path + ".min.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(result)
+    st = os.stat(path)
+    os.replace(tmp_path, path)
+    # Same mtime as the source, so staging mirrors see an unchanged source as unchanged
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    return len(data), len(result)
+
+
+def minify_tree(root, lua=False, workers=MINIFY_WORKERS):
+    """Minify every XML (and with lua=True, .lua) file under a staging folder in place. Returns a report."""
+    extensions = MINIFY_XML_EXTENSIONS + ((".lua",) if lua else ())
+    files = [os.path.join(dirpath, name) for dirpath, _, names in os.walk(root)
+             for name in names if name.lower().endswith(extensions)]
+    report = {'files': len(files), 'minified': 0, 'bytes_before': 0, 'bytes_after': 0, 'by_type': {}, 'errors': []}
+
+    def work(path):
+        try:
+            return path, minify_file(path, lua)
+        except OSError as e:
+            return path, e
+
+    with track_job("minify", items=len(files)) as job, \
+            Progress("minify", len(files), label="Minifying") as progress, \
+            ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for path, result in pool.map(work, files):
+            progress.advance()
+            if isinstance(result, OSError):
+                report['errors'].append(f"{path}: {result}")
+                continue
+            before, after = result
+            row = report['by_type'].setdefault(os.path.splitext(path)[1].lower(), {'files': 0, 'before': 0, 'after': 0})
+            row['files'] += 1
+            row['before'] += before
+            row['after'] += after
+            report['bytes_before'] += before
+            report['bytes_after'] += after
+            report['minified'] += after < before
+        job.update(input_bytes=report['bytes_before'], output_bytes=report['bytes_after'], ok=not report['errors'])
+    report['saved'] = report['bytes_before'] - report['bytes_after']
+    return report
+
+
+def _sweep_stages(stage_root):
+    """Remove stages under stage_root left behind by processes that are no longer running (e.g. after a crash)."""
+    try:
+        names = os.listdir(stage_root)
+    except OSError:
+        return
+    for name in names:
+        match = re.match(r"[0-9a-f]{16}-(\d+)-", name)
+        if match and int(match.group(1)) != os.getpid() and not _pid_alive(int(match.group(1))):
+            shutil.rmtree(os.path.join(stage_root, name), ignore_errors=True)
+
+
+def _private_stage(root, stage_root):
+    """A new empty stage dir for one pack of root, named so _sweep_stages can tell its owner."""
+    os.makedirs(stage_root, exist_ok=True)
+    _sweep_stages(stage_root)
+    key = hashlib.sha1(os.path.abspath(root).encode('utf-8')).hexdigest()[:16]
+    return tempfile.mkdtemp(prefix=f"{key}-{os.getpid()}-", dir=stage_root)
+
+
+def stage_minified(root, lua=False, workers=MINIFY_WORKERS):
+    """Hardlinked staging copy of root with XML (and Lua) minified, private to this pack (remove it with
+    shutil.rmtree once packed). Returns (stage dir, report)."""
+    stage_dir = _private_stage(root, MINIFY_DIR)
+    try:
+        clone_tree(root, stage_dir)
+        return stage_dir, minify_tree(stage_dir, lua, workers)
+    except BaseException:
+        shutil.rmtree(stage_dir, ignore_errors=True)
+        raise
+
+
+def format_minify_report(report):
+    lines = [f"Minified {report['minified']} of {report['files']} file(s): "
+             f"{format_size(report['bytes_before'])} -> {format_size(report['bytes_after'])} "
+             f"(saved {format_size(report['saved'])})"]
+    for ext, row in sorted(report['by_type'].items()):
+        if row['before']:
+            lines.append(f"  {ext:<8}{row['files']:>6} file(s)  {format_size(row['before']):>10} -> "
+                         f"{format_size(row['after']):>10}  ({(1 - row['after'] / row['before']) * 100:.0f}% smaller)")
+    for error in report['errors'][:5]:
+        lines.append(f"  ERROR {error}")
+    return lines
+
+
+# =========================================================================
+# SCENE PIPELINE (extract → map → patch → compress → pack)
+# =========================================================================
+PIPELINE_STAGES = ("extract", "map", "patch", "compress", "pack")
+PIPELINE_DIR = os.path.join(CACHE_DIR, "pipeline")
+
+
+def file_fingerprint(path):
+    """Cheap identity for an input file: path, size and mtime."""
+    st = os.stat(path)
+    return f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+
+
+def chain_fingerprint(*parts):
+    return hashlib.sha1("\0".join(str(p) for p in parts).encode('utf-8')).hexdigest()
+
+
+def clone_tree(src, dst, exclude=()):
+    """Copy a tree using hardlinks where possible. Our stages only ever replace
+    files (temp + rename), so a linked clone never modifies the cached source.
+    `exclude` holds '/'-separated relative paths that are left out."""
+    if os.path.exists(dst):
+        shutil.rmtree(dst)
+    for dirpath, _, files in os.walk(src):
+        rel_dir = os.path.relpath(dirpath, src)
+        out_dir = os.path.join(dst, rel_dir)
+        os.makedirs(out_dir, exist_ok=True)
+        for name in files:
+            if exclude and _join_rel("" if rel_dir == "." else rel_dir.replace(os.sep, "/"), name) in exclude:
+                continue
+            s_path, d_path = os.path.join(dirpath, name), os.path.join(out_dir, name)
+            try:
+                os.link(s_path, d_path)
+            except OSError:
+                shutil.copy2(s_path, d_path)
+
+
+def run_dag(tasks, workers, should_stop=None):
+    """Run {key: (fn, [dep keys])} on a thread pool, each task once all of its deps succeeded.
+    Returns {key: True | False | None} where None means skipped (failed dependency or stopped)."""
+    results = {}
+    pending = dict(tasks)
+    running = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            for key, (fn, deps) in list(pending.items()):
+                if any(d in results and results[d] is not True for d in deps):
+                    results[key] = None
+                elif all(results.get(d) is True for d in deps):
+                    if should_stop and should_stop():
+                        results[key] = None
+                    else:
+                        running[pool.submit(fn)] = key
+                else:
+                    continue
+                del pending[key]
+
+            if not running:
+                # Nothing can start: unknown or cyclic dependencies
+                for key in pending:
+                    results[key] = None
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = running.pop(future)
+                try:
+                    results[key] = bool(future.result())
+                except Exception:
+                    results[key] = False
+    return results
+
+
+class ScenePipeline:
+    """Builds offline-ready archives from many input archives, caching every stage."""
+
+    def __init__(self, hdk_path, inputs, output_dir, options, names, log=None, workers=2):
+        self.hdk_path = hdk_path
+        self.inputs = list(inputs)
+        self.output_dir = output_dir
+        self.options = options
+        self.names = names
+        self.log = log or (lambda msg, tag=None: None)
+        self.workers = workers
+        self.stop_requested = False
+        self.tool_id = file_fingerprint(hdk_path)
+        self.progress = Progress("pipeline", len(self.inputs) * len(PIPELINE_STAGES), label="Offline build")
+
+    def scene_dir(self, input_path):
+        stem = os.path.splitext(os.path.basename(input_path))[0]
+        key = hashlib.sha1(os.path.abspath(input_path).encode('utf-8')).hexdigest()[:8]
+        return os.path.join(PIPELINE_DIR, f"{stem}-{key}")
+
+    def fingerprints(self, input_path):
+        """Each stage's fingerprint chains the previous one, so a change invalidates everything after it."""
+        opts = self.options
+        fps = {}
+        fps['extract'] = chain_fingerprint(file_fingerprint(input_path), self.tool_id)
+        fps['map'] = chain_fingerprint(fps['extract'], opts.get('full_map', False))
+        fps['patch'] = chain_fingerprint(fps['map'], opts.get('patch_rules', "").strip())
+        fps['compress'] = chain_fingerprint(fps['patch'], opts.get('compress', True), opts.get('algo', "lzma"),
+                                            opts.get('minify', False), opts.get('minify_lua', False))
+        fps['pack'] = chain_fingerprint(fps['compress'], opts.get('format', "sdat"))
+        return fps
+
+    def _cached(self, marker_path, fingerprint):
+        try:
+            with open(marker_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('fingerprint') == fingerprint
+        except Exception:
+            return False
+
+    def _mark(self, marker_path, fingerprint, **extra):
+        with open(marker_path, 'w', encoding='utf-8') as f:
+            json.dump(dict(fingerprint=fingerprint, finished=datetime.now().isoformat(timespec='seconds'), **extra), f)
+
+    def _stage(self, input_path, stage, fps):
+        label = os.path.basename(input_path)
+        base = self.scene_dir(input_path)
+        stage_dir = os.path.join(base, stage)
+        marker = stage_dir + ".json"
+        if self._cached(marker, fps[stage]) and (stage == "pack" or os.path.isdir(stage_dir)):
+            if stage != "pack" or os.path.exists(self.output_path(input_path)):
+                self.log(f"[{label}] {stage}: cached", "info")
+                self.progress.advance()
+                return True
+
+        if os.path.exists(marker):
+            os.remove(marker)
+        started = time.perf_counter()
+        with track_job(f"pipeline {stage}", scene=label) as job:
+            try:
+                ok = getattr(self, f"_do_{stage}")(input_path, base, stage_dir)
+            except Exception as e:
+                self.log(f"[{label}] {stage}: {e}", "error")
+                ok = False
+            job['ok'] = ok
+            if ok and stage in ("extract", "pack"):
+                # Archive bytes in / out of the whole scene
+                job['input_bytes' if stage == "extract" else 'output_bytes'] = \
+                    path_bytes(input_path if stage == "extract" else self.output_path(input_path))
+        self.progress.advance()
+        if ok:
+            self._mark(marker, fps[stage])
+            self.log(f"[{label}] {stage}: done in {time.perf_counter() - started:.1f}s", "success")
+        else:
+            self.log(f"[{label}] {stage}: FAILED", "error")
+        return ok
+
+    def output_path(self, input_path):
+        return os.path.join(self.output_dir, clean_output_name(input_path, self.options.get('format', "sdat")))
+
+    def _do_extract(self, input_path, base, stage_dir):
+        archive_type = ARCHIVE_TYPES.get(os.path.splitext(input_path)[1].lower())
+        if not archive_type:
+            self.log(f"[{os.path.basename(input_path)}] Unknown archive type.", "error")
+            return False
+        if os.path.exists(stage_dir):
+            shutil.rmtree(stage_dir)
+        # Stage folders cannot move to a scratch volume, so this is a plain space check
+        preflight("extract", input_path, stage_dir, {}, self.log)
+        returncode, _, err = run_tool([self.hdk_path, archive_type, "x", "-i", input_path, "-o", stage_dir])
+        if returncode != 0 and err.strip():
+            self.log("LOG: " + err.strip(), "error")
+        if returncode == 0 and self.options.get('dedup'):
+            report = dedup_tree(stage_dir, self.options.get('dedup_store') or DEDUP_STORE_DIR,
+                                self.options.get('dedup_mode') or "auto", log=self.log)
+            self.log(f"[{os.path.basename(input_path)}] {format_dedup_report(report)[0]}")
+        return returncode == 0
+
+    def _do_map(self, input_path, base, stage_dir):
+        clone_tree(os.path.join(base, "extract"), stage_dir)
+        return map_folder(self.hdk_path, stage_dir, self.names, full_scan=self.options.get('full_map', False),
+                          log=self.log, label=os.path.basename(input_path))
+
+    def _do_patch(self, input_path, base, stage_dir):
+        clone_tree(os.path.join(base, "map"), stage_dir)
+        rules = self.options.get('patch_rules', "").strip()
+        if rules:
+            summary = patch_tree(stage_dir, rules)
+            self.log(f"[{os.path.basename(input_path)}] patch: {len(summary['changed'])} file(s) rewritten")
+            return not summary['errors']
+        return True
+
+    def _do_compress(self, input_path, base, stage_dir):
+        clone_tree(os.path.join(base, "patch"), stage_dir)
+        if self.options.get('minify'):
+            report = minify_tree(stage_dir, lua=self.options.get('minify_lua', False))
+            self.log(f"[{os.path.basename(input_path)}] {format_minify_report(report)[0]}")
+        if self.options.get('compress', True):
+            # Stage markers already make the pipeline restartable
+            count = batch_compress(self.hdk_path, stage_dir, self.options.get('algo', "lzma"), journal=False)
+            self.log(f"[{os.path.basename(input_path)}] compress: {count} file(s) compressed")
+        return True
+
+    def _do_pack(self, input_path, base, stage_dir):
+        format_type = self.options.get('format', "sdat")
+        preflight("pack", os.path.join(base, "compress"), self.output_path(input_path), {}, self.log)
+        os.makedirs(self.output_dir, exist_ok=True)
+        returncode, _, err = run_tool([self.hdk_path, format_type, "c", "-i", os.path.join(base, "compress"),
+                                       "-o", self.output_path(input_path)])
+        if returncode != 0 and err.strip():
+            self.log("LOG: " + err.strip(), "error")
+        return returncode == 0
+
+    def run(self):
+        """Run every scene's stage chain; independent scenes proceed concurrently.
+        Returns {input path: True/False} (True when the output archive is up to date)."""
+        tasks = {}
+        for input_path in self.inputs:
+            fps = self.fingerprints(input_path)
+            previous = []
+            for stage in PIPELINE_STAGES:
+                key = (input_path, stage)
+                tasks[key] = ((lambda i=input_path, st=stage, f=fps: self._stage(i, st, f)), previous)
+                previous = [key]
+        with track_job("pipeline", scenes=len(self.inputs), workers=self.workers,
+                       input_bytes=sum(path_bytes(i) for i in self.inputs)) as job, self.progress:
+            results = run_dag(tasks, self.workers, should_stop=lambda: self.stop_requested)
+            built = {i: results.get((i, "pack")) is True for i in self.inputs}
+            job['ok'] = all(built.values())
+            job['output_bytes'] = sum(path_bytes(self.output_path(i)) for i in self.inputs if built[i])
+        return built
+
+
+# =========================================================================
+# RE-SHARC
+# =========================================================================
+@traced("fs")
+def find_sdat_files(folder):
+    """Top-level .sdat files of a folder, skipping outputs of earlier normalizations."""
+    return [os.path.join(folder, f) for f in os.listdir(folder)
+            if f.lower().endswith(".sdat") and ".normalized." not in f.lower()]
+
+
+def _resharc_outputs(path):
+    base = os.path.splitext(path)[0]
+    return base + ".normalized.sdat", base + ".normalized.txt"
+
+
+def run_resharc(resharc_path, file_list, journal=None):
+    """Normalize BAR-based SDATs. Returns (returncode, stdout, stderr, outputs).
+
+    Several files run one at a time under a job journal (a new one unless one is passed
+    to resume) so an interrupted batch can continue; journal=False keeps the single call.
+    """
+    file_list = list(file_list)
+    if journal is None and len(file_list) > 1:
+        journal = JobJournal.start("resharc", {'resharc_path': resharc_path}, file_list)
+    sizes = [path_bytes(f) for f in file_list]
+    with track_job("resharc", items=len(file_list), input_bytes=sum(sizes)) as job, \
+            Progress("resharc", len(file_list), sum(sizes), label="Re-SHARC") as progress:
+        returncode, out_str, err_str = _run_resharc_files(resharc_path, file_list, sizes, journal, progress)
+        job['ok'] = returncode == 0
+        job['output_bytes'] = sum(path_bytes(_resharc_outputs(f)[0]) for f in file_list)
+    outputs = []
+    for f in file_list:
+        norm_sdat, norm_txt = _resharc_outputs(f)
+        outputs.append({
+            'input': f,
+            'sdat': norm_sdat if os.path.exists(norm_sdat) else None,
+            'timestamp': norm_txt if os.path.exists(norm_txt) else None,
+        })
+    return returncode, out_str, err_str, outputs
+
+
+def _run_resharc_files(resharc_path, file_list, sizes, journal, progress):
+    if journal:
+        returncode, out_parts, err_parts = 0, [], []
+        for f, size in zip(file_list, sizes):
+            norm_sdat, norm_txt = _resharc_outputs(f)
+            journal.begin(f, temps=[norm_sdat, norm_txt], target=norm_sdat)
+            rc, out_str, err_str = run_tool([resharc_path, f])
+            out_parts.append(out_str)
+            err_parts.append(err_str)
+            returncode = returncode or rc
+            journal.complete(f, rc == 0)
+            progress.advance(1, size)
+        journal.close()
+        return returncode, "".join(out_parts), "".join(err_parts)
+    return run_tool([resharc_path] + file_list, progress=progress)
+
+
+# =========================================================================
+# LUAC DECOMPILER
+# =========================================================================
+@traced("fs")
+def find_luac_files(project_dir):
+    return list(Path(project_dir).rglob('*.luac'))
+
+
+def decompile_luac(unluac, project_dir, output_dir, workers=4, log=None, should_stop=None, on_progress=None,
+                   journal=None):
+    """Decompile every .luac under project_dir into output_dir with `workers` JVMs at a time.
+    Returns the stats dict (success / failed / skipped / total, plus 'stopped').
+    Runs under a job journal (a new one unless one is passed to resume); journal=False disables it."""
+    log = log or (lambda msg, tag=None: None)
+    project_path = Path(project_dir)
+    output_path = Path(output_dir)
+    if journal is None:
+        journal = JobJournal.start("luac", {'unluac': unluac, 'project_dir': os.path.abspath(project_dir),
+                                            'output_dir': os.path.abspath(output_dir), 'workers': workers},
+                                   find_luac_files(project_dir))
+    luac_files = [Path(p) for p in journal.remaining()] if journal else find_luac_files(project_dir)
+
+    stats = {'success': 0, 'failed': 0, 'skipped': 0, 'total': len(luac_files), 'stopped': False}
+    lock = threading.Lock()
+    java_missing = threading.Event()
+    progress = Progress("luac decompile", len(luac_files), label="Decompiling")
+    if on_progress:
+        on_progress(dict(stats))
+
+    def count(key):
+        with lock:
+            stats[key] += 1
+            snapshot = dict(stats)
+        progress.advance()
+        if on_progress:
+            on_progress(snapshot)
+
+    @traced("task", "decompile file")
+    def work(luac_file):
+        if java_missing.is_set() or (should_stop and should_stop()):
+            return
+        relative = luac_file.relative_to(project_path)
+        lua_out = output_path / relative.with_suffix('.lua')
+        lua_out.parent.mkdir(parents=True, exist_ok=True)
+
+        if lua_out.exists():
+            log(f"  Skipped (exists): {relative}")
+            count('skipped')
+            if journal:
+                journal.complete(luac_file)
+            return
+        temp_out = str(lua_out) + ".tmp"
+        if journal:
+            journal.begin(luac_file, temps=[temp_out], target=lua_out)
+        try:
+            source = run_checked(['java', '-jar', unluac, str(luac_file)])
+            # Temp + rename: a crash never leaves a half-written .lua that would be "Skipped (exists)"
+            with open(temp_out, 'w', encoding='utf-8') as f:
+                f.write(source)
+            os.replace(temp_out, lua_out)
+            log(f"  Decompiled: {relative}", "success")
+            count('success')
+            if journal:
+                journal.complete(luac_file)
+        except FileNotFoundError:
+            if not java_missing.is_set():
+                java_missing.set()
+                log("CRITICAL: 'java' not found. Is Java installed and in PATH?", "error")
+        except subprocess.CalledProcessError as e:
+            err_msg = e.stderr.strip() if e.stderr else "Unknown error"
+            log(f"  Failed: {relative} — {err_msg}", "error")
+            count('failed')
+            if journal:
+                journal.complete(luac_file, ok=False)
+        except Exception as e:
+            log(f"  Error: {relative} — {e}", "error")
+            count('failed')
+            if journal:
+                journal.complete(luac_file, ok=False)
+
+    with track_job("luac decompile", workers=workers, items=len(luac_files),
+                   input_bytes=sum(path_bytes(str(p)) for p in luac_files)) as job, progress:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            list(pool.map(work, luac_files))
+        job['ok'] = not stats['failed']
+
+    stats['stopped'] = java_missing.is_set() or bool(should_stop and should_stop())
+    if journal:
+        journal.close()
+    return stats
+
+
+# =========================================================================
+# KEYWORD SEARCH
+# =========================================================================
+@traced("fs")
+def search_keywords(target_dir, keywords):
+    """Count keyword hits in .lua / .luac files. Returns [(relative path, [(keyword, count)...])],
+    busiest files first."""
+    search_path = Path(target_dir)
+    results = {}
+
+    files_to_search = [p for p in search_path.rglob('*')
+                       if p.is_file() and p.suffix in ('.lua', '.luac')]
+
+    for file in files_to_search:
+        try:
+            with open(file, 'r', encoding='utf-8', errors='ignore') as f:
+                content = f.read().lower()
+            found = [(kw, content.count(kw)) for kw in keywords if kw in content]
+            if found:
+                results[str(file.relative_to(search_path))] = sorted(found, key=lambda x: x[1], reverse=True)
+        except Exception:
+            pass
+
+    return sorted(results.items(), key=lambda item: sum(c for _, c in item[1]), reverse=True)
+
+
+# =========================================================================
+# DIRECTORY TREE EXPORT
+# =========================================================================
+# One iterative os.scandir pass feeds both writers, so memory stays bounded by
+# the widest directory rather than the whole tree and deep nesting can't hit
+# the recursion limit. Content hashes run on a pool while the walk continues;
+# the writer only waits once too many of them are in flight.
+TREE_HASH_WORKERS = min(8, (os.cpu_count() or 1) * 2)
+TREE_HASH_WINDOW = 1024  # files whose hashes may be pending before output catches up
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def hash_file(path, algo="sha1"):
+    """Hex digest of a file's contents, read in 1 MiB chunks."""
+    digest = hashlib.new(algo)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def scan_dir(path):
+    """One os.scandir call → (sorted subdirectory entries, sorted file entries). Unreadable folders are empty."""
+    dirs, files = [], []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    (dirs if entry.is_dir() else files).append(entry)
+                except OSError:
+                    files.append(entry)
+    except OSError:
+        pass
+    dirs.sort(key=lambda e: e.name)
+    files.sort(key=lambda e: e.name)
+    return dirs, files
+
+
+def walk_tree(root):
+    """Iterative depth-first walk. Yields ('dir', depth, entry-or-None, files) on entering a
+    folder and ('end', depth, entry-or-None, files) after its last subfolder."""
+    dirs, files = scan_dir(root)
+    yield 'dir', 0, None, files
+    stack = [(None, iter(dirs), files)]
+    while stack:
+        entry, children, files = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            yield 'end', len(stack), entry, files
+            continue
+        # Symlinked folders are listed but not followed (same as os.walk)
+        sub_dirs, sub_files = scan_dir(child.path) if not child.is_symlink() else ([], [])
+        yield 'dir', len(stack), child, sub_files
+        stack.append((child, iter(sub_dirs), sub_files))
+
+
+class _OrderedOutput:
+    """Runs write callbacks in submission order once the futures they depend on are done."""
+
+    def __init__(self, window):
+        self.window = window
+        self.queue = deque()
+        self.pending = 0
+
+    def push(self, futures, write):
+        self.queue.append((futures, write))
+        self.pending += len(futures)
+        self.drain()
+
+    def drain(self, block=False):
+        while self.queue:
+            futures, write = self.queue[0]
+            if not (block or self.pending > self.window or all(f.done() for f in futures)):
+                return
+            self.queue.popleft()
+            self.pending -= len(futures)
+            write([f.result() for f in futures])
+
+
+def _entry_size(entry):
+    try:
+        return entry.stat().st_size
+    except OSError:
+        return None
+
+
+def _safe_hash(path):
+    try:
+        return hash_file(path)
+    except OSError:
+        return None
+
+
+@traced("fs")
+def export_tree(project_dir, save_path, sizes=False, hashes=False, workers=TREE_HASH_WORKERS):
+    """Write <save_path>.txt (human-readable) and <save_path>.json (machine-readable) in one pass.
+
+    sizes adds each file's byte size, hashes its SHA-1 (computed in parallel). Returns both paths.
+    """
+    base_save = Path(save_path).with_suffix('')
+    txt_path = base_save.with_suffix('.txt')
+    json_path = base_save.with_suffix('.json')
+    root_name = os.path.basename(os.path.normpath(project_dir))
+
+    txt_tmp, json_tmp = str(txt_path) + ".tmp", str(json_path) + ".tmp"
+    pool = ThreadPoolExecutor(max_workers=max(1, workers)) if hashes else None
+    try:
+        with open(txt_tmp, 'w', encoding='utf-8') as txt, open(json_tmp, 'w', encoding='utf-8') as out:
+            output = _OrderedOutput(TREE_HASH_WINDOW)
+            # Per open folder: has it written a child yet (for JSON commas)
+            first_child = []
+
+            def write_dir(name, depth, infos, digests):
+                for info, digest in zip(infos, digests):
+                    info['sha1'] = digest
+                txt.write(f"{'    ' * depth}[DIR] {name}/\n")
+                sub_indent = '    ' * (depth + 1)
+                for info in infos:
+                    extra = []
+                    if info.get('size') is not None:
+                        extra.append(format_size(info['size']))
+                    if info.get('sha1'):
+                        extra.append(info['sha1'])
+                    txt.write(f"{sub_indent}{info['name']}" + (f"  ({', '.join(extra)})" if extra else "") + "\n")
+                # JSON: open this folder inside its parent's children list
+                if first_child:
+                    out.write("\n" if first_child[-1] else ",\n")
+                    first_child[-1] = False
+                out.write(f'{"  " * depth}{{"name": {json.dumps(name)}, "type": "directory", "children": [')
+                first_child.append(True)
+
+            def close_dir(depth, infos):
+                # Files go after the subfolders, as before
+                pad = "  " * (depth + 1)
+                for info in infos:
+                    out.write(("\n" if first_child[-1] else ",\n") + pad + json.dumps(info))
+                    first_child[-1] = False
+                out.write(("" if first_child.pop() else "\n" + "  " * depth) + "]}")
+
+            open_infos = []
+            for event, depth, entry, files in walk_tree(project_dir):
+                if event == 'dir':
+                    name = entry.name if entry else root_name
+                    infos = [{'name': f.name, 'type': 'file'} for f in files]
+                    if sizes:
+                        for info, f in zip(infos, files):
+                            info['size'] = _entry_size(f)
+                    open_infos.append(infos)
+                    futures = [pool.submit(_safe_hash, f.path) for f in files] if pool else []
+                    output.push(futures, lambda digests, name=name, depth=depth, infos=infos:
+                                write_dir(name, depth, infos, digests))
+                else:
+                    infos = open_infos.pop()
+                    output.push([], lambda _, depth=depth, infos=infos: close_dir(depth, infos))
+            output.drain(block=True)
+            out.write("\n")
+        os.replace(txt_tmp, txt_path)
+        os.replace(json_tmp, json_path)
+    finally:
+        if pool:
+            pool.shutdown(wait=True)
+        for tmp in (txt_tmp, json_tmp):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    return str(txt_path), str(json_path)
+
+
+# =========================================================================
+# MERKLE MANIFEST & DIFF
+# =========================================================================
+# A manifest stores every file's SHA-1 plus a Merkle hash per folder (hash of
+# its children's names and hashes). Two manifests diff top-down: folders with
+# equal hashes are skipped whole, so comparing two scene versions only looks
+# at the branches that actually changed and never reads file contents.
+# Rebuilding a manifest re-hashes only files whose size or mtime moved.
+MANIFEST_VERSION = 1
+
+
+def _manifest_cache_path(root):
+    key = hashlib.sha1(os.path.abspath(root).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, "manifest", f"{key}.json")
+
+
+def _join_rel(parent, name):
+    return f"{parent}/{name}" if parent else name
+
+
+@traced("fs")
+def build_manifest(root, previous=None, workers=TREE_HASH_WORKERS):
+    """Hash a folder into a manifest dict. Hashes from `previous` are reused for unchanged files."""
+    old_files = previous.get('files', {}) if previous else {}
+    files, dirs, order, pending = {}, {}, [], {}
+    reused = 0
+    stack = []
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for event, depth, entry, file_entries in walk_tree(root):
+            if event == 'end':
+                continue
+            del stack[depth:]
+            rel = _join_rel(stack[-1], entry.name) if stack else ""
+            if stack:
+                dirs[stack[-1]]['dirs'].append(entry.name)
+            stack.append(rel)
+            dirs[rel] = {'dirs': [], 'files': [f.name for f in file_entries]}
+            order.append(rel)
+
+            for f in file_entries:
+                file_rel = _join_rel(rel, f.name)
+                try:
+                    st = f.stat()
+                    record = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha1': None}
+                except OSError:
+                    record = {'size': None, 'mtime_ns': None, 'sha1': None}
+                old = old_files.get(file_rel)
+                if old and record['size'] is not None and \
+                        (old.get('size'), old.get('mtime_ns')) == (record['size'], record['mtime_ns']):
+                    record['sha1'] = old.get('sha1')
+                    reused += 1
+                else:
+                    pending[file_rel] = pool.submit(_safe_hash, f.path)
+                files[file_rel] = record
+
+        for file_rel, future in pending.items():
+            files[file_rel]['sha1'] = future.result()
+
+    # Pre-order reversed = every folder after all of its subfolders
+    for rel in reversed(order):
+        digest = hashlib.sha1()
+        for name in dirs[rel]['files']:
+            digest.update(f"f {name} {files[_join_rel(rel, name)]['sha1'] or ''}\n".encode('utf-8'))
+        for name in dirs[rel]['dirs']:
+            digest.update(f"d {name} {dirs[_join_rel(rel, name)]['hash']}\n".encode('utf-8'))
+        dirs[rel]['hash'] = digest.hexdigest()
+
+    return {
+        'version': MANIFEST_VERSION,
+        'root': os.path.abspath(root),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'files': files,
+        'dirs': dirs,
+        'stats': {'files': len(files), 'dirs': len(dirs), 'hashed': len(pending), 'reused': reused},
+    }
+
+
+def load_manifest(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if not isinstance(manifest, dict) or manifest.get('version') != MANIFEST_VERSION or "" not in manifest.get('dirs', {}):
+        raise ValueError(f"Not a manifest (or an older format): {path}")
+    return manifest
+
+
+def save_manifest(manifest, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def update_manifest(root, workers=TREE_HASH_WORKERS):
+    """Build (or incrementally refresh) the cached manifest of a folder and return it."""
+    cache_path = _manifest_cache_path(root)
+    previous = None
+    try:
+        previous = load_manifest(cache_path)
+    except (OSError, ValueError):
+        pass
+    manifest = build_manifest(root, previous, workers)
+    try:
+        save_manifest(manifest, cache_path)
+    except OSError:
+        pass
+    return manifest
+
+
+def manifest_for(path, hdk_path=None, workers=TREE_HASH_WORKERS, log=None):
+    """Manifest of a folder (cached, incremental), a saved manifest .json, or an archive (extracted with hdk)."""
+    if os.path.isdir(path):
+        return update_manifest(path, workers)
+    archive_type = ARCHIVE_TYPES.get(os.path.splitext(path)[1].lower())
+    if archive_type:
+        if not hdk_path:
+            raise ValueError(f"hdk is needed to read {os.path.basename(path)}")
+        temp_dir = os.path.join(CACHE_DIR, "manifest", f"extract-{os.getpid()}-{threading.get_ident()}")
+        try:
+            if log:
+                log(f"Extracting {os.path.basename(path)} for comparison...", "info")
+            returncode, _, err_str = run_tool([hdk_path, archive_type, "x", "-i", path, "-o", temp_dir])
+            if returncode != 0:
+                raise ValueError(f"hdk could not extract {os.path.basename(path)}: {err_str.strip()}")
+            manifest = build_manifest(temp_dir, workers=workers)
+            manifest['root'] = os.path.abspath(path)
+            return manifest
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+    return load_manifest(path)
+
+
+def _subtree_files(manifest, rel):
+    found, queue = [], [rel]
+    while queue:
+        current = queue.pop()
+        node = manifest['dirs'][current]
+        found.extend(_join_rel(current, name) for name in node['files'])
+        queue.extend(_join_rel(current, name) for name in node['dirs'])
+    return found
+
+
+def diff_manifests(old, new):
+    """Top-down Merkle diff. Returns added/removed/changed file lists plus how many folders were skipped."""
+    result = {'added': [], 'removed': [], 'changed': [], 'skipped_dirs': 0, 'compared_dirs': 0}
+    queue = deque([""])
+    while queue:
+        rel = queue.popleft()
+        a, b = old['dirs'][rel], new['dirs'][rel]
+        if a['hash'] == b['hash']:
+            result['skipped_dirs'] += 1
+            continue
+        result['compared_dirs'] += 1
+
+        files_a, files_b = set(a['files']), set(b['files'])
+        result['removed'].extend(_join_rel(rel, n) for n in files_a - files_b)
+        result['added'].extend(_join_rel(rel, n) for n in files_b - files_a)
+        for name in files_a & files_b:
+            path = _join_rel(rel, name)
+            if old['files'][path]['sha1'] != new['files'][path]['sha1']:
+                result['changed'].append(path)
+
+        dirs_a, dirs_b = set(a['dirs']), set(b['dirs'])
+        for name in dirs_a - dirs_b:
+            result['removed'].extend(_subtree_files(old, _join_rel(rel, name)))
+        for name in dirs_b - dirs_a:
+            result['added'].extend(_subtree_files(new, _join_rel(rel, name)))
+        queue.extend(_join_rel(rel, name) for name in sorted(dirs_a & dirs_b))
+
+    for key in ('added', 'removed', 'changed'):
+        result[key].sort()
+    result['identical'] = not (result['added'] or result['removed'] or result['changed'])
+    return result
+
+
+def format_diff(diff, old_label="A", new_label="B"):
+    """Human-readable diff report (+ added, - removed, ~ changed)."""
+    lines = [f"--- {old_label}", f"+++ {new_label}", ""]
+    lines += [f"+ {p}" for p in diff['added']]
+    lines += [f"- {p}" for p in diff['removed']]
+    lines += [f"~ {p}" for p in diff['changed']]
+    lines += ["", f"{len(diff['added'])} added, {len(diff['removed'])} removed, {len(diff['changed'])} changed "
+                  f"({diff['compared_dirs']} folder(s) compared, {diff['skipped_dirs']} identical subtree(s) skipped)"]
+    return "\n".join(lines)
+
+
+# =========================================================================
+# DEDUPLICATION STORE (content-addressed)
+# =========================================================================
+# Scenes share most of their textures, models and scripts. Each unique file
+# is kept once under store/objects/<sha1[:2]>/<sha1> and every copy becomes a
+# reflink (Btrfs/XFS: private copy-on-write extents) of it. Where the volume
+# has no reflinks (NTFS, ext4), files are left alone unless hardlink mode is
+# chosen. Hardlinks share one inode, so an in-place edit would change every
+# scene: hardlinked files are made read-only, everything in this app replaces
+# files (temp + rename) instead, which only swaps the link, and unshare_tree()
+# makes private, writable copies for outside editors.
+# The store never adopts a user's file: a new object is a verified copy (or
+# reflink) of it, and an object is re-hashed once per run before more
+# files are linked to it, so an edited object is caught instead of spread.
+DEDUP_STORE_DIR = os.path.join(CACHE_DIR, "store")
+DEDUP_MIN_SIZE = 4096  # smaller files occupy a block either way; linking saves nothing
+DEDUP_MODES = ("auto", "reflink", "hardlink")  # auto: reflink or leave alone; hardlink: reflink or read-only hardlink
+FICLONE = 0x40049409  # Linux ioctl: clone src extents into dst
+
+
+def _reflink(src, dst):
+    """Copy-on-write clone of src to a new file dst. Raises OSError where unsupported."""
+    if not IS_LINUX:
+        raise OSError(errno.EOPNOTSUPP, "reflinks are only supported on Linux here")
+    import fcntl
+    with open(src, 'rb') as s_file, open(dst, 'wb') as d_file:
+        try:
+            fcntl.ioctl(d_file.fileno(), FICLONE, s_file.fileno())
+        except OSError:
+            d_file.close()
+            os.remove(dst)
+            raise
+    shutil.copystat(src, dst)
+
+
+def _set_read_only(path):
+    """Clear the write bits (FILE_ATTRIBUTE_READONLY on Windows) of path and every link to its inode."""
+    os.chmod(path, os.stat(path).st_mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+
+
+def _reflink_unsupported(error):
+    return error.errno in (errno.EOPNOTSUPP, errno.ENOTSUP, errno.EINVAL, errno.ENOTTY)
+
+
+def _place_copy(src, dst, hardlink=False):
+    """Create dst as a reflink of src, or with hardlink=True a read-only hardlink where reflinks are not
+    supported, atomically. Returns the kind used."""
+    tmp_path = dst + ".dedup.tmp"
+    try:
+        _reflink(src, tmp_path)
+        kind = "reflink"
+    except OSError as e:
+        if not hardlink or not _reflink_unsupported(e):
+            raise
+        os.link(src, tmp_path)
+        _set_read_only(tmp_path)
+        kind = "hardlink"
+    try:
+        os.replace(tmp_path, dst)
+    except OSError:
+        os.remove(tmp_path)
+        raise
+    return kind
+
+
+def _store_object(path, obj, digest, mode):
+    """Write a new store object as a reflink or byte copy of path (never a link to its inode), checked
+    against digest. Returns "reflink" or "copy"."""
+    tmp_path = obj + ".dedup.tmp"
+    kind = "copy"
+    if mode in ("auto", "reflink"):
+        try:
+            _reflink(path, tmp_path)
+            kind = "reflink"
+        except OSError:
+            if mode == "reflink":
+                raise
+    if kind == "copy":
+        shutil.copyfile(path, tmp_path)
+    if _safe_hash(tmp_path) != digest:
+        os.remove(tmp_path)
+        raise OSError(f"{path} changed while it was being stored")
+    os.replace(tmp_path, obj)
+    return kind
+
+
+def dedup_tree(root, store_dir=DEDUP_STORE_DIR, mode="auto", workers=TREE_HASH_WORKERS, min_size=DEDUP_MIN_SIZE,
+               log=None):
+    """Hash every file under root in parallel and replace duplicates with links to one stored copy.
+
+    mode "auto" reflinks where the volume supports it and leaves other files alone, "reflink" counts
+    those as errors, and "hardlink" falls back to read-only hardlinks. Returns a report: totals plus
+    bytes saved per file extension.
+    """
+    log = log or (lambda msg, tag=None: None)
+    objects_dir = os.path.join(store_dir, "objects")
+    os.makedirs(objects_dir, exist_ok=True)
+
+    candidates = []
+    for dirpath, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.lstat(path)
+            except OSError:
+                continue
+            if not os.path.islink(path) and st.st_size >= min_size and not name.endswith(".tmp"):
+                candidates.append((path, st.st_size, st.st_mtime_ns))
+
+    report = {'files': len(candidates), 'bytes': sum(c[1] for c in candidates), 'duplicates': 0,
+              'bytes_saved': 0, 'new_objects': 0, 'already_linked': 0, 'cross_device': 0, 'errors': 0,
+              'no_reflink': 0, 'corrupt_objects': 0, 'reflink': 0, 'hardlink': 0, 'by_type': {}}
+    hardlink = mode == "hardlink"
+    with track_job("dedup hash", items=len(candidates), input_bytes=report['bytes']):
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            digests = list(pool.map(lambda c: _safe_hash(c[0]), candidates))
+
+    verified = set()  # objects hashed (or written) during this run
+    for (path, size, mtime_ns), digest in zip(candidates, digests):
+        if not digest:
+            report['errors'] += 1
+            continue
+        ext = os.path.splitext(path)[1].lower() or "(none)"
+        by_type = report['by_type'].setdefault(ext, {'files': 0, 'duplicates': 0, 'bytes_saved': 0})
+        by_type['files'] += 1
+        obj = os.path.join(objects_dir, digest[:2], digest)
+        try:
+            st = os.stat(path)
+            if (st.st_size, st.st_mtime_ns) != (size, mtime_ns):
+                report['errors'] += 1  # changed since it was hashed
+                continue
+            if not os.path.exists(obj):
+                # First sighting: store a verified copy, then link this file to it (hardlink mode frees its bytes)
+                os.makedirs(os.path.dirname(obj), exist_ok=True)
+                kind = _store_object(path, obj, digest, "auto" if hardlink else "reflink")
+                verified.add(digest)
+                report['new_objects'] += 1
+                if kind == "copy":
+                    _place_copy(obj, path, hardlink=True)
+                continue
+            obj_st = os.stat(obj)
+            if (st.st_dev, st.st_ino) == (obj_st.st_dev, obj_st.st_ino):
+                if hardlink and st.st_mode & stat.S_IWUSR and obj_st.st_nlink > 1:
+                    _set_read_only(path)  # write access restored by an unshare on Windows
+                report['already_linked'] += 1
+                continue
+            if digest not in verified:
+                if obj_st.st_size != size or _safe_hash(obj) != digest:
+                    # Edited in place through some link: drop it from the store (linked files keep their data)
+                    log(f"Store object {digest} no longer matches its hash; removed from the store "
+                        f"({path} was left as it is).", "error")
+                    os.remove(obj)
+                    report['corrupt_objects'] += 1
+                    report['errors'] += 1
+                    continue
+                verified.add(digest)
+            report[_place_copy(obj, path, hardlink)] += 1
+        except OSError as e:
+            if e.errno == errno.EXDEV:  # store is on another volume
+                report['cross_device'] += 1
+            elif mode == "auto" and _reflink_unsupported(e):
+                report['no_reflink'] += 1
+            else:
+                report['errors'] += 1
+            continue
+        report['duplicates'] += 1
+        report['bytes_saved'] += size
+        by_type['duplicates'] += 1
+        by_type['bytes_saved'] += size
+
+    if report['cross_device']:
+        log(f"{report['cross_device']} file(s) are on a different volume than the store ({store_dir}); "
+            "they were left as they are.", "warning")
+    if report['no_reflink']:
+        log(f"{report['no_reflink']} file(s) were left as they are: this volume has no reflinks. Hardlink mode "
+            "deduplicates them too, as read-only files (run Unshare before editing them).", "warning")
+    return report
+
+
+def format_dedup_report(report):
+    """Summary line plus one line per file type, biggest savings first."""
+    lines = [f"Dedup: {report['duplicates']} of {report['files']} file(s) linked, "
+             f"{format_size(report['bytes_saved'])} saved of {format_size(report['bytes'])} "
+             f"({report['reflink']} reflink, {report['hardlink']} hardlink, {report['new_objects']} new in store)"]
+    if report.get('corrupt_objects'):
+        lines.append(f"  {report['corrupt_objects']} store object(s) had been edited in place and were dropped; "
+                     "run dedup again to re-store them")
+    for ext, info in sorted(report['by_type'].items(), key=lambda kv: -kv[1]['bytes_saved']):
+        if info['duplicates']:
+            lines.append(f"  {ext:<10} {info['duplicates']:>7} / {info['files']:<7} {format_size(info['bytes_saved']):>10}")
+    return lines
+
+
+def unshare_file(path):
+    """Copy-on-write escape hatch: give a hardlinked file its own private, writable copy. Returns True if it
+    was shared."""
+    st = os.stat(path)
+    if st.st_nlink <= 1:
+        if not st.st_mode & stat.S_IWUSR:
+            os.chmod(path, st.st_mode | stat.S_IWUSR)  # the last link left of a read-only dedup placement
+        return False
+    tmp_path = path + ".unshare.tmp"
+    shutil.copyfile(path, tmp_path)
+    shutil.copystat(path, tmp_path)
+    os.chmod(tmp_path, st.st_mode | stat.S_IWUSR)
+    if IS_WINDOWS and not st.st_mode & stat.S_IWUSR:
+        # Windows neither replaces nor deletes a read-only file. Clearing the flag clears it for every
+        # link to the inode; the next hardlink-mode dedup run marks the remaining links read-only again.
+        os.chmod(path, st.st_mode | stat.S_IWUSR)
+    os.replace(tmp_path, path)
+    return True
+
+
+def unshare_tree(root):
+    """Unshare every hardlinked file under root so it can be edited in place. Returns how many were shared."""
+    count = 0
+    for dirpath, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(dirpath, name)
+            if not os.path.islink(path) and unshare_file(path):
+                count += 1
+    return count
+
+
+# =========================================================================
+# LIBRARY VERIFICATION (checkpointed)
+# =========================================================================
+# Every archive in a library is extracted (and optionally repacked and
+# extracted again) in a scratch folder; its SHA-1, file count and content
+# Merkle root are appended to a JSONL journal as soon as it finishes. A
+# crashed or stopped run picks up from the journal: archives whose size and
+# mtime still match a recorded result are not verified again.
+VERIFY_DIR = os.path.join(CACHE_DIR, "verify")
+LIBRARY_EXTENSIONS = ('.sdat', '.pkg')
+
+
+@traced("fs")
+def find_library_archives(root, extensions=LIBRARY_EXTENSIONS):
+    """Every archive under root with one of the given extensions, sorted."""
+    found = []
+    for dirpath, _, files in os.walk(root):
+        for name in files:
+            if os.path.splitext(name)[1].lower() in extensions:
+                found.append(os.path.join(dirpath, name))
+    return sorted(found)
+
+
+class LibraryVerifier:
+    """Extracts (and optionally round-trips) every archive of a library in parallel, resuming from a journal."""
+
+    def __init__(self, hdk_path, root, repack=False, workers=2, resume=True, extensions=LIBRARY_EXTENSIONS, log=None,
+                 on_progress=None):
+        self.hdk_path = hdk_path
+        self.root = os.path.abspath(root)
+        self.repack = repack
+        self.workers = workers
+        self.resume = resume
+        self.extensions = extensions
+        self.log = log or (lambda msg, tag=None: None)
+        self.on_progress = on_progress or (lambda done, total: None)
+        self.stop_requested = False
+        key = hashlib.sha1(self.root.encode('utf-8')).hexdigest()[:16]
+        self.journal_path = os.path.join(VERIFY_DIR, f"{key}.jsonl")
+        self._journal_lock = threading.Lock()
+
+    def _record(self, record):
+        # One flushed + fsynced line per archive: at most the archive in flight is lost on a crash
+        with self._journal_lock:
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _extract(self, archive_type, archive, out_dir):
+        returncode, _, err = run_tool([self.hdk_path, archive_type, "x", "-i", archive, "-o", out_dir])
+        if returncode != 0:
+            raise ValueError(f"extract failed (code {returncode}): {err.strip()[:200]}")
+        manifest = build_manifest(out_dir, workers=2)
+        if not manifest['files']:
+            raise ValueError("extract produced no files")
+        return manifest
+
+    def verify(self, archive):
+        """Verify one archive. Returns its journal record."""
+        rel = os.path.relpath(archive, self.root).replace(os.sep, "/")
+        st = os.stat(archive)
+        record = {'archive': rel, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'repack': self.repack,
+                  'ok': False, 'error': None}
+        archive_type = ARCHIVE_TYPES[os.path.splitext(archive)[1].lower()]
+        work = os.path.join(VERIFY_DIR, f"work-{os.getpid()}-{threading.get_ident()}")
+        shutil.rmtree(work, ignore_errors=True)
+        started = time.perf_counter()
+        try:
+            # The repack round trip writes a second extraction (plus the repacked archive)
+            preflight("extract", archive, work, {}, copies=2 if self.repack else 1)
+            record['sha1'] = hash_file(archive)
+            first = self._extract(archive_type, archive, os.path.join(work, "x"))
+            record['files'] = len(first['files'])
+            record['tree'] = first['dirs']['']['hash']
+            if self.repack:
+                repacked = os.path.join(work, f"repacked.{archive_type}")
+                returncode, _, err = run_tool([self.hdk_path, archive_type, "c", "-i", os.path.join(work, "x"),
+                                               "-o", repacked])
+                if returncode != 0:
+                    raise ValueError(f"repack failed (code {returncode}): {err.strip()[:200]}")
+                second = self._extract(archive_type, repacked, os.path.join(work, "y"))
+                diff = diff_manifests(first, second)
+                if not diff['identical']:
+                    raise ValueError(f"round-trip mismatch: {len(diff['added'])} added, "
+                                     f"{len(diff['removed'])} removed, {len(diff['changed'])} changed")
+            record['ok'] = True
+        except DiskSpaceError:
+            raise
+        except (OSError, ValueError) as e:
+            record['error'] = str(e)
+        finally:
+            shutil.rmtree(work, ignore_errors=True)
+        record['seconds'] = round(time.perf_counter() - started, 2)
+        record['finished'] = datetime.now().isoformat(timespec='seconds')
+        return record
+
+    def run(self):
+        """Verify the library. Returns a summary dict (failures listed by relative path)."""
+        os.makedirs(VERIFY_DIR, exist_ok=True)
+        archives = find_library_archives(self.root, self.extensions)
+        if not self.resume and os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+
+        done = {}
+        for record in read_journal(self.journal_path):
+            done[record.get('archive')] = record
+        todo, skipped = [], 0
+        for archive in archives:
+            rel = os.path.relpath(archive, self.root).replace(os.sep, "/")
+            prev = done.get(rel)
+            st = os.stat(archive)
+            if prev and (prev.get('size'), prev.get('mtime_ns')) == (st.st_size, st.st_mtime_ns) and \
+                    (prev.get('repack') or not self.repack):
+                skipped += 1
+            else:
+                todo.append(archive)
+        if skipped:
+            self.log(f"Resuming: {skipped} archive(s) already checked, {len(todo)} to go.", "info")
+
+        summary = {'total': len(archives), 'skipped': skipped, 'verified': 0, 'failed': 0, 'stopped': False,
+                   'journal': self.journal_path}
+        finished = skipped
+        self.on_progress(finished, len(archives))
+
+        @traced("task", "verify archive")
+        def task(archive):
+            if self.stop_requested:
+                return None
+            try:
+                record = self.verify(archive)
+            except DiskSpaceError as e:
+                # Not journaled: the archive itself was never checked, so the next run retries it
+                return {'archive': os.path.relpath(archive, self.root).replace(os.sep, "/"), 'ok': False,
+                        'error': str(e)}
+            self._record(record)
+            return record
+
+        sizes = {a: path_bytes(a) for a in todo}
+        with track_job("verify library", items=len(todo), workers=self.workers,
+                       input_bytes=sum(sizes.values())) as job, \
+                Progress("verify library", len(todo), sum(sizes.values()), label="Verifying") as progress, \
+                ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+            for archive, record in zip(todo, pool.map(task, todo)):
+                if record is None:
+                    summary['stopped'] = True
+                    continue
+                finished += 1
+                progress.advance(1, sizes[archive])
+                if record['ok']:
+                    summary['verified'] += 1
+                    self.log(f"  OK    {record['archive']} ({record['files']} files, {record['seconds']}s)")
+                else:
+                    summary['failed'] += 1
+                    self.log(f"  FAIL  {record['archive']}: {record['error']}", "error")
+                self.on_progress(finished, len(archives))
+            job['ok'] = not summary['failed'] and not summary['stopped']
+
+        # Failures from earlier runs that were not re-checked still count against the library
+        current = {os.path.relpath(a, self.root).replace(os.sep, "/") for a in archives}
+        records = {r.get('archive'): r for r in read_journal(self.journal_path)}
+        summary['failures'] = sorted(rel for rel, r in records.items() if rel in current and not r.get('ok'))
+        return summary
+
+
+# =========================================================================
+# WATCH MODE (incremental rebuilds)
+# =========================================================================
+# Polls the pack input folder (one os.scandir pass per tick, stat only) and
+# rebuilds the archive once edits have settled for WATCH_DEBOUNCE seconds.
+# With Auto-Optimize on, compressed copies live in a staging mirror under
+# hdk_cache/watch/, so only the files that changed since the last build go
+# through hdk compress and the source folder itself is never rewritten.
+# Watch mode and MultiPack share mirrors, so a mirror is locked (across
+# processes) while it is synced and while an archive is packed from it.
+WATCH_DIR = os.path.join(CACHE_DIR, "watch")
+WATCH_POLL_INTERVAL = 0.5
+WATCH_DEBOUNCE = 0.75
+WATCH_IGNORE_SUFFIXES = (".tmp", ".swp", ".swx", ".part", "~")
+
+
+def _watch_ignored(name):
+    return name.startswith(".#") or name.lower().endswith(WATCH_IGNORE_SUFFIXES)
+
+
+@contextlib.contextmanager
+def _mirror_lock(path, log=None):
+    """Exclusive lock on a lock file, held across processes until the block exits; waits for other holders."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a+b') as f:
+        waiting = False
+        while True:
+            try:
+                if IS_WINDOWS:
+                    import msvcrt
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                else:
+                    import fcntl
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except OSError:
+                if not waiting and log:
+                    log("Waiting for another job that is using the same staging mirror...", "info")
+                waiting = True
+                time.sleep(0.2)
+        try:
+            yield
+        finally:
+            if IS_WINDOWS:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+@traced("fs")
+def snapshot_tree(root, skip_temp=True):
+    """{relative path: (size, mtime_ns)} for every file under root, skipping editor temp files unless
+    skip_temp is False."""
+    snapshot, stack = {}, [("", root)]
+    while stack:
+        rel, path = stack.pop()
+        try:
+            entries = list(os.scandir(path))
+        except OSError:
+            continue
+        for entry in entries:
+            child_rel = _join_rel(rel, entry.name)
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((child_rel, entry.path))
+                elif not (skip_temp and _watch_ignored(entry.name)):
+                    st = entry.stat()
+                    snapshot[child_rel] = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                continue  # deleted between listing and stat; the next tick sees it
+    return snapshot
+
+
+def diff_snapshots(old, new):
+    """(changed or added, removed) relative paths between two snapshots."""
+    changed = sorted(rel for rel, sig in new.items() if old.get(rel) != sig)
+    removed = sorted(rel for rel in old if rel not in new)
+    return changed, removed
+
+
+class FolderWatcher:
+    """Watches a folder and repacks it into one archive whenever its files change."""
+
+    def __init__(self, hdk_path, input_dir, output_file, format_type="sdat", compress=False, algo="lzma",
+                 interval=WATCH_POLL_INTERVAL, debounce=WATCH_DEBOUNCE, workers=PATCH_WORKERS,
+                 log=None, on_build=None, stage_key=None, skip_temp=True):
+        self.hdk_path = hdk_path
+        self.input_dir = os.path.abspath(input_dir)
+        self.output_file = os.path.abspath(output_file) if output_file else None  # None: staging only
+        self.format_type = format_type
+        self.compress = compress
+        self.algo = algo
+        self.interval = interval
+        self.debounce = debounce
+        self.workers = workers
+        self.log = log or (lambda msg, tag=None: None)
+        self.on_build = on_build or (lambda result: None)
+        self.skip_temp = skip_temp  # False: stage editor temp files too (a one-off pack, not an editing session)
+        self.stop_requested = False
+        self._lock_held = False
+        # stage_key: a stable name for an input folder that is itself a per-run copy
+        key = hashlib.sha1(f"{stage_key or self.input_dir}|{algo}".encode('utf-8')).hexdigest()[:16]
+        self.stage_dir = os.path.join(WATCH_DIR, key)
+        self.state_path = self.stage_dir + ".json"
+
+    @contextlib.contextmanager
+    def locked(self):
+        """Hold the mirror's lock (re-entrant within this watcher) while it is synced or packed from."""
+        if self._lock_held:
+            yield
+            return
+        with _mirror_lock(self.stage_dir + ".lock", self.log):
+            self._lock_held = True
+            try:
+                yield
+            finally:
+                self._lock_held = False
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if os.path.isdir(self.stage_dir):
+                return {rel: tuple(sig) for rel, sig in state.get("files", {}).items()}
+        except (OSError, ValueError):
+            pass
+        return {}
+
+    def _save_state(self, snapshot):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"root": self.input_dir, "algo": self.algo, "files": snapshot}, f)
+        os.replace(tmp_path, self.state_path)
+
+    @traced("task", "stage file")
+    def _stage_file(self, rel):
+        src = os.path.join(self.input_dir, rel)
+        dst = os.path.join(self.stage_dir, rel)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        temp_path = dst + ".tmp"
+        try:
+            if is_compressible(os.path.basename(rel)):
+                run_checked([self.hdk_path, "compress", "c", "-a", self.algo, "-i", src, "-o", temp_path])
+            else:
+                shutil.copy2(src, temp_path)
+            os.replace(temp_path, dst)
+            return rel, None
+        except (OSError, subprocess.CalledProcessError) as e:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return rel, str(e)
+
+    def sync(self, staged, snapshot):
+        """Bring the staging mirror from `staged` up to `snapshot`. Returns (changed, removed, errors)."""
+        with self.locked():
+            return self._sync(staged, snapshot)
+
+    def _sync(self, staged, snapshot):
+        changed, removed = diff_snapshots(staged, snapshot)
+        for rel in removed:
+            try:
+                os.remove(os.path.join(self.stage_dir, rel))
+            except OSError:
+                pass
+        errors = []
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+            for rel, error in pool.map(self._stage_file, changed):
+                if error:
+                    errors.append((rel, error))
+        return changed, removed, errors
+
+    def stage(self):
+        """Bring the staging mirror up to date once, without building. Returns (changed, removed, errors).
+        Hold locked() around this and the pack that reads the mirror."""
+        with self.locked():
+            os.makedirs(self.stage_dir, exist_ok=True)
+            snapshot = snapshot_tree(self.input_dir, self.skip_temp)
+            changed, removed, errors = self.sync(self._load_state(), snapshot)
+            for rel, _ in errors:
+                snapshot.pop(rel, None)
+            self._save_state(snapshot)
+        return changed, removed, errors
+
+    def build(self, changed=(), removed=()):
+        """Repack into a temp archive and swap it in, so the emulator never reads a half-written file."""
+        started = time.time()
+        source = self.stage_dir if self.compress else self.input_dir
+        base, ext = os.path.splitext(self.output_file)
+        temp_out = f"{base}.building{ext}"
+        returncode, out_str, err_str = run_tool([self.hdk_path, self.format_type, "c", "-i", source, "-o", temp_out])
+        ok = returncode == 0 and os.path.exists(temp_out)
+        if ok:
+            os.replace(temp_out, self.output_file)
+        elif os.path.exists(temp_out):
+            os.remove(temp_out)
+        return {'ok': ok, 'changed': len(changed), 'removed': len(removed),
+                'seconds': round(time.time() - started, 2), 'error': None if ok else (err_str or out_str).strip()}
+
+    def _rebuild(self, built, snapshot):
+        """Sync + build. Returns the snapshot now staged (files that failed to compress are retried next time)."""
+        started = time.time()
+        staged = dict(snapshot)
+        with track_job("watch rebuild", format=self.format_type, compress=self.compress) as job, \
+                (self.locked() if self.compress else contextlib.nullcontext()):
+            if self.compress:
+                # Another job may have synced the shared mirror since our last build
+                changed, removed, errors = self.sync(self._load_state() if os.path.exists(self.state_path) else built,
+                                                     snapshot)
+                for rel, error in errors:
+                    self.log(f"  Could not compress {rel}: {error}", "error")
+                    staged.pop(rel, None)
+                self._save_state(staged)
+            else:
+                changed, removed = diff_snapshots(built, snapshot)
+            result = self.build(changed, removed)
+            job.update(ok=result['ok'], items=len(changed) + len(removed),
+                       input_bytes=sum(size for size, _ in snapshot.values()),
+                       output_bytes=path_bytes(self.output_file))
+        result['seconds'] = round(time.time() - started, 2)
+        if result['ok']:
+            self.log(f"Rebuilt {os.path.basename(self.output_file)} in {result['seconds']}s "
+                     f"({result['changed']} changed, {result['removed']} removed)", "success")
+        else:
+            self.log(f"Rebuild failed: {result['error']}", "error")
+        self.on_build(result)
+        return staged
+
+    def run(self):
+        """Build once, then poll until stop_requested. Returns the number of builds."""
+        builds = 0
+        if self.compress:
+            os.makedirs(self.stage_dir, exist_ok=True)
+            built = self._load_state()
+            reused = len(built)
+        else:
+            built, reused = {}, 0
+        snapshot = snapshot_tree(self.input_dir)
+        self.log(f"Watching {self.input_dir} ({len(snapshot)} files"
+                 f"{f', {reused} already staged' if reused else ''})", "info")
+        built = self._rebuild(built, snapshot)
+        builds += 1
+
+        last_seen, settled_at = snapshot, None
+        while not self.stop_requested:
+            time.sleep(self.interval)
+            current = snapshot_tree(self.input_dir)
+            if current != last_seen:
+                # Still being written: restart the quiet period
+                last_seen, settled_at = current, time.time()
+                continue
+            if settled_at is None or time.time() - settled_at < self.debounce:
+                continue
+            settled_at = None
+            if current == built:
+                continue  # edits were reverted
+            built = self._rebuild(built, current)
+            builds += 1
+        return builds
+
+
+# =========================================================================
+# MULTI-FORMAT PACK (one staging pass, several archives)
+# =========================================================================
+# Publishing a scene usually means an .sdat plus a .bar and/or .pkg of the
+# same folder. The input is prepared once: pruned, minified, then compressed
+# into the watch-mode staging mirror, which is incremental, so a second
+# publish only recompresses files that changed. The mirror stays locked
+# until every format is packed, so watch mode or a second publish of the
+# same folder waits instead of rewriting it underneath the packs. Every selected format is
+# then packed from that one copy concurrently, each named the way
+# clean_output_name names a single pack, written to a temp name and
+# renamed into place.
+class MultiPack:
+    """Packs one folder into several archive formats from a single prepared staging copy."""
+
+    def __init__(self, hdk_path, input_dir, output_dir, formats, compress=False, algo="lzma", prune=False,
+                 lua_dirs=(), keep=(), minify=False, minify_lua=False, settings=None, log=None):
+        self.hdk_path = hdk_path
+        self.input_dir = os.path.abspath(input_dir)
+        self.output_dir = output_dir
+        self.formats = list(dict.fromkeys(formats))
+        self.compress = compress
+        self.algo = algo
+        self.prune = prune
+        self.lua_dirs = lua_dirs
+        self.keep = keep
+        self.minify = minify or minify_lua
+        self.minify_lua = minify_lua
+        self.settings = settings
+        self.log = log or (lambda msg, tag=None: None)
+        self.stop_requested = False
+        self.prune_stage = None
+        self.minify_stage = None
+
+    def output_path(self, format_type):
+        return os.path.join(self.output_dir, clean_output_name(self.input_dir, format_type))
+
+    def prepare(self, held):
+        """Prune / minify / compress once. Returns the folder every format is packed from; the staging
+        mirror's lock is entered on the `held` ExitStack, so it stays locked until the packs are done."""
+        source = self.input_dir
+        if self.prune:
+            report = analyze_assets(source, self.lua_dirs, self.keep)
+            source = self.prune_stage = stage_used_assets(source, report)
+            self.log(f"Leaving out {len(report['unused'])} unreferenced file(s) "
+                     f"({format_size(report['unused_bytes'])}).", "info")
+        if self.minify and not self.stop_requested:
+            if source == self.input_dir:
+                source, report = stage_minified(source, lua=self.minify_lua)
+                self.minify_stage = source
+            else:
+                report = minify_tree(source, lua=self.minify_lua)
+            self.log(format_minify_report(report)[0], "info")
+        if self.compress and not self.stop_requested:
+            # Staged files keep their source mtimes, so a mirror keyed by the real folder still reuses them
+            stage_key = None
+            if source != self.input_dir:
+                stage_key = (f"{self.input_dir}{'|pruned' if self.prune_stage else ''}"
+                             f"{('|minified+lua' if self.minify_lua else '|minified') if self.minify else ''}")
+            mirror = FolderWatcher(self.hdk_path, source, None, compress=True, algo=self.algo, log=self.log,
+                                   stage_key=stage_key, skip_temp=False)
+            held.enter_context(mirror.locked())
+            changed, removed, errors = mirror.stage()
+            if errors:
+                raise ValueError(f"{len(errors)} file(s) could not be compressed, e.g. {errors[0][0]}: {errors[0][1]}")
+            self.log(f"Auto-Optimize ({self.algo.upper()}): {len(changed)} changed file(s) staged, "
+                     f"{len(removed)} removed; the rest were reused from the last run.", "info")
+            source = mirror.stage_dir
+        return source
+
+    def _pack(self, source, format_type):
+        if self.stop_requested:
+            return format_type, {'ok': False, 'error': "stopped"}
+        started = time.perf_counter()
+        output = self.output_path(format_type)
+        base, ext = os.path.splitext(output)
+        temp_out = f"{base}.building{ext}"
+        returncode, out_str, err_str = run_tool([self.hdk_path, format_type, "c", "-i", source, "-o", temp_out])
+        ok = returncode == 0 and os.path.exists(temp_out)
+        if ok:
+            os.replace(temp_out, output)
+        elif os.path.exists(temp_out):
+            os.remove(temp_out)
+        return format_type, {'ok': ok, 'output': output, 'size': path_bytes(output) if ok else None,
+                             'seconds': round(time.perf_counter() - started, 2),
+                             'error': None if ok else (err_str or out_str).strip() or f"exit code {returncode}"}
+
+    def run(self):
+        """Preflight, prepare, then pack every format concurrently. Returns {format: result dict}."""
+        first, _ = preflight("pack", self.input_dir, self.output_path(self.formats[0]), self.settings, self.log,
+                             copies=len(self.formats))
+        self.output_dir = os.path.dirname(first)
+        os.makedirs(self.output_dir, exist_ok=True)
+        results = {}
+        with track_job("multi pack", formats=",".join(self.formats), compress=self.compress) as job, \
+                Progress("multi pack", len(self.formats) + 1, label="Multi-format pack") as progress, \
+                contextlib.ExitStack() as held:
+            try:
+                source = self.prepare(held)
+                progress.advance()
+                with ThreadPoolExecutor(max_workers=len(self.formats)) as pool:
+                    for format_type, result in pool.map(lambda f: self._pack(source, f), self.formats):
+                        results[format_type] = result
+                        progress.advance()
+                        if result['ok']:
+                            self.log(f"  {os.path.basename(result['output'])}: {format_size(result['size'])} "
+                                     f"in {result['seconds']}s", "success")
+                        else:
+                            self.log(f"  {format_type}: FAILED — {result['error']}", "error")
+                job.update(ok=all(r['ok'] for r in results.values()), input_bytes=path_bytes(source),
+                           output_bytes=sum(r['size'] or 0 for r in results.values()))
+            finally:
+                for stage in (self.prune_stage, self.minify_stage):
+                    if stage:
+                        shutil.rmtree(stage, ignore_errors=True)
+                self.prune_stage = self.minify_stage = None
+        return results
+
+
+# =========================================================================
+# ASSET DEPENDENCY GRAPH (unused-asset pruning)
+# =========================================================================
+# Scene XML, object descriptors and Lua scripts are scanned for anything
+# shaped like a file path, including the string constants of .luac
+# bytecode and the decompiled .lua beside it. Binary assets that can name
+# other files (models, Havok data, effects, nested archives) are scanned
+# as raw bytes too; only images, audio and video are treated as leaves. Each reference is resolved
+# against the pack input folder by its longest matching path suffix, so
+# "local:USRDIR/env/a.dds", "../env/a.dds" and "a.dds" all find env/a.dds.
+# Files reachable from the roots (.scene/.sdc/.odc files, or every script
+# when there are none) are in use. The rest can be left out of a pack.
+# Resolution errs towards keeping files: a bare file name keeps every file
+# with that name, hash-named files hdk could not map are always kept (and
+# followed), and pruning is refused while any scanned file cannot be read
+# (e.g. already compressed). References are cached per file and only re-read when a
+# file's size or mtime changes.
+ASSET_DIR = os.path.join(CACHE_DIR, "assets")
+ASSET_STAGE_DIR = os.path.join(ASSET_DIR, "stages")  # one private pruned copy per pack, removed afterwards
+ASSET_SOURCE_EXTENSIONS = ('.xml', '.scene', '.sdc', '.odc', '.lua', '.luac', '.txt')
+ASSET_ROOT_EXTENSIONS = ('.scene', '.sdc', '.odc')
+ASSET_LEAF_EXTENSIONS = ('.dds', '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tga', '.gtf',
+                         '.wav', '.mp3', '.ogg', '.at3', '.at9', '.vag', '.mp4', '.bik')
+ASSET_REF_PATTERN = re.compile(rb"[\w\-./\\:]+\.[A-Za-z][A-Za-z0-9]{0,7}")
+ASSET_OPAQUE_RATIO = 0.9  # a binary whose first 64 KB zlib cannot shrink below this is compressed / encrypted
+ASSET_OPAQUE_SAMPLE = 64 * 1024
+
+
+def _asset_cache_path(root):
+    key = hashlib.sha1(os.path.abspath(root).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(ASSET_DIR, f"{key}.json")
+
+
+def _normalize_ref(raw):
+    """'local:USRDIR\\Env\\A.dds' -> 'usrdir/env/a.dds'; None for things that are not paths."""
+    ref = raw.decode('latin-1').replace("\\", "/").lower()
+    ref = ref.rsplit(":", 1)[-1]  # scheme or drive prefix: local:, file:, http://host
+    parts = [p for p in ref.split("/") if p not in ("", ".", "..")]
+    if not parts or parts[-1].startswith("."):
+        return None
+    return "/".join(parts)
+
+
+def scans_references(rel):
+    """Whether a file can name other files (everything but images, audio and video)."""
+    return not rel.lower().endswith(ASSET_LEAF_EXTENSIONS)
+
+
+def scan_references(path):
+    """(references, readable) of one script, descriptor or binary asset. Text files that hold NUL
+    bytes and binaries that do not compress (both: compressed or encrypted) are unreadable;
+    .luac bytecode and other binaries are scanned as raw bytes."""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return [], True
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            lower = path.lower()
+            if lower.endswith(".luac"):
+                readable = True
+            elif lower.endswith(ASSET_SOURCE_EXTENSIONS):
+                readable = b"\0" not in data[:4096]
+            else:
+                sample = data[:ASSET_OPAQUE_SAMPLE]
+                readable = len(sample) < 512 or len(zlib.compress(sample, 1)) < len(sample) * ASSET_OPAQUE_RATIO
+            refs = {_normalize_ref(m.group()) for m in ASSET_REF_PATTERN.finditer(data)} if readable else set()
+    refs.discard(None)
+    return sorted(refs), readable
+
+
+class _SuffixIndex:
+    """Lower-cased path suffix ('c.dds', 'b/c.dds', 'a/b/c.dds') -> relative paths ending in it."""
+
+    def __init__(self, rels):
+        self.index = {}
+        for rel in rels:
+            parts = rel.lower().split("/")
+            for i in range(len(parts)):
+                self.index.setdefault("/".join(parts[i:]), []).append(rel)
+
+    def resolve(self, ref):
+        parts = ref.split("/")
+        for i in range(len(parts)):
+            targets = self.index.get("/".join(parts[i:]))
+            if targets:
+                return targets
+        return []
+
+
+@traced("fs")
+def analyze_assets(root, lua_dirs=(), keep=(), workers=PATCH_WORKERS):
+    """Reference graph of a pack input folder. `lua_dirs` hold decompiled .lua mirrors of its .luac
+    files; `keep` are globs that are never reported unused. Returns a JSON-friendly dict with the
+    graph, the roots and the unused files (largest first)."""
+    root = os.path.abspath(root)
+    snapshot = snapshot_tree(root)
+    cache_path = _asset_cache_path(root)
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cached = json.load(f).get("files", {})
+    except (OSError, ValueError):
+        cached = {}
+
+    # Decompiled scripts count as the .luac they came from
+    sources = {rel: os.path.join(root, rel) for rel in snapshot if scans_references(rel)}
+    extra = {}
+    for lua_dir in lua_dirs:
+        for rel, sig in snapshot_tree(lua_dir).items():
+            luac_rel = rel[:-4] + ".luac" if rel.lower().endswith(".lua") else None
+            if luac_rel in snapshot:
+                extra["lua:" + luac_rel] = (os.path.join(lua_dir, rel), sig)
+
+    entries, stale = {}, []
+    for key, (path, sig) in [(rel, (path, snapshot[rel])) for rel, path in sources.items()] + list(extra.items()):
+        hit = cached.get(key)
+        if hit and hit['sig'] == list(sig) and hit.get('path') == path:
+            entries[key] = hit
+        else:
+            stale.append((key, path, sig))
+
+    def scan(item):
+        key, path, sig = item
+        try:
+            refs, readable = scan_references(path)
+        except OSError:
+            refs, readable = [], False
+        return key, {'sig': list(sig), 'path': path, 'refs': refs, 'readable': readable}
+
+    with track_job("asset graph", items=len(stale)):
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            entries.update(pool.map(scan, stale))
+
+    os.makedirs(ASSET_DIR, exist_ok=True)
+    # Unique temp name: two analyses of one root may finish at the same time
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(cache_path) + ".", suffix=".tmp", dir=ASSET_DIR)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({"root": root, "files": entries}, f)
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+    index = _SuffixIndex(snapshot)
+    graph = {}
+    for key, entry in entries.items():
+        rel = key[4:] if key.startswith("lua:") else key
+        targets = graph.setdefault(rel, set())
+        for ref in entry['refs']:
+            targets.update(t for t in index.resolve(ref) if t != rel)
+
+    scripts = [rel for rel in sources if rel.lower().endswith(ASSET_SOURCE_EXTENSIONS)]
+    roots = sorted(rel for rel in scripts if rel.lower().endswith(ASSET_ROOT_EXTENSIONS)) or sorted(scripts)
+    # Files kept regardless (unmapped hashes, --keep) are followed too: what they reference stays
+    keep_globs = [g.lower() for g in keep]
+    kept = {rel for rel in snapshot if HASHED_NAME_RE.match(os.path.basename(rel))
+            or any(fnmatch.fnmatch(rel.lower(), g) for g in keep_globs)}
+    used = set(roots) | kept
+    stack = list(used)
+    while stack:
+        for target in graph.get(stack.pop(), ()):
+            if target not in used:
+                used.add(target)
+                stack.append(target)
+
+    unused = [{'path': rel, 'size': snapshot[rel][0]} for rel in snapshot if rel not in used]
+    unused.sort(key=lambda item: (-item['size'], item['path']))
+    unreadable = sorted(key for key, entry in entries.items() if not entry['readable'])
+    return {
+        'root': root,
+        'files': len(snapshot),
+        'total_bytes': sum(sig[0] for sig in snapshot.values()),
+        'sources': len(entries),
+        'rescanned': len(stale),
+        'roots': roots,
+        'edges': sum(len(t) for t in graph.values()),
+        'graph': {rel: sorted(targets) for rel, targets in graph.items() if targets},
+        'unused': unused,
+        'unused_bytes': sum(item['size'] for item in unused),
+        'unreadable': unreadable,
+    }
+
+
+def format_asset_report(report, limit=25):
+    lines = [f"{len(report['unused'])} of {report['files']} files unreferenced "
+             f"({format_size(report['unused_bytes'])} of {format_size(report['total_bytes'])}); "
+             f"{report['sources']} files scanned ({report['rescanned']} changed), "
+             f"{report['edges']} references, {len(report['roots'])} roots"]
+    for item in report['unused'][:limit]:
+        lines.append(f"  {format_size(item['size']):>10}  {item['path']}")
+    if len(report['unused']) > limit:
+        lines.append(f"  ... and {len(report['unused']) - limit} more")
+    if report['unreadable']:
+        lines.append(f"{len(report['unreadable'])} file(s) could not be read (compressed?), "
+                     f"e.g. {report['unreadable'][0]} — pruning is disabled until they are uncompressed")
+    return lines
+
+
+def stage_used_assets(root, report):
+    """Hardlinked copy of root without the report's unused files, private to this pack (remove it
+    with shutil.rmtree once packed). Returns its path."""
+    if report['unreadable']:
+        raise ValueError(f"Cannot prune: {len(report['unreadable'])} file(s) are unreadable "
+                         f"(e.g. {report['unreadable'][0]}), so their references are unknown.")
+    stage_dir = _private_stage(root, ASSET_STAGE_DIR)
+    try:
+        clone_tree(root, stage_dir, exclude={item['path'] for item in report['unused']})
+    except BaseException:
+        shutil.rmtree(stage_dir, ignore_errors=True)
+        raise
+    return stage_dir
+
+
+# =========================================================================
+# ASSET SIZE PROFILE (what dominates a scene's size)
+# =========================================================================
+# One parallel pass over an extracted or pack-input tree: bytes per file
+# type, DDS resolution / pixel format / mip count from the 128-byte header,
+# the largest files of the heavy types, and a compressibility estimate per
+# type from zlib over a few sampled chunks of a sample of its files. The
+# estimate is a proxy for EdgeLZMA/EdgeZLib ratios, so it ranks types and
+# is not a prediction of exact sizes. Files that are already Edge-compressed
+# show a ratio close to 1.
+DDS_MAGIC = b"DDS "
+DDS_HEADER_SIZE = 128  # magic + 124-byte DDS_HEADER (+ 20-byte DX10 extension)
+DDPF_FOURCC = 0x4
+DDPF_ALPHAONLY = 0x2
+PROFILE_LARGEST_TYPES = ('.hkx', '.havok', '.bar', '.mdl', '.dds', '.sdat')
+PROFILE_LARGEST_COUNT = 20
+PROFILE_SAMPLE_FILES = 24  # per type
+PROFILE_SAMPLE_CHUNK = 64 * 1024
+PROFILE_SAMPLE_CHUNKS = 3  # start, middle, end
+
+
+def read_dds_header(path):
+    """{'width', 'height', 'mips', 'format'} from a DDS header, or None if the file is not a plain DDS."""
+    with open(path, 'rb') as f:
+        data = f.read(DDS_HEADER_SIZE + 20)
+    if len(data) < DDS_HEADER_SIZE or data[:4] != DDS_MAGIC:
+        return None
+    _, _, height, width, _, depth, mips = struct.unpack_from('<7I', data, 4)
+    pf_flags, fourcc, bits = struct.unpack_from('<I4sI', data, 80)
+    if pf_flags & DDPF_FOURCC:
+        fmt = fourcc.decode('latin-1').strip("\0 ") or "?"
+        if fmt == "DX10" and len(data) >= DDS_HEADER_SIZE + 4:
+            fmt = f"DX10/{struct.unpack_from('<I', data, DDS_HEADER_SIZE)[0]}"  # DXGI_FORMAT number
+    else:
+        fmt = f"A{bits}" if pf_flags & DDPF_ALPHAONLY else f"RGB{bits}"
+    return {'width': width, 'height': height, 'depth': depth or 1, 'mips': max(1, mips), 'format': fmt}
+
+
+def sample_compressibility(path, size):
+    """(sampled bytes, zlib-compressed bytes) over up to PROFILE_SAMPLE_CHUNKS chunks of the file."""
+    chunk = PROFILE_SAMPLE_CHUNK
+    if size <= chunk * PROFILE_SAMPLE_CHUNKS:
+        offsets = [0]
+        chunk = size
+    else:
+        offsets = [0, (size - chunk) // 2, size - chunk][:PROFILE_SAMPLE_CHUNKS]
+    raw = packed = 0
+    with open(path, 'rb') as f:
+        for offset in offsets:
+            f.seek(offset)
+            data = f.read(chunk)
+            raw += len(data)
+            packed += len(zlib.compress(data, 6))
+    return raw, packed
+
+
+def _type_of(rel):
+    ext = os.path.splitext(rel)[1].lower()
+    if ext:
+        return ext
+    return "(hashed)" if HASHED_NAME_RE.match(os.path.basename(rel)) else "(none)"
+
+
+@traced("fs")
+def profile_assets(root, workers=TREE_HASH_WORKERS, seed=0):
+    """Size profile of a folder. Returns a JSON-friendly dict: 'types' (largest first), 'textures',
+    'dds_formats' and 'largest' files per heavy type."""
+    root = os.path.abspath(root)
+    snapshot = snapshot_tree(root)
+    by_type = {}
+    for rel, (size, _) in snapshot.items():
+        by_type.setdefault(_type_of(rel), []).append((rel, size))
+
+    rng = random.Random(seed)
+    sampled = set()
+    for files in by_type.values():
+        candidates = [rel for rel, size in files if size]
+        sampled.update(rng.sample(candidates, min(PROFILE_SAMPLE_FILES, len(candidates))))
+
+    def inspect(item):
+        rel, (size, _) = item
+        path = os.path.join(root, rel)
+        result = {'path': rel, 'size': size}
+        try:
+            if rel.lower().endswith(".dds"):
+                result['dds'] = read_dds_header(path)
+            if rel in sampled:
+                result['sample'] = sample_compressibility(path, size)
+        except OSError as e:
+            result['error'] = str(e)
+        return result
+
+    with track_job("asset profile", items=len(snapshot), input_bytes=sum(s for s, _ in snapshot.values())), \
+            Progress("asset profile", len(snapshot), label="Profiling") as progress:
+        results = []
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            for result in pool.map(inspect, sorted(snapshot.items())):
+                results.append(result)
+                progress.advance(1, result['size'])
+
+    total = sum(r['size'] for r in results) or 1
+    types, textures, formats = {}, [], {}
+    for r in results:
+        row = types.setdefault(_type_of(r['path']), {'files': 0, 'bytes': 0, 'sample_raw': 0, 'sample_packed': 0,
+                                                     'largest': None})
+        row['files'] += 1
+        row['bytes'] += r['size']
+        if 'sample' in r:
+            row['sample_raw'] += r['sample'][0]
+            row['sample_packed'] += r['sample'][1]
+        if row['largest'] is None or r['size'] > row['largest']['size']:
+            row['largest'] = {'path': r['path'], 'size': r['size']}
+        if r.get('dds'):
+            textures.append(dict(path=r['path'], size=r['size'], **r['dds']))
+            fmt = formats.setdefault(r['dds']['format'], {'count': 0, 'bytes': 0})
+            fmt['count'] += 1
+            fmt['bytes'] += r['size']
+
+    type_rows = []
+    for ext, row in types.items():
+        ratio = row['sample_packed'] / row['sample_raw'] if row['sample_raw'] else None
+        type_rows.append({'type': ext, 'files': row['files'], 'bytes': row['bytes'],
+                          'share': round(row['bytes'] / total, 4),
+                          'est_ratio': round(ratio, 3) if ratio is not None else None,
+                          'est_bytes': int(row['bytes'] * ratio) if ratio is not None else None,
+                          'largest': row['largest']})
+    type_rows.sort(key=lambda row: -row['bytes'])
+    textures.sort(key=lambda t: -t['size'])
+    largest = {ext: sorted(({'path': rel, 'size': size} for rel, size in by_type[ext]), key=lambda f: -f['size'])
+               [:PROFILE_LARGEST_COUNT] for ext in PROFILE_LARGEST_TYPES if ext in by_type}
+    return {'root': root, 'files': len(results), 'total_bytes': sum(r['size'] for r in results),
+            'errors': [r['path'] for r in results if 'error' in r], 'types': type_rows,
+            'textures': textures, 'dds_formats': formats, 'largest': largest}
+
+
+def save_asset_profile(profile, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(profile, f, indent=2)
+
+
+def format_asset_profile(profile, limit=15):
+    lines = [f"{profile['files']} files, {format_size(profile['total_bytes'])} in {profile['root']}",
+             f"  {'type':<10}{'files':>7}{'size':>12}{'share':>8}{'zlib est.':>12}"]
+    for row in profile['types'][:limit]:
+        est = f"{row['est_ratio']:.2f}" if row['est_ratio'] is not None else "—"
+        lines.append(f"  {row['type']:<10}{row['files']:>7}{format_size(row['bytes']):>12}"
+                     f"{row['share'] * 100:>7.1f}%{est:>12}")
+    if profile['textures']:
+        big = profile['textures'][0]
+        lines.append(f"{len(profile['textures'])} DDS textures, formats: "
+                     + ", ".join(f"{fmt} x{info['count']}" for fmt, info in
+                                 sorted(profile['dds_formats'].items(), key=lambda item: -item[1]['bytes']))
+                     + f"; largest {big['width']}x{big['height']} {big['format']} ({big['mips']} mips) {big['path']}")
+    return lines
+
+
+# =========================================================================
+# DISTRIBUTED WORKERS (TCP job protocol)
+# =========================================================================
+# `worker` turns any machine with the tools into a build node. The GUI or
+# CLI connects, reads each node's capacity, and opens one connection per
+# slot. Each connection pulls per-file tasks (compress, decompile,
+# resharc, extract) from one shared queue, so fast nodes simply take more.
+# Messages are one JSON line each, and when a message carries files their
+# bytes follow it back to back, in the order and sizes the JSON lists.
+# By default the input is streamed to the node and the outputs are
+# streamed back. With shared storage (the same paths on every machine,
+# e.g. a NAS mount) only paths are sent and the node writes in place. A
+# node that drops out has its task requeued. Whatever no node could take
+# runs locally, unless that is turned off. Nodes listen on localhost unless
+# told otherwise, and only with a token once they listen on the network.
+# Streamed tasks run inside a per-task work folder. Shared-storage tasks
+# are refused unless the node was started with --shared-root, and then
+# only touch paths under those roots.
+WORKER_PORT = 47100
+WORKER_DIR = os.path.join(CACHE_DIR, "worker")
+WORKER_TIMEOUT = 30  # connect / hello
+WORKER_TASK_TIMEOUT = 30 * 60  # a node silent this long on one task is treated as lost
+WORKER_CHUNK = 1024 * 1024
+DISTRIBUTED_KINDS = ("compress", "decompile", "resharc", "extract")
+DISTRIBUTE_MIN_ITEMS = 20  # smaller batches are not worth the round trips
+
+
+class WorkerError(Exception):
+    """A worker refused a request or a task failed on it."""
+
+
+def parse_worker_addresses(text):
+    """'host:port, host2' -> [('host', port), ('host2', WORKER_PORT)]."""
+    addresses = []
+    for part in re.split(r"[,\s]+", text or ""):
+        if part:
+            host, _, port = part.rpartition(":") if ":" in part else (part, "", "")
+            addresses.append((host or "127.0.0.1", int(port or WORKER_PORT)))
+    return addresses
+
+
+def _send_message(stream, header, paths=()):
+    """One JSON line, then the bytes of `paths` (whose sizes the header lists)."""
+    stream.write(json.dumps(header).encode('utf-8') + b"\n")
+    for path in paths:
+        with open(path, 'rb') as f:
+            shutil.copyfileobj(f, stream, WORKER_CHUNK)
+    stream.flush()
+
+
+def _recv_message(stream):
+    line = stream.readline()
+    if not line:
+        raise ConnectionError("connection closed")
+    return json.loads(line)
+
+
+def _contained(root, path):
+    """path joined onto root (or absolute), resolved; WorkerError if it points outside root."""
+    root = os.path.realpath(root)
+    full = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, full]) != root:
+        raise WorkerError(f"refusing path outside {root}: {path}")
+    return full
+
+
+def _recv_files(stream, specs, dest_root):
+    """Write the files announced in `specs` ([{'name', 'size'}]) under dest_root. Returns their paths."""
+    paths = []
+    for spec in specs:
+        path = _contained(dest_root, spec['name'])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        remaining = int(spec['size'])
+        with open(path, 'wb') as f:
+            while remaining:
+                chunk = stream.read(min(WORKER_CHUNK, remaining))
+                if not chunk:
+                    raise ConnectionError("connection closed mid-file")
+                f.write(chunk)
+                remaining -= len(chunk)
+        paths.append(path)
+    return paths
+
+
+def _file_specs(base, paths):
+    return [{'name': os.path.relpath(p, base).replace(os.sep, "/"), 'size': os.path.getsize(p)} for p in paths]
+
+
+def _worker_tool(tools, key):
+    path = tools.get(key)
+    if not path or not os.path.exists(path):
+        raise WorkerError(f"{TOOL_LABELS[key]} is not set up on {platform.node() or 'this machine'}")
+    return path
+
+
+def run_worker_task(kind, input_path, out_dir, name, args, tools):
+    """Run one task with this machine's tools. Returns (base folder, produced files)."""
+    if kind != "resharc":
+        os.makedirs(out_dir, exist_ok=True)
+    if kind == "compress":
+        out = os.path.join(out_dir, name)
+        run_checked([_worker_tool(tools, 'hdk'), "compress", "c", "-a", args.get('algo', "lzma"), "-i", input_path, "-o", out])
+        return out_dir, [out]
+    if kind == "decompile":
+        out = os.path.join(out_dir, name)
+        source = run_checked(['java', '-jar', _worker_tool(tools, 'unluac'), input_path])
+        with open(out + ".tmp", 'w', encoding='utf-8') as f:
+            f.write(source)
+        os.replace(out + ".tmp", out)
+        return out_dir, [out]
+    if kind == "resharc":
+        run_checked([_worker_tool(tools, 'resharc'), input_path])
+        return os.path.dirname(input_path), [p for p in _resharc_outputs(input_path) if os.path.exists(p)]
+    if kind == "extract":
+        archive_type = ARCHIVE_TYPES.get(os.path.splitext(input_path)[1].lower())
+        if not archive_type:
+            raise WorkerError(f"unknown archive type: {input_path}")
+        out = os.path.join(out_dir, name)
+        run_checked([_worker_tool(tools, 'hdk'), archive_type, "x", "-i", input_path, "-o", out])
+        return out_dir, [os.path.join(d, f) for d, _, files in os.walk(out) for f in files]
+    raise WorkerError(f"unknown task kind: {kind}")
+
+
+def _task_error(e):
+    return ((e.stderr if isinstance(e, subprocess.CalledProcessError) else None) or str(e)).strip()
+
+
+def _check_files(request):
+    """The streamed file list of a run request: exactly one {'name': str, 'size': int >= 0}."""
+    files = request.get('files')
+    if not (isinstance(files, list) and len(files) == 1 and isinstance(files[0], dict)
+            and isinstance(files[0].get('name'), str) and type(files[0].get('size')) is int
+            and files[0]['size'] >= 0):
+        raise WorkerError("a streamed task needs exactly one file {'name', 'size'}")
+    return files
+
+
+def _check_task(request, shared_roots):
+    """Validate a run request. Returns (kind, name, args, shared input path or None, shared out_dir or None)."""
+    kind = request.get('kind')
+    if kind not in DISTRIBUTED_KINDS:
+        raise WorkerError(f"unknown task kind: {kind!r}")
+    name = request.get('name')
+    if kind != "resharc":
+        if not isinstance(name, str) or os.path.basename(name.replace("\\", "/")) in ("", ".", ".."):
+            raise WorkerError(f"bad output name: {name!r}")
+        name = os.path.basename(name.replace("\\", "/"))
+    args = request.get('args') or {}
+    if not isinstance(args, dict) or args.get('algo', "lzma") not in ("lzma", "zlib"):
+        raise WorkerError(f"bad task arguments: {args!r}")
+    if not request.get('shared'):
+        return kind, name, args, None, None
+    if not shared_roots:
+        raise WorkerError("this worker does not accept shared-storage tasks (start it with --shared-root)")
+    paths = []
+    for key in ('input', 'out_dir'):
+        value = request.get(key)
+        if not isinstance(value, str) or not os.path.isabs(value):
+            raise WorkerError(f"shared task needs an absolute '{key}' path")
+        for root in shared_roots:
+            try:
+                paths.append(_contained(root, value))
+                break
+            except (WorkerError, ValueError):  # ValueError: different drive on Windows
+                continue
+        else:
+            raise WorkerError(f"{value} is outside this worker's shared roots")
+    return (kind, name, args) + tuple(paths)
+
+
+class _WorkerHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server
+        try:
+            hello = _recv_message(self.rfile)
+            if not isinstance(hello, dict):
+                hello = {}
+            token = hello.get('token')
+            if hello.get('op') != "hello" or not isinstance(token, str) \
+                    or not hmac.compare_digest(token.encode('utf-8'), server.token.encode('utf-8')):
+                _send_message(self.wfile, {'ok': False, 'error': "bad token"})
+                return
+            _send_message(self.wfile, server.describe())
+            while True:
+                request = _recv_message(self.rfile)
+                op = request.get('op') if isinstance(request, dict) else None
+                if op == "run":
+                    if not self._run(request):
+                        return
+                elif op == "hello":
+                    _send_message(self.wfile, server.describe())
+                else:
+                    _send_message(self.wfile, {'ok': False, 'error': f"unknown op {op!r}"})
+        except (ConnectionError, OSError, ValueError):
+            return  # client went away (or sent something that is not JSON)
+
+    def _run(self, request):
+        """Serve one run request. Returns False when the connection can no longer be used."""
+        server = self.server
+        try:
+            kind, name, args, input_path, out_dir = _check_task(request, server.shared_roots)
+            files = None if request.get('shared') else _check_files(request)
+        except WorkerError as e:
+            # The file bytes the client sent after a bad header cannot be skipped reliably; hang up
+            _send_message(self.wfile, {'ok': False, 'error': str(e)})
+            return bool(request.get('shared')) or 'files' not in request
+        work_dir = tempfile.mkdtemp(prefix=f"{kind}-", dir=server.work_dir)
+        try:
+            if files is not None:
+                input_path = _recv_files(self.rfile, files, os.path.join(work_dir, "in"))[0]
+                out_dir = os.path.join(work_dir, "out")
+            with server.slots:
+                started = time.perf_counter()
+                try:
+                    if name is not None:
+                        _contained(out_dir, name)
+                    base, produced = run_worker_task(kind, input_path, out_dir, name, args, server.tools)
+                    error = None
+                except (WorkerError, OSError, subprocess.CalledProcessError) as e:
+                    error = _task_error(e)
+                server.count(error is None)
+            seconds = round(time.perf_counter() - started, 3)
+            if error:
+                _send_message(self.wfile, {'ok': False, 'error': error, 'seconds': seconds})
+            elif files is None:
+                _send_message(self.wfile, {'ok': True, 'seconds': seconds, 'files': _file_specs(base, produced),
+                                           'shared': True})
+            else:
+                _send_message(self.wfile, {'ok': True, 'seconds': seconds, 'files': _file_specs(base, produced)},
+                              produced)
+            return True
+        except WorkerError as e:  # a streamed file name pointing outside the work folder
+            _send_message(self.wfile, {'ok': False, 'error': str(e)})
+            return False
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _is_loopback(host):
+    try:
+        return bool(host) and all(ipaddress.ip_address(info[4][0]).is_loopback
+                                  for info in socket.getaddrinfo(host, None))
+    except (OSError, ValueError):
+        return False
+
+
+class WorkerServer(socketserver.ThreadingTCPServer):
+    """Build node: serves tasks from any number of connections, `slots` at a time."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=WORKER_PORT, slots=None, token="", tools=None, log=None,
+                 shared_roots=()):
+        if not token and not _is_loopback(host):
+            raise ValueError(f"Refusing to listen on {host or 'all interfaces'} without a token "
+                             "(set --token or $HDK_WORKER_TOKEN).")
+        super().__init__((host, port), _WorkerHandler)
+        self.shared_roots = [os.path.realpath(root) for root in shared_roots]
+        self.capacity = max(1, slots or os.cpu_count() or 1)
+        self.slots = threading.BoundedSemaphore(self.capacity)
+        self.token = token or ""
+        self.tools = tools if tools is not None else resolve_tools(load_settings())
+        self.log = log or (lambda msg, tag=None: None)
+        self.name = f"{platform.node() or 'worker'}:{self.server_address[1]}"
+        self.work_dir = os.path.join(WORKER_DIR, str(self.server_address[1]))
+        os.makedirs(self.work_dir, exist_ok=True)
+        self.done = self.failed = 0
+        self._lock = threading.Lock()
+
+    def server_close(self):
+        super().server_close()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def count(self, ok):
+        with self._lock:
+            if ok:
+                self.done += 1
+            else:
+                self.failed += 1
+
+    def describe(self):
+        kinds = [kind for kind, tool in (("compress", 'hdk'), ("extract", 'hdk'), ("decompile", 'unluac'),
+                                         ("resharc", 'resharc')) if self.tools.get(tool)]
+        return {'ok': True, 'name': self.name, 'capacity': self.capacity, 'kinds': kinds,
+                'shared': bool(self.shared_roots),
+                'done': self.done, 'failed': self.failed, 'platform': f"{platform.system()} {platform.machine()}"}
+
+
+class WorkerClient:
+    """One connection to a worker (one task at a time)."""
+
+    def __init__(self, address, token="", timeout=WORKER_TIMEOUT):
+        self.address = address
+        self.sock = socket.create_connection(address, timeout=timeout)
+        self.stream = self.sock.makefile('rwb')
+        _send_message(self.stream, {'op': "hello", 'token': token})
+        self.info = _recv_message(self.stream)
+        if not self.info.get('ok'):
+            self.close()
+            raise WorkerError(f"{address[0]}:{address[1]} refused the connection: {self.info.get('error')}")
+        self.sock.settimeout(WORKER_TASK_TIMEOUT)  # a hung node times out and its task is requeued
+
+    def run(self, kind, input_path, out_dir, name, args, shared=False, recv_dir=None):
+        """Run one task. Returns (result header, received file paths); raises WorkerError if it failed there."""
+        request = {'op': "run", 'kind': kind, 'name': name, 'args': args, 'shared': shared}
+        if shared:
+            request.update(input=os.path.abspath(input_path), out_dir=os.path.abspath(out_dir))
+            _send_message(self.stream, request)
+        else:
+            request['files'] = [{'name': os.path.basename(input_path), 'size': os.path.getsize(input_path)}]
+            _send_message(self.stream, request, [input_path])
+        result = _recv_message(self.stream)
+        if not result.get('ok'):
+            raise WorkerError(result.get('error') or "task failed")
+        received = [] if shared else _recv_files(self.stream, result['files'], recv_dir)
+        return result, received
+
+    def close(self):
+        for closer in (self.stream.close, self.sock.close):
+            try:
+                closer()
+            except OSError:
+                pass
+
+
+def probe_workers(addresses, token=""):
+    """{'host:port': hello reply or {'ok': False, 'error': ...}} for each address."""
+    status = {}
+    for address in addresses:
+        key = f"{address[0]}:{address[1]}"
+        try:
+            client = WorkerClient(address, token, timeout=5)
+            status[key] = client.info
+            client.close()
+        except (OSError, WorkerError, ValueError) as e:
+            status[key] = {'ok': False, 'error': str(e)}
+    return status
+
+
+def _task_destination(kind, item, options):
+    """(folder, name) a task's output goes to on this machine."""
+    if kind == "compress":
+        return os.path.dirname(item), os.path.basename(item) + ".remote.tmp"
+    if kind == "decompile":
+        rel = os.path.relpath(item, options['project_dir'])
+        dest = os.path.join(options['output_dir'], os.path.splitext(rel)[0] + ".lua")
+        return os.path.dirname(dest), os.path.basename(dest)
+    if kind == "extract":
+        return options.get('output_dir') or os.path.dirname(item), os.path.basename(item) + "_extracted"
+    return os.path.dirname(item), None
+
+
+def _place_outputs(kind, item, out_dir, name, received, recv_root):
+    """Move streamed outputs to their destination (temp name + rename on the destination volume)."""
+    for path in received:
+        rel = os.path.relpath(path, recv_root)
+        dest = os.path.join(out_dir, rel)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        shutil.move(path, dest + ".part")
+        os.replace(dest + ".part", dest)
+    if kind == "compress":
+        os.replace(os.path.join(out_dir, name), item)
+
+
+class DistributedBatch:
+    """Runs per-file tasks of one kind across worker nodes, falling back to this machine."""
+
+    def __init__(self, kind, items, addresses, options=None, token="", shared=False, local_fallback=True,
+                 tools=None, log=None, on_progress=None):
+        if kind not in DISTRIBUTED_KINDS:
+            raise ValueError(f"Unknown task kind '{kind}' (expected one of {', '.join(DISTRIBUTED_KINDS)}).")
+        self.kind = kind
+        self.items = list(items)
+        self.addresses = list(addresses)
+        self.options = options or {}
+        self.token = token
+        self.shared = shared
+        self.local_fallback = local_fallback
+        self.tools = tools
+        self.log = log or (lambda msg, tag=None: None)
+        self.on_progress = on_progress
+        self.stop_requested = False
+        self.results = {}
+        self.per_worker = {}
+        self._lock = threading.Lock()
+
+    def _finish(self, item, error, where, progress):
+        with self._lock:
+            self.results[item] = error
+            self.per_worker[where] = self.per_worker.get(where, 0) + 1
+            done = len(self.results)
+        progress.advance(1, path_bytes(item))
+        if error:
+            self.log(f"  FAILED on {where}: {os.path.basename(item)}: {error}", "error")
+        if self.on_progress:
+            self.on_progress(done, len(self.items))
+
+    @traced("task", "remote slot")
+    def _slot(self, address, pending, progress):
+        """One connection: pull tasks until the queue is empty, the node fails, or a stop is requested."""
+        where = f"{address[0]}:{address[1]}"
+        try:
+            client = WorkerClient(address, self.token)
+        except (OSError, WorkerError, ValueError) as e:
+            self.log(f"Worker {where} unavailable: {e}", "warning")
+            return
+        recv_root = tempfile.mkdtemp(prefix="recv-", dir=WORKER_DIR)
+        try:
+            while not self.stop_requested:
+                try:
+                    item = pending.get_nowait()
+                except queue.Empty:
+                    return
+                out_dir, name = _task_destination(self.kind, item, self.options)
+                recv_dir = os.path.join(recv_root, "task")
+                try:
+                    _, received = client.run(self.kind, item, out_dir, name, self.options.get('args', {}),
+                                             shared=self.shared, recv_dir=recv_dir)
+                    if not self.shared:
+                        _place_outputs(self.kind, item, out_dir, name, received, recv_dir)
+                    elif self.kind == "compress":
+                        os.replace(os.path.join(out_dir, name), item)
+                    self._finish(item, None, where, progress)
+                except WorkerError as e:
+                    self._finish(item, str(e), where, progress)
+                except (OSError, ValueError) as e:
+                    pending.put(item)  # the node dropped out; someone else takes it
+                    self.log(f"Worker {where} lost ({e}); its task was requeued.", "warning")
+                    return
+                finally:
+                    shutil.rmtree(recv_dir, ignore_errors=True)
+        finally:
+            client.close()
+            shutil.rmtree(recv_root, ignore_errors=True)
+
+    def run(self):
+        """Returns {item: None on success, else the error}. Items no node ran are run locally (or marked)."""
+        os.makedirs(WORKER_DIR, exist_ok=True)
+        pending = queue.Queue()
+        for item in self.items:
+            pending.put(item)
+        nodes = {}
+        for key, info in probe_workers(self.addresses, self.token).items():
+            if self.shared and info.get('ok') and not info.get('shared'):
+                self.log(f"Worker {key} skipped: it accepts no shared-storage tasks (no --shared-root)", "warning")
+            elif info.get('ok') and self.kind in info.get('kinds', ()):
+                host, _, port = key.rpartition(":")
+                nodes[(host, int(port))] = info['capacity']
+            else:
+                self.log(f"Worker {key} skipped: {info.get('error') or f'cannot run {self.kind}'}", "warning")
+        slots = [address for address, capacity in nodes.items() for _ in range(capacity)]
+        self.log(f"Distributing {len(self.items)} {self.kind} task(s) over {len(nodes)} worker(s), "
+                 f"{len(slots)} slot(s){' (shared storage)' if self.shared else ''}", "info")
+
+        sizes = sum(path_bytes(i) for i in self.items)
+        with track_job(f"distributed {self.kind}", items=len(self.items), input_bytes=sizes,
+                       workers=len(nodes), slots=len(slots)) as job, \
+                Progress(f"distributed {self.kind}", len(self.items), sizes, label=f"Distributed {self.kind}") as progress:
+            if slots:
+                with ThreadPoolExecutor(max_workers=len(slots)) as pool:
+                    for future in [pool.submit(self._slot, address, pending, progress) for address in slots]:
+                        future.result()
+            leftovers = []
+            while not pending.empty():
+                leftovers.append(pending.get())
+            if leftovers and self.local_fallback and not self.stop_requested:
+                self.log(f"Running {len(leftovers)} task(s) locally.", "info")
+                tools = self.tools or resolve_tools(load_settings())
+                for item in leftovers:
+                    if self.stop_requested:
+                        break
+                    out_dir, name = _task_destination(self.kind, item, self.options)
+                    try:
+                        run_worker_task(self.kind, item, out_dir, name, self.options.get('args', {}), tools)
+                        if self.kind == "compress":
+                            os.replace(os.path.join(out_dir, name), item)
+                        self._finish(item, None, "local", progress)
+                    except (WorkerError, OSError, subprocess.CalledProcessError) as e:
+                        self._finish(item, _task_error(e), "local", progress)
+            for item in self.items:
+                self.results.setdefault(item, "not run (no worker available)" if not self.stop_requested else "stopped")
+            job.update(ok=not any(self.results.values()), per_worker=dict(self.per_worker))
+        failed = sum(1 for error in self.results.values() if error)
+        self.log(f"Distributed {self.kind}: {len(self.items) - failed} ok, {failed} failed "
+                 f"({', '.join(f'{w}: {n}' for w, n in sorted(self.per_worker.items()))})",
+                 "success" if not failed else "error")
+        return self.results
+
+
+def distributed_items(kind, inputs, options=None):
+    """The per-file tasks of a batch: compressible assets, .luac scripts (not yet decompiled), SDATs or archives."""
+    options = options or {}
+    if kind == "compress":
+        return [f for folder in inputs for f in find_compressible(folder)]
+    if kind == "decompile":
+        return [str(f) for f in find_luac_files(options['project_dir'])
+                if not os.path.exists(os.path.join(*_task_destination(kind, str(f), options)))]
+    if kind == "resharc":
+        return [f for item in inputs for f in (find_sdat_files(item) if os.path.isdir(item) else [item])]
+    return [f for item in inputs for f in (find_library_archives(item, tuple(ARCHIVE_TYPES))
+                                           if os.path.isdir(item) else [item])]
+
+
+def spawn_local_workers(count, slots=1, token=""):
+    """Start `count` worker processes on this machine (for testing). Returns (addresses, processes)."""
+    addresses, processes = [], []
+    for _ in range(count):
+        process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "worker", "--port", "0",
+                                    "--slots", str(slots), "-q"], stdout=subprocess.PIPE, text=True,
+                                   env=dict(os.environ, HDK_WORKER_TOKEN=token), startupinfo=get_startupinfo())
+        line = process.stdout.readline()  # "listening on host:port"
+        match = re.search(r"listening on (\S+):(\d+)", line)
+        if not match:
+            process.kill()
+            raise WorkerError(f"local worker did not start: {line.strip()}")
+        addresses.append((match.group(1), int(match.group(2))))
+        processes.append(process)
+    return addresses, processes
+
+
+# =========================================================================
+# COMMAND LINE (headless)
+# =========================================================================
+def _stderr_log(quiet):
+    def log(msg, tag=None):
+        if not quiet:
+            print(f"[{tag.upper()}] {msg}" if tag else msg, file=sys.stderr, flush=True)
+    return log
+
+
+def _require(tools, key, subcommand=None):
+    """Path of a tool that exists and passed its (cached) health check, or exit with the reason."""
+    path = tools.get(key)
+    if not path or not os.path.exists(path):
+        raise SystemExit(f"{TOOL_LABELS[key]} not found — set it once in the GUI (same settings file) or put it on PATH.")
+    problem = tool_problem(check_tool_health(tools, keys=[key]), key, subcommand)
+    if problem:
+        raise SystemExit(f"{problem} — fix it, then run `tools --health --refresh`.")
+    return path
+
+
+def _report_progress(stop, interval=5.0):
+    """Headless: print a progress line for every running job every few seconds."""
+    while not stop.wait(interval):
+        for progress in active_progress():
+            print(f"[PROGRESS] {format_progress(progress.snapshot())}", file=sys.stderr, flush=True)
+
+
+def _tool_result(returncode, out_str, err_str, **extra):
+    return dict(ok=returncode == 0, returncode=returncode, stdout=out_str, stderr=err_str, **extra)
+
+
+def cmd_tools(args, settings, tools, log):
+    result = dict(ok=all(tools.values()), settings_file=SETTINGS_FILE,
+                  platform=f"{platform.system()} {platform.machine()}", **tools)
+    if args.health or args.refresh:
+        health = check_tool_health(tools, refresh=args.refresh)
+        result.update(ok=all(record['ok'] for record in health.values()), health=health)
+    return result
+
+
+def cmd_extract(args, settings, tools, log):
+    archive_type = ARCHIVE_TYPES.get(os.path.splitext(args.input)[1].lower())
+    if not archive_type:
+        raise SystemExit("Unknown file type (expected .sdat, .bar, .sharc or .pkg).")
+    output_path = args.out or args.input + "_extracted"
+    if not args.no_preflight:
+        output_path, _ = preflight("extract", args.input, output_path, settings, log, wait=args.wait)
+    result = _tool_result(*run_with_progress([_require(tools, 'hdk', archive_type), archive_type, "x",
+                                              "-i", args.input, "-o", output_path]), output=output_path)
+    if result['ok'] and args.dedup:
+        result['dedup'] = dedup_tree(output_path, settings.get("dedup_store") or DEDUP_STORE_DIR,
+                                     settings.get("dedup_mode") or "auto", log=log)
+    return result
+
+
+def cmd_pack(args, settings, tools, log):
+    hdk_path = _require(tools, 'hdk', args.format)
+    output_file = args.out or os.path.join(os.path.dirname(os.path.abspath(args.input)),
+                                           clean_output_name(args.input, args.format))
+    if not args.no_preflight:
+        output_file, _ = preflight("pack", args.input, output_file, settings, log, wait=args.wait)
+    source, extra, stage = args.input, {}, None
+    try:
+        if args.prune_unused:
+            report = analyze_assets(args.input, args.lua or (), args.keep or ())
+            source = stage = stage_used_assets(args.input, report)
+            extra['pruned'] = dict(files=len(report['unused']), bytes=report['unused_bytes'])
+            log(f"Leaving out {len(report['unused'])} unreferenced file(s), {format_size(report['unused_bytes'])}.", "info")
+        if args.minify or args.minify_lua:
+            if stage is None:
+                stage, report = stage_minified(source, lua=args.minify_lua)
+                source = stage
+            else:
+                report = minify_tree(source, lua=args.minify_lua)  # already our own staging copy
+            extra['minified'] = report
+            for line in format_minify_report(report):
+                log(line, "info")
+        compressed = 0
+        if args.compress:
+            compressed = batch_compress(hdk_path, source, args.algo)
+            log(f"Optimization Complete. Compressed {compressed} files.", "success")
+        return _tool_result(*run_with_progress([hdk_path, args.format, "c", "-i", source, "-o", output_file]),
+                            output=output_file, compressed=compressed, **extra)
+    finally:
+        if stage:
+            shutil.rmtree(stage, ignore_errors=True)
+
+
+def cmd_multipack(args, settings, tools, log):
+    hdk_path = _require(tools, 'hdk', args.formats[0])
+    for format_type in args.formats[1:]:
+        _require(tools, 'hdk', format_type)
+    output_dir = args.out_dir or os.path.dirname(os.path.abspath(args.input))
+    packer = MultiPack(hdk_path, args.input, output_dir, args.formats, compress=args.compress, algo=args.algo,
+                       prune=args.prune_unused, lua_dirs=args.lua or (), keep=args.keep or (), minify=args.minify,
+                       minify_lua=args.minify_lua, settings=settings, log=log)
+    results = packer.run()
+    return dict(ok=all(r['ok'] for r in results.values()), outputs=results)
+
+
+def cmd_watch(args, settings, tools, log):
+    hdk_path = _require(tools, 'hdk', args.format)
+    output_file = args.out or os.path.join(os.path.dirname(os.path.abspath(args.input)),
+                                           clean_output_name(args.input, args.format))
+    watcher = FolderWatcher(hdk_path, args.input, output_file, args.format, compress=args.compress,
+                            algo=args.algo, interval=args.interval, debounce=args.debounce, log=log)
+    builds = []
+    watcher.on_build = builds.append
+    log("Press Ctrl+C to stop watching.", "info")
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    failed = sum(1 for result in builds if not result['ok'])
+    return dict(ok=not failed, output=output_file, builds=len(builds), failed_builds=failed)
+
+
+def cmd_compress(args, settings, tools, log):
+    count = batch_compress(_require(tools, 'hdk', "compress"), args.input, args.algo)
+    return dict(ok=True, compressed=count)
+
+
+def cmd_decompress(args, settings, tools, log):
+    try:
+        written = edgezlib_decompress_file(args.input, args.out)
+        return dict(ok=True, decoder="python", bytes=written, output=args.out)
+    except ArchiveFormatError as e:
+        log(f"In-app decoder: {e} — falling back to hdk.", "warning")
+    return _tool_result(*run_tool([_require(tools, 'hdk', "compress"), "compress", "d", "-a", "zlib",
+                                   "-i", args.input, "-o", args.out]), decoder="hdk", output=args.out)
+
+
+def cmd_map(args, settings, tools, log):
+    hdk_path = _require(tools, 'hdk', "map")
+    names = NameDictionary()
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        results = list(pool.map(lambda d: map_folder(hdk_path, d, names, args.full, args.uuid or "",
+                                                     not args.no_names, log=log), args.folders))
+    return dict(ok=all(results), folders=dict(zip(args.folders, results)), known_names=len(names))
+
+
+def cmd_patch(args, settings, tools, log):
+    if args.rules:
+        with open(args.rules, 'r', encoding='utf-8') as f:
+            rules_text = f.read()
+    else:
+        rules_text = settings.get("patch_rules", DEFAULT_PATCH_RULES)
+    summary = patch_tree(args.input, rules_text, dry_run=args.dry_run, incremental=args.incremental)
+    return dict(ok=not summary['errors'], dry_run=args.dry_run, **summary)
+
+
+def cmd_toc(args, settings, tools, log):
+    header, entries = read_archive_toc(args.input)
+    result = dict(ok=True, header=header, entries=entries)
+    if args.extract:
+        selected = select_archive_entries(entries, args.extract)
+        result['extracted'] = extract_archive_entries(args.input, selected, args.out or args.input + "_extracted")
+    return result
+
+
+def cmd_resharc(args, settings, tools, log):
+    files = []
+    for item in args.inputs:
+        files.extend(find_sdat_files(item) if os.path.isdir(item) else [item])
+    returncode, out_str, err_str, outputs = run_resharc(_require(tools, 'resharc'), files)
+    return _tool_result(returncode, out_str, err_str, outputs=outputs)
+
+
+def cmd_decompile(args, settings, tools, log):
+    src = args.src or settings.get("luac_project_dir", "")
+    out = args.out or settings.get("luac_output_dir", "")
+    if not os.path.isdir(src) or not os.path.isdir(out):
+        raise SystemExit("Source and output folders are required (or set them once in the LUAC tab).")
+    workers = args.workers or int(settings.get("luac_workers", 4))
+    _require(tools, 'java')
+    stats = decompile_luac(_require(tools, 'unluac'), src, out, workers, log=log)
+    return dict(ok=not stats['failed'] and not stats['stopped'], **stats)
+
+
+def cmd_search(args, settings, tools, log):
+    keywords_str = args.keywords or settings.get("luac_search_keywords", "save, load, persist")
+    keywords = [k.strip().lower() for k in keywords_str.split(',') if k.strip()]
+    results = search_keywords(args.input, keywords)
+    return dict(ok=True, keywords=keywords,
+                matches=[{'file': path, 'counts': dict(counts)} for path, counts in results])
+
+
+def cmd_tree(args, settings, tools, log):
+    txt_path, json_path = export_tree(args.input, args.out, sizes=args.sizes, hashes=args.hashes,
+                                      workers=args.workers)
+    return dict(ok=True, txt=txt_path, json=json_path)
+
+
+def cmd_dedup(args, settings, tools, log):
+    store = args.store or settings.get("dedup_store") or DEDUP_STORE_DIR
+    reports = {}
+    for folder in args.folders:
+        reports[folder] = dedup_tree(folder, store, args.mode or settings.get("dedup_mode") or "auto", args.workers,
+                                     args.min_size, log=log)
+        for line in format_dedup_report(reports[folder]):
+            log(line)
+    return dict(ok=all(not r['errors'] for r in reports.values()), store=store,
+                bytes_saved=sum(r['bytes_saved'] for r in reports.values()), folders=reports)
+
+
+def cmd_unshare(args, settings, tools, log):
+    return dict(ok=True, unshared={folder: unshare_tree(folder) for folder in args.folders})
+
+
+def cmd_verify(args, settings, tools, log):
+    hdk_path = _require(tools, 'hdk', "pkg" if ".pkg" in args.ext else None)
+    verifier = LibraryVerifier(hdk_path, args.library, repack=args.repack, workers=args.workers,
+                               resume=not args.restart, extensions=tuple(e.lower() for e in args.ext), log=log)
+    summary = verifier.run()
+    return dict(ok=not summary['failures'] and not summary['stopped'], **summary)
+
+
+def cmd_jobs(args, settings, tools, log):
+    jobs = pending_jobs()
+    if args.resume or args.discard:
+        wanted = args.resume or args.discard
+        selected = [job for job in jobs if wanted in ("all", job.job_id)]
+        if not selected:
+            raise ValueError(f"No interrupted job '{wanted}' — run `jobs` to list them.")
+        if args.discard:
+            return dict(ok=True, discarded={job.job_id: job.discard() for job in selected})
+        results = {job.job_id: resume_job(job, log=log) for job in selected}
+        return dict(ok=not any(r['remaining'] for r in results.values()), resumed=results)
+    return dict(ok=True, jobs=[dict(id=job.job_id, kind=job.kind, started=job.started, done=len(job.done),
+                                    total=len(job.items), params=job.params) for job in jobs])
+
+
+def cmd_stats(args, settings, tools, log):
+    if args.clear:
+        for path in (TELEMETRY_FILE, TELEMETRY_FILE + ".1"):
+            if os.path.exists(path):
+                os.remove(path)
+        return dict(ok=True, cleared=TELEMETRY_FILE)
+    records = [r for r in load_telemetry() if not args.op or args.op in (r.get('op') or "")]
+    summary = summarize_telemetry(records, trend_runs=args.last)
+    if not args.quiet:
+        print("\n".join(format_telemetry(summary)), file=sys.stderr)
+    return dict(ok=True, records=len(records), file=TELEMETRY_FILE, operations=summary)
+
+
+def cmd_assets(args, settings, tools, log):
+    report = analyze_assets(args.input, args.lua or (), args.keep or ())
+    if not args.quiet:
+        print("\n".join(format_asset_report(report, limit=args.limit)), file=sys.stderr)
+    if not args.graph:
+        del report['graph']
+    return dict(ok=True, **report)
+
+
+def cmd_sizes(args, settings, tools, log):
+    profile = profile_assets(args.input, args.workers)
+    if not args.quiet:
+        print("\n".join(format_asset_profile(profile, limit=args.limit)), file=sys.stderr)
+    if args.out:
+        save_asset_profile(profile, args.out)
+        return dict(ok=True, output=args.out, files=profile['files'], total_bytes=profile['total_bytes'])
+    return dict(ok=True, **profile)
+
+
+def cmd_resources(args, settings, tools, log):
+    profiles = set_resource_profiles(settings.get("resource_profiles"))
+    support = governor_support()
+    if not args.quiet:
+        print(f"{'job':<10}{'nice':>6}  {'io':<8}{'cpus':<10}{'memory':>8}", file=sys.stderr)
+        for kind, profile in profiles.items():
+            memory = f"{profile['memory_mb']} MB" if profile['memory_mb'] else "-"
+            print(f"{kind:<10}{profile['nice']:>6}  {profile['io']:<8}{profile['cpus'] or 'all':<10}{memory:>8}",
+                  file=sys.stderr)
+        print("Supported here: " + ", ".join(f"{k}={v}" for k, v in support.items()), file=sys.stderr)
+    return dict(ok=True, profiles=profiles, support=support)
+
+
+def cmd_worker(args, settings, tools, log):
+    server = WorkerServer(args.host, args.port, args.slots, args.token, tools, log, args.shared_root or ())
+    host, port = server.server_address[:2]
+    print(f"listening on {host}:{port} ({server.capacity} slot(s), {', '.join(server.describe()['kinds']) or 'no tools'})",
+          flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return dict(ok=True, name=server.name, done=server.done, failed=server.failed)
+
+
+def cmd_distribute(args, settings, tools, log):
+    addresses = parse_worker_addresses(" ".join(args.worker or [settings.get("build_workers", "")]))
+    options = {'args': {'algo': args.algo}, 'output_dir': args.out}
+    if args.kind == "decompile":
+        options.update(project_dir=args.inputs[0], output_dir=args.out or settings.get("luac_output_dir", ""))
+        if not os.path.isdir(options['output_dir']):
+            raise SystemExit("decompile needs --out (or the output folder set in the LUAC tab).")
+    items = distributed_items(args.kind, args.inputs, options)
+    processes = []
+    if args.local_workers:
+        local, processes = spawn_local_workers(args.local_workers, args.slots, args.token)
+        addresses += local
+    try:
+        batch = DistributedBatch(args.kind, items, addresses, options, token=args.token, shared=args.shared,
+                                 local_fallback=not args.no_local, tools=tools, log=log)
+        results = batch.run()
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+    failed = {item: error for item, error in results.items() if error}
+    return dict(ok=not failed, items=len(items), failed=failed, per_worker=batch.per_worker)
+
+
+def cmd_manifest(args, settings, tools, log):
+    manifest = manifest_for(args.input, tools['hdk'], args.workers, log)
+    if args.out:
+        save_manifest(manifest, args.out)
+    return dict(ok=True, root=manifest['root'], merkle_root=manifest['dirs']['']['hash'],
+                output=args.out, **manifest.get('stats', {}))
+
+
+def cmd_diff(args, settings, tools, log):
+    old = manifest_for(args.old, tools['hdk'], args.workers, log)
+    new = manifest_for(args.new, tools['hdk'], args.workers, log)
+    diff = diff_manifests(old, new)
+    if not args.quiet:
+        print(format_diff(diff, args.old, args.new), file=sys.stderr)
+    return dict(ok=True, old=old['root'], new=new['root'], **diff)
+
+
+def cmd_inspect(args, settings, tools, log):
+    return _tool_result(*run_tool([_require(tools, 'hdk', "pkg"), "pkg", "i", args.input]))
+
+
+def cmd_pipeline(args, settings, tools, log):
+    hdk_path = _require(tools, 'hdk', args.format)
+    _require(tools, 'hdk', "map")
+    inputs = []
+    for item in args.inputs:
+        if os.path.isdir(item):
+            inputs.extend(sorted(os.path.join(item, f) for f in os.listdir(item)
+                                 if os.path.splitext(f)[1].lower() in ARCHIVE_TYPES))
+        else:
+            inputs.append(item)
+
+    options = {
+        'format': args.format,
+        'algo': args.algo,
+        'compress': not args.no_compress,
+        'full_map': args.full_map,
+        'patch_rules': settings.get("patch_rules", DEFAULT_PATCH_RULES),
+        'dedup': args.dedup,
+        'dedup_store': settings.get("dedup_store", ""),
+        'dedup_mode': settings.get("dedup_mode", "auto"),
+        'minify': args.minify or args.minify_lua,
+        'minify_lua': args.minify_lua,
+    }
+    pipeline = ScenePipeline(hdk_path, inputs, args.out, options, NameDictionary(), log=log, workers=args.workers)
+    results = pipeline.run()
+    return dict(ok=all(results.values()), scenes=results)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="hdk_launcher.py --headless",
+                                     description="HDK Commander without the GUI. Prints a JSON result on stdout.")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("-q", "--quiet", action="store_true", help="no progress output on stderr")
+    common.add_argument("--trace", metavar="FILE", help="record spans and write a Chrome trace (.json) here")
+    common.add_argument("--profile", action="store_true", help="run the command under cProfile (hdk_cache/profiles/)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add(name, help_text):
+        return sub.add_parser(name, help=help_text, parents=[common])
+
+    def add_asset_args(p):
+        p.add_argument("--lua", action="append", metavar="DIR", help="decompiled .lua output of this folder (repeatable)")
+        p.add_argument("--keep", action="append", metavar="GLOB", help="never treat matching files as unused (repeatable)")
+
+    def add_preflight_args(p):
+        p.add_argument("--wait", type=float, default=0, metavar="SECONDS",
+                       help="if the output does not fit, wait up to this long for space before giving up")
+        p.add_argument("--no-preflight", action="store_true", help="skip the disk-space check")
+
+    p = add("tools", "show the resolved hdk / hdk-resharc / unluac / java paths")
+    p.add_argument("--health", action="store_true", help="also probe versions and subcommands (cached)")
+    p.add_argument("--refresh", action="store_true", help="ignore the probe cache (implies --health)")
+    p.set_defaults(func=cmd_tools)
+
+    p = add("extract", "extract a .sdat/.bar/.sharc/.pkg")
+    p.add_argument("input")
+    p.add_argument("-o", "--out", help="output folder (default: <input>_extracted)")
+    p.add_argument("--dedup", action="store_true", help="link duplicate files to the shared store afterwards")
+    add_preflight_args(p)
+    p.set_defaults(func=cmd_extract)
+
+    p = add("dedup", "replace duplicate files in folders with links to one stored copy")
+    p.add_argument("folders", nargs="+")
+    p.add_argument("--store", help=f"store folder (default: settings or {DEDUP_STORE_DIR})")
+    p.add_argument("--mode", choices=DEDUP_MODES,
+                   help="auto: reflinks only; hardlink: read-only hardlinks where there are no reflinks "
+                        "(default: settings or auto)")
+    p.add_argument("--min-size", type=int, default=DEDUP_MIN_SIZE)
+    p.add_argument("--workers", type=int, default=TREE_HASH_WORKERS)
+    p.set_defaults(func=cmd_dedup)
+
+    p = add("unshare", "give hardlinked files private copies so they can be edited in place")
+    p.add_argument("folders", nargs="+")
+    p.set_defaults(func=cmd_unshare)
+
+    p = add("pack", "pack a folder into an archive")
+    p.add_argument("input")
+    p.add_argument("-f", "--format", default="sdat", choices=["sdat", "bar", "sharc", "pkg"])
+    p.add_argument("-o", "--out", help="output file (default: cleaned folder name next to it)")
+    p.add_argument("--compress", action="store_true", help="Auto-Optimize assets before packing")
+    p.add_argument("--algo", default="lzma", choices=["lzma", "zlib"])
+    p.add_argument("--prune-unused", action="store_true",
+                   help="leave out files no scene XML / Lua references (see the assets command)")
+    p.add_argument("--minify", action="store_true", help="minify XML in a staging copy before packing")
+    p.add_argument("--minify-lua", action="store_true", help="also minify .lua source (implies --minify)")
+    add_asset_args(p)
+    add_preflight_args(p)
+    p.set_defaults(func=cmd_pack)
+
+    p = add("multipack", "pack a folder into several formats from one prepare / compress pass")
+    p.add_argument("input")
+    p.add_argument("-f", "--formats", nargs="+", default=["sdat", "bar"], choices=["sdat", "bar", "sharc", "pkg"])
+    p.add_argument("-o", "--out-dir", help="output folder (default: next to the input; names like pack's)")
+    p.add_argument("--compress", action="store_true", help="Auto-Optimize once, into a reusable staging copy")
+    p.add_argument("--algo", default="lzma", choices=["lzma", "zlib"])
+    p.add_argument("--prune-unused", action="store_true", help="leave out files no scene XML / Lua references")
+    p.add_argument("--minify", action="store_true", help="minify XML in the staging copy")
+    p.add_argument("--minify-lua", action="store_true", help="also minify .lua source (implies --minify)")
+    add_asset_args(p)
+    p.set_defaults(func=cmd_multipack)
+
+    p = add("watch", "repack a folder automatically whenever its files change (Ctrl+C to stop)")
+    p.add_argument("input")
+    p.add_argument("-f", "--format", default="sdat", choices=["sdat", "bar", "sharc", "pkg"])
+    p.add_argument("-o", "--out", help="output file (default: cleaned folder name next to it)")
+    p.add_argument("--compress", action="store_true", help="compress changed assets into a staging copy first")
+    p.add_argument("--algo", default="lzma", choices=["lzma", "zlib"])
+    p.add_argument("--interval", type=float, default=WATCH_POLL_INTERVAL, help="seconds between polls")
+    p.add_argument("--debounce", type=float, default=WATCH_DEBOUNCE, help="quiet seconds before rebuilding")
+    p.set_defaults(func=cmd_watch)
+
+    p = add("compress", "compress every known asset of a folder in place")
+    p.add_argument("input")
+    p.add_argument("--algo", default="lzma", choices=["lzma", "zlib"])
+    p.set_defaults(func=cmd_compress)
+
+    p = add("decompress", "decode an EdgeZLib file (hdk fallback)")
+    p.add_argument("input")
+    p.add_argument("out")
+    p.set_defaults(func=cmd_decompress)
+
+    p = add("map", "restore file names (learned names first, then hdk map)")
+    p.add_argument("folders", nargs="+")
+    p.add_argument("--full", action="store_true", help="full regex scan")
+    p.add_argument("--uuid", help="object UUID (objects only)")
+    p.add_argument("--no-names", action="store_true", help="skip the learned-name pre-pass")
+    p.add_argument("--workers", type=int, default=2)
+    p.set_defaults(func=cmd_map)
+
+    p = add("patch", "offline patch: rewrite URLs in XML / Lua / text files")
+    p.add_argument("input")
+    p.add_argument("--rules", help="rules file (default: the rules saved in the GUI)")
+    p.add_argument("--dry-run", action="store_true")
+    p.add_argument("--incremental", action="store_true")
+    p.set_defaults(func=cmd_patch)
+
+    p = add("toc", "list a .bar table of contents, optionally extracting matching entries")
+    p.add_argument("input")
+    p.add_argument("--extract", metavar="GLOB")
+    p.add_argument("-o", "--out")
+    p.set_defaults(func=cmd_toc)
+
+    p = add("resharc", "normalize BAR-based .sdat files (files or folders)")
+    p.add_argument("inputs", nargs="+")
+    p.set_defaults(func=cmd_resharc)
+
+    p = add("decompile", "bulk-decompile .luac files")
+    p.add_argument("--src", help="default: LUAC source folder from settings")
+    p.add_argument("--out", help="default: decompiled output folder from settings")
+    p.add_argument("--workers", type=int)
+    p.set_defaults(func=cmd_decompile)
+
+    p = add("search", "keyword search in .lua / .luac files")
+    p.add_argument("input")
+    p.add_argument("-k", "--keywords", help="comma-separated (default: from settings)")
+    p.set_defaults(func=cmd_search)
+
+    p = add("tree", "export a directory tree as .txt + .json")
+    p.add_argument("input")
+    p.add_argument("-o", "--out", required=True, help="output base path")
+    p.add_argument("--sizes", action="store_true", help="include file sizes")
+    p.add_argument("--hashes", action="store_true", help="include SHA-1 of every file (hashed in parallel)")
+    p.add_argument("--workers", type=int, default=TREE_HASH_WORKERS)
+    p.set_defaults(func=cmd_tree)
+
+    p = add("verify", "check every archive of a library extracts (and round-trips); resumes from a journal")
+    p.add_argument("library")
+    p.add_argument("--repack", action="store_true", help="also repack, re-extract and compare contents")
+    p.add_argument("--workers", type=int, default=2)
+    p.add_argument("--restart", action="store_true", help="ignore the journal and verify everything again")
+    p.add_argument("--ext", nargs="+", default=list(LIBRARY_EXTENSIONS), help="archive extensions to include")
+    p.set_defaults(func=cmd_verify)
+
+    p = add("jobs", "list batch jobs interrupted by a crash; resume or discard them")
+    group = p.add_mutually_exclusive_group()
+    group.add_argument("--resume", metavar="ID", help="job id from the list, or 'all'")
+    group.add_argument("--discard", metavar="ID", help="clean up its temp files and forget it ('all' for every job)")
+    p.set_defaults(func=cmd_jobs)
+
+    p = add("stats", "summarize recorded job / child-process metrics per operation")
+    p.add_argument("--op", help="only operations containing this text (e.g. 'compress')")
+    p.add_argument("--last", type=int, default=TELEMETRY_TREND_RUNS, help="runs kept per operation trend")
+    p.add_argument("--clear", action="store_true", help="delete the recorded metrics")
+    p.set_defaults(func=cmd_stats)
+
+    p = add("assets", "build the asset reference graph of a pack folder and list unreferenced files")
+    p.add_argument("input")
+    add_asset_args(p)
+    p.add_argument("--limit", type=int, default=25, help="unused files listed on stderr")
+    p.add_argument("--graph", action="store_true", help="include the full reference graph in the JSON")
+    p.set_defaults(func=cmd_assets)
+
+    p = add("sizes", "profile what dominates a folder's size: types, DDS formats, largest files, compressibility")
+    p.add_argument("input")
+    p.add_argument("-o", "--out", help="write the full profile to this .json (stdout gets a summary)")
+    p.add_argument("--limit", type=int, default=15, help="types listed on stderr")
+    p.add_argument("--workers", type=int, default=TREE_HASH_WORKERS)
+    p.set_defaults(func=cmd_sizes)
+
+    p = add("resources", "show the priority / I/O / CPU / memory profile each job type runs under")
+    p.set_defaults(func=cmd_resources)
+
+    p = add("worker", "serve compress / decompile / resharc / extract tasks to other machines over TCP")
+    p.add_argument("--host", default="127.0.0.1", help="address to listen on (0.0.0.0 for the whole network)")
+    p.add_argument("--port", type=int, default=WORKER_PORT, help="0 picks a free port")
+    p.add_argument("--slots", type=int, help="tasks run at once (default: CPU count)")
+    p.add_argument("--token", default=os.environ.get("HDK_WORKER_TOKEN", ""),
+                   help="shared secret clients must send (default: $HDK_WORKER_TOKEN; required off localhost)")
+    p.add_argument("--shared-root", action="append", metavar="DIR",
+                   help="accept shared-storage tasks for paths under this folder (repeatable; default: none)")
+    p.set_defaults(func=cmd_worker)
+
+    p = add("distribute", "run a compress / decompile / resharc / extract batch on build workers")
+    p.add_argument("kind", choices=DISTRIBUTED_KINDS)
+    p.add_argument("inputs", nargs="+", help="files or folders (decompile: the LUAC source folder)")
+    p.add_argument("-w", "--worker", action="append", metavar="HOST[:PORT]",
+                   help="worker address (repeatable; default: the workers set in the GUI)")
+    p.add_argument("--local-workers", type=int, default=0, metavar="N", help="also start N worker processes here")
+    p.add_argument("--slots", type=int, default=1, help="slots of each --local-workers process")
+    p.add_argument("--token", default=os.environ.get("HDK_WORKER_TOKEN", ""))
+    p.add_argument("--shared", action="store_true", help="workers see the same paths (shared storage); no streaming")
+    p.add_argument("--no-local", action="store_true", help="do not run tasks here when no worker can take them")
+    p.add_argument("--algo", default="lzma", choices=["lzma", "zlib"])
+    p.add_argument("-o", "--out", help="output folder for extract / decompile")
+    p.set_defaults(func=cmd_distribute)
+
+    p = add("manifest", "hash a folder / archive into a Merkle manifest (cached, incremental)")
+    p.add_argument("input", help="folder, archive or manifest .json")
+    p.add_argument("-o", "--out", help="also save the manifest to this .json")
+    p.add_argument("--workers", type=int, default=TREE_HASH_WORKERS)
+    p.set_defaults(func=cmd_manifest)
+
+    p = add("diff", "compare two folders / archives / manifests, skipping identical subtrees")
+    p.add_argument("old")
+    p.add_argument("new")
+    p.add_argument("--workers", type=int, default=TREE_HASH_WORKERS)
+    p.set_defaults(func=cmd_diff)
+
+    p = add("inspect", "show .pkg metadata")
+    p.add_argument("input")
+    p.set_defaults(func=cmd_inspect)
+
+    p = add("pipeline", "extract → map → patch → compress → pack many scenes")
+    p.add_argument("inputs", nargs="+", help="archives (.sdat/.bar/.sharc/.pkg) or folders to scan for them")
+    p.add_argument("--out", required=True, help="output folder for the rebuilt archives")
+    p.add_argument("--format", default="sdat", choices=["sdat", "bar", "sharc", "pkg"])
+    p.add_argument("--algo", default="lzma", choices=["lzma", "zlib"])
+    p.add_argument("--no-compress", action="store_true")
+    p.add_argument("--full-map", action="store_true")
+    p.add_argument("--dedup", action="store_true", help="link duplicate extracted files to the shared store")
+    p.add_argument("--minify", action="store_true", help="minify XML before compressing")
+    p.add_argument("--minify-lua", action="store_true", help="also minify .lua source (implies --minify)")
+    p.add_argument("--workers", type=int, default=2)
+    p.set_defaults(func=cmd_pipeline)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    settings = load_settings()
+    tools = resolve_tools(settings)
+    log = _stderr_log(args.quiet)
+    if args.trace:
+        start_tracing()
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    stop_reporting = threading.Event()
+    if not args.quiet:
+        threading.Thread(target=_report_progress, args=(stop_reporting,), daemon=True).start()
+    try:
+        result = args.func(args, settings, tools, log)
+    except (ArchiveFormatError, OSError, ValueError, re.error) as e:
+        result = dict(ok=False, error=str(e))
+    finally:
+        stop_reporting.set()
+    if profiler:
+        result['profile'], top = _finish_profile(profiler, args.command)
+        log(top)
+    if args.trace:
+        result['trace_events'] = stop_tracing().export(args.trace)
+        result['trace'] = args.trace
+    print(json.dumps(result, indent=2, default=str))
+    return 0 if result.get('ok') else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
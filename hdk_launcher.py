@@ -1,34 +1,49 @@
+import sys
+
+# Headless runs (build servers, cron) must never touch tkinter — it may not
+# even be installed there. Hand straight over to the engine's CLI.
+if __name__ == "__main__" and len(sys.argv) > 1 and sys.argv[1] in ("--headless", "--pipeline"):
+    import hdk_engine
+    argv = sys.argv[2:] if sys.argv[1] == "--headless" else ["pipeline"] + sys.argv[2:]
+    sys.exit(hdk_engine.main(argv))
+
 import tkinter as tk
 from tkinter import ttk, filedialog, scrolledtext, messagebox
-import subprocess
 import threading
 import os
-import sys
-import shutil
 import platform
-import json
-from pathlib import Path
-from datetime import datetime
-
-# =========================================================================
-# CONFIGURATION
-# =========================================================================
-DEFAULT_HDK_PATH = r""
-DEFAULT_RESHARC_PATH = r""
-DEFAULT_UNLUAC_PATH = r""
-
-# Settings file — lives next to the script
-SETTINGS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hdk_settings.json")
+import time
+import re
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from hdk_engine import (
+    SETTINGS_FILE, IS_WINDOWS, IS_MAC,
+    DECODE_WORKERS, DEFAULT_PATCH_RULES,
+    ArchiveFormatError, NameDictionary, ScenePipeline,
+    load_settings, save_settings, resolve_tools, check_tool_health, tool_problem, format_health,
+    read_archive_toc, select_archive_entries, extract_archive_entries, format_size,
+    edgezlib_decompress_file, edgezlib_preview, format_preview,
+    parse_patch_rules, patch_tree,
+    clean_output_name, batch_compress, map_folder,
+    find_sdat_files, run_resharc, find_luac_files, decompile_luac, search_keywords, export_tree,
+    manifest_for, diff_manifests, format_diff,
+    DEDUP_STORE_DIR, dedup_tree, format_dedup_report, unshare_tree,
+    LibraryVerifier, pending_jobs, resume_job, FolderWatcher,
+    TELEMETRY_FILE, load_telemetry, summarize_telemetry, format_rate,
+    start_tracing, stop_tracing, tracing_active, trace_span, trace_counter, profile_next_job,
+    run_with_progress, active_progress, format_progress,
+    DEFAULT_RESOURCE_PROFILES, IO_PRIORITIES, set_resource_profiles, governor_support,
+    preflight, DiskSpaceError, free_space, same_volume,
+    analyze_assets, format_asset_report, stage_used_assets, profile_assets, save_asset_profile,
+    stage_minified, minify_tree, format_minify_report, MultiPack,
+    DistributedBatch, DISTRIBUTE_MIN_ITEMS, parse_worker_addresses, probe_workers, distributed_items,
+    find_compressible,
+)
 
 # =========================================================================
-# PLATFORM DETECTION
+# FONTS
 # =========================================================================
-IS_WINDOWS = sys.platform == "win32"
-IS_MAC = sys.platform == "darwin"
-IS_LINUX = sys.platform.startswith("linux")
-
-BIN_EXT = ".exe" if IS_WINDOWS else ""
-
 if IS_MAC:
     FONT_MAIN = "SF Pro Text"
     FONT_HEADER = "SF Pro Display"
@@ -42,7 +57,6 @@ else:
     FONT_HEADER = "DejaVu Sans"
     FONT_MONO = "DejaVu Sans Mono"
 
-
 class HDKCommander(tk.Tk):
     def __init__(self):
         super().__init__()
@@ -51,49 +65,117 @@ class HDKCommander(tk.Tk):
         self.geometry("1050x900")
         self.configure(bg="#1e1e1e")
 
-        # Variables
+        # Load saved settings (returns dict, may be empty)
+        self.settings = load_settings()
+
+        # Hash → name dictionary learned from earlier Map runs
+        self.name_dict = NameDictionary()
+
+        # LUAC decompiler state
+        self.luac_is_running = False
+        self.luac_stats = {'success': 0, 'failed': 0, 'skipped': 0, 'total': 0}
+
+        # Filled in by the background health check
+        self.tool_health = {}
+
+        self._setup_variables()
+        self._setup_styles()
+        self._setup_ui()
+
+        # Save settings on close
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+
+        # Binary / JAR detection and version probes run off the UI thread;
+        # the header fills in once they finish.
+        threading.Thread(target=self._detect_tools, daemon=True).start()
+
+    def after(self, ms, func=None, *args):
+        """Tk after(), recording each callback as a 'ui' span (and the backlog of queued ones) while tracing."""
+        if func is None or not tracing_active():
+            return super().after(ms, func, *args)
+        self._ui_pending = getattr(self, '_ui_pending', 0) + 1
+        trace_counter("queued after() callbacks", pending=self._ui_pending)
+        queued = time.perf_counter()
+
+        def traced_callback(*call_args):
+            self._ui_pending -= 1
+            name = getattr(func, '__qualname__', "callback")
+            delay = ms if isinstance(ms, (int, float)) else 0  # after_idle passes 'idle'
+            with trace_span(name, "ui", waited_ms=round((time.perf_counter() - queued) * 1000 - delay, 2)):
+                return func(*call_args)
+        return super().after(ms, traced_callback, *args)
+
+    def _setup_variables(self):
+        """Create every Tk variable up front (tabs are built lazily) and restore saved values."""
         self.hdk_path_var = tk.StringVar(value="Searching...")
         self.resharc_path_var = tk.StringVar(value="Searching...")
         self.unluac_path_var = tk.StringVar(value="Searching...")
+        self.tools_status_var = tk.StringVar(value="Detecting tools...")
+        self.job_status_var = tk.StringVar(value="Idle")
         self.project_path = tk.StringVar(value="No Folder Selected")
 
-        # Load saved settings (returns dict, may be empty)
-        self.settings = self._load_settings()
+        # Extract
+        self.extract_dedup = tk.BooleanVar(value=bool(self.settings.get("dedup_extracts", False)))
+        self.dedup_store_var = tk.StringVar(value=self.settings.get("dedup_store", ""))
+        self.dedup_hardlink = tk.BooleanVar(value=self.settings.get("dedup_mode") == "hardlink")
 
-        # Resolve binary paths: saved settings → manual default → auto-detect
-        found_hdk = self._resolve_binary_path("hdk_path", "hdk", DEFAULT_HDK_PATH, [
-            f"hdk{BIN_EXT}",
-            os.path.join("hdk-cli", "target", "release", f"hdk{BIN_EXT}"),
-        ])
-        found_resharc = self._resolve_binary_path("resharc_path", "hdk-resharc", DEFAULT_RESHARC_PATH, [
-            f"hdk-resharc{BIN_EXT}",
-            os.path.join("hdk-resharc", "target", "release", f"hdk-resharc{BIN_EXT}"),
-        ])
+        # Create & Pack
+        self.pack_input_var = tk.StringVar(value="No folder selected")
+        self.auto_compress = tk.BooleanVar(value=False)
+        self.prune_unused = tk.BooleanVar(value=False)
+        self.minify_xml = tk.BooleanVar(value=False)
+        self.minify_lua = tk.BooleanVar(value=False)
+        self.multi_formats = {fmt: tk.BooleanVar(value=fmt in ("sdat", "bar")) for fmt in ("sdat", "bar", "sharc", "pkg")}
+        self.compress_algo = tk.StringVar(value="lzma")
+        self.pipeline_workers_var = tk.IntVar(value=2)
+        self.watch_format_var = tk.StringVar(value="sdat")
+        self.watch_status_var = tk.StringVar(value="Not watching")
 
-        # Resolve unluac jar: saved settings → manual default → auto-detect nearby
-        found_unluac = self._resolve_jar_path("unluac_path", DEFAULT_UNLUAC_PATH, [
-            "unluac-verbose.jar",
-            "unluac.jar",
-            os.path.join("tools", "unluac-verbose.jar"),
-            os.path.join("tools", "unluac.jar"),
-        ])
+        # LUAC decompiler
+        self.luac_project_var = tk.StringVar(value="No folder selected")
+        self.luac_output_var = tk.StringVar(value="No folder selected")
+        self.luac_workers_var = tk.IntVar(value=4)
+        self.luac_keywords_var = tk.StringVar(value="save, load, persist")
+        self.luac_search_location = tk.StringVar(value="Output")
+        self.luac_tree_sizes = tk.BooleanVar(value=False)
+        self.luac_tree_hashes = tk.BooleanVar(value=False)
 
-        self.hdk_path_var.set(found_hdk if found_hdk else "NOT FOUND - Click Change...")
-        self.resharc_path_var.set(found_resharc if found_resharc else "NOT FOUND - Click Change...")
-        self.unluac_path_var.set(found_unluac if found_unluac else "NOT FOUND - Click Change...")
+        # Advanced tools
+        self.map_full_scan = tk.BooleanVar()
+        self.map_uuid_var = tk.StringVar(value="")
+        self.map_use_names = tk.BooleanVar(value=True)
+        self.map_names_label = tk.StringVar(value=f"Apply learned names first ({len(self.name_dict)} known hashes)")
+        self.map_workers_var = tk.IntVar(value=2)
+        self.patch_incremental = tk.BooleanVar(value=True)
+        self.tool_compress_algo = tk.StringVar(value="lzma")
+        self.crypt_type_var = tk.StringVar(value="auto-detect")
+        self.verify_repack = tk.BooleanVar(value=False)
+        self.verify_resume = tk.BooleanVar(value=True)
+        self.verify_workers_var = tk.IntVar(value=int(self.settings.get("verify_workers", 2) or 2))
+        self.patch_rules_var = tk.StringVar(value=DEFAULT_PATCH_RULES)
+
+        # Disk space preflight
+        self.scratch_dir_var = tk.StringVar(value=self.settings.get("scratch_dir", ""))
+        self.scratch_min_var = tk.IntVar(value=int(self.settings.get("scratch_min_mb", 0) or 0))
+
+        # Build workers (distributed batches)
+        self.workers_var = tk.StringVar(value=self.settings.get("build_workers", ""))
+        self.worker_token_var = tk.StringVar(value=self.settings.get("worker_token", ""))
+        self.use_workers = tk.BooleanVar(value=bool(self.settings.get("use_build_workers", False)))
+        self.worker_shared = tk.BooleanVar(value=bool(self.settings.get("worker_shared", False)))
+        self.luac_batch = None
+
+        # Resource governor: one row of Tk variables per job type
+        profiles = set_resource_profiles(self.settings.get("resource_profiles"))
+        self.resource_vars = {kind: {'nice': tk.IntVar(value=int(p['nice'])), 'io': tk.StringVar(value=p['io']),
+                                     'cpus': tk.StringVar(value=p['cpus']), 'memory_mb': tk.IntVar(value=int(p['memory_mb']))}
+                              for kind, p in profiles.items()}
 
         # Restore project path from settings
         saved_project = self.settings.get("project_path", "")
         if saved_project and os.path.isdir(saved_project):
             self.project_path.set(saved_project)
 
-        # LUAC decompiler state
-        self.luac_is_running = False
-        self.luac_stats = {'success': 0, 'failed': 0, 'skipped': 0, 'total': 0}
-
-        self._setup_styles()
-        self._setup_ui()
-
         # Restore pack input from settings
         saved_pack_input = self.settings.get("pack_input_path", "")
         if saved_pack_input and os.path.isdir(saved_pack_input):
@@ -112,9 +194,60 @@ class HDKCommander(tk.Tk):
         saved_luac_workers = self.settings.get("luac_workers", 4)
         if saved_luac_workers:
             self.luac_workers_var.set(int(saved_luac_workers))
+        saved_patch_rules = self.settings.get("patch_rules", "")
+        if saved_patch_rules:
+            self.patch_rules_var.set(saved_patch_rules)
+        saved_pipeline_workers = self.settings.get("pipeline_workers", 2)
+        if saved_pipeline_workers:
+            self.pipeline_workers_var.set(int(saved_pipeline_workers))
+        saved_map_workers = self.settings.get("map_workers", 2)
+        if saved_map_workers:
+            self.map_workers_var.set(int(saved_map_workers))
+
+    def _detect_tools(self):
+        """Background thread: resolve binaries (saved settings → manual default → auto-detect), then probe versions."""
+        tools = resolve_tools(self.settings)
+        self.after(0, lambda: self._on_tools_detected(tools['hdk'], tools['resharc'], tools['unluac']))
+
+        health = check_tool_health(tools)
+        self.after(0, lambda: self._on_health_checked(health))
+
+        # Batches interrupted by a crash or a closed window: offer to resume them. Their temp files are only
+        # cleaned up once the user picks resume or discard.
+        jobs = pending_jobs()
+        if jobs:
+            self.after(0, lambda: self._offer_job_recovery(jobs))
+
+    def _offer_job_recovery(self, jobs):
+        answer = messagebox.askyesnocancel("Resume Interrupted Jobs",
+            f"{len(jobs)} batch job(s) did not finish last time:\n  • "
+            + "\n  • ".join(job.describe() for job in jobs) + "\n\n"
+            "Yes: resume them now\nNo: discard them\nCancel: decide next time")
+        if answer is None:
+            return
+        if not answer:
+            removed = sum(job.discard() for job in jobs)
+            self.log(f"Discarded {len(jobs)} interrupted job(s), removed {removed} orphaned temp file(s).", "info")
+            return
 
-        # Save settings on close
-        self.protocol("WM_DELETE_WINDOW", self._on_close)
+        def resume_thread():
+            for job in jobs:
+                try:
+                    result = resume_job(job, log=self.update_console)
+                    tag = "success" if not result['remaining'] else "warning"
+                    self.update_console(f">>> RESUMED {job.kind.upper()} — {result['remaining']} item(s) left <<<", tag)
+                except Exception as e:
+                    self.update_console(f"Could not resume {job.job_id}: {e}", "error")
+
+        threading.Thread(target=resume_thread, daemon=True).start()
+
+    def _on_tools_detected(self, found_hdk, found_resharc, found_unluac):
+        # A path picked with 'Change...' while detection ran wins
+        for var, found in ((self.hdk_path_var, found_hdk), (self.resharc_path_var, found_resharc),
+                           (self.unluac_path_var, found_unluac)):
+            if var.get() == "Searching...":
+                var.set(found if found else "NOT FOUND - Click Change...")
+        self.tools_status_var.set("Probing tool versions...")
 
         # Alerts for missing binaries (only on true first run)
         missing = []
@@ -131,28 +264,47 @@ class HDKCommander(tk.Tk):
                 "Use the 'Change...' buttons at the top to locate them.\n"
                 "You can still use the features for whichever tool IS found.")
 
+    def _on_health_checked(self, health):
+        self.tool_health = health
+        self.tools_status_var.set("   |   ".join(format_health(health)))
+        for key, record in health.items():
+            # Missing tools were already reported by the Setup Required notice
+            if record['error'] and record['error'] != "not found":
+                self.log(f"Health check: {tool_problem(health, key)}", "warning")
+        cached = sum(1 for record in health.values() if record.get('cached'))
+        self.log(f"Tool health checked ({cached} of {len(health)} from cache).", "info")
+
+    def recheck_tools(self, refresh=True):
+        """Re-run the health check for the currently configured paths (off the UI thread)."""
+        tools = {'hdk': self.hdk_path_var.get(), 'resharc': self.resharc_path_var.get(),
+                 'unluac': self.unluac_path_var.get()}
+        tools = {key: path if path and os.path.exists(path) else None for key, path in tools.items()}
+        self.tools_status_var.set("Probing tool versions...")
+
+        def target():
+            health = check_tool_health(tools, refresh=refresh)
+            self.after(0, lambda: self._on_health_checked(health))
+
+        threading.Thread(target=target, daemon=True).start()
+
     # =========================================================================
     # SETTINGS PERSISTENCE
     # =========================================================================
-    def _load_settings(self):
-        """Load saved settings from JSON file."""
-        try:
-            if os.path.exists(SETTINGS_FILE):
-                with open(SETTINGS_FILE, 'r') as f:
-                    data = json.load(f)
-                    if isinstance(data, dict):
-                        return data
-        except Exception:
-            pass
-        return {}
-
     def _save_settings(self):
         """Save current paths to JSON file."""
         hdk = self.hdk_path_var.get()
         resharc = self.resharc_path_var.get()
         unluac = self.unluac_path_var.get()
         project = self.project_path.get()
-        pack_input = self.pack_input_var.get() if hasattr(self, 'pack_input_var') else ""
+        pack_input = self.pack_input_var.get()
+
+        # Closing before detection finished must not forget the saved paths
+        if hdk == "Searching...":
+            hdk = self.settings.get("hdk_path", "")
+        if resharc == "Searching...":
+            resharc = self.settings.get("resharc_path", "")
+        if unluac == "Searching...":
+            unluac = self.settings.get("unluac_path", "")
 
         data = {
             "hdk_path": hdk if "NOT FOUND" not in hdk else "",
@@ -161,75 +313,33 @@ class HDKCommander(tk.Tk):
             "project_path": project if project != "No Folder Selected" else "",
             "pack_input_path": pack_input if pack_input != "No folder selected" else "",
             # LUAC decompiler settings
-            "luac_project_dir": self.luac_project_var.get() if hasattr(self, 'luac_project_var') and self.luac_project_var.get() != "No folder selected" else "",
-            "luac_output_dir": self.luac_output_var.get() if hasattr(self, 'luac_output_var') and self.luac_output_var.get() != "No folder selected" else "",
-            "luac_search_keywords": self.luac_keywords_var.get() if hasattr(self, 'luac_keywords_var') else "save, load, persist",
-            "luac_workers": self.luac_workers_var.get() if hasattr(self, 'luac_workers_var') else 4,
+            "luac_project_dir": self.luac_project_var.get() if self.luac_project_var.get() != "No folder selected" else "",
+            "luac_output_dir": self.luac_output_var.get() if self.luac_output_var.get() != "No folder selected" else "",
+            "luac_search_keywords": self.luac_keywords_var.get(),
+            "luac_workers": self.luac_workers_var.get(),
+            "map_workers": self.map_workers_var.get(),
+            "pipeline_workers": self.pipeline_workers_var.get(),
+            "patch_rules": self.patch_rules_var.get().strip(),
+            "dedup_extracts": self.extract_dedup.get(),
+            "verify_workers": self.verify_workers_var.get(),
+            "dedup_store": self.dedup_store_var.get().strip(),
+            "dedup_mode": "hardlink" if self.dedup_hardlink.get() else "auto",
+            "resource_profiles": self._resource_profile_overrides(),
+            "scratch_dir": self.scratch_dir_var.get().strip(),
+            "scratch_min_mb": self._scratch_min_mb(),
+            "build_workers": self.workers_var.get().strip(),
+            "worker_token": self.worker_token_var.get(),
+            "use_build_workers": self.use_workers.get(),
+            "worker_shared": self.worker_shared.get(),
         }
 
-        try:
-            with open(SETTINGS_FILE, 'w') as f:
-                json.dump(data, f, indent=2)
-        except Exception:
-            pass
+        save_settings(data)
 
     def _on_close(self):
         """Save settings and exit."""
         self._save_settings()
         self.destroy()
 
-    def _resolve_binary_path(self, settings_key, name, manual_default, candidates):
-        """Try: saved setting → manual default → auto-detect."""
-        saved = self.settings.get(settings_key, "")
-        if saved and os.path.exists(saved):
-            return saved
-
-        if manual_default and os.path.exists(manual_default):
-            return manual_default
-
-        if IS_MAC or IS_LINUX:
-            home = os.path.expanduser("~")
-            candidates.append(os.path.join(home, ".cargo", "bin", name))
-
-        return self._find_binary(name, candidates)
-
-    def _resolve_jar_path(self, settings_key, manual_default, candidates):
-        """Try: saved setting → manual default → search nearby."""
-        saved = self.settings.get(settings_key, "")
-        if saved and os.path.exists(saved):
-            return saved
-
-        if manual_default and os.path.exists(manual_default):
-            return manual_default
-
-        for candidate in candidates:
-            if os.path.isabs(candidate) and os.path.exists(candidate):
-                return candidate
-            full = os.path.join(os.getcwd(), candidate)
-            if os.path.exists(full):
-                return full
-            # Also check next to the script itself
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            beside = os.path.join(script_dir, candidate)
-            if os.path.exists(beside):
-                return beside
-
-        return None
-
-    def _find_binary(self, name, search_names):
-        """Search CWD-relative paths, then system PATH."""
-        for candidate in search_names:
-            if os.path.isabs(candidate) and os.path.exists(candidate):
-                return candidate
-            full = os.path.join(os.getcwd(), candidate)
-            if os.path.exists(full):
-                return full
-
-        found = shutil.which(name)
-        if found:
-            return found
-        return None
-
     # =========================================================================
     # STYLES
     # =========================================================================
@@ -271,6 +381,12 @@ class HDKCommander(tk.Tk):
         # Progress bar style
         style.configure("Custom.Horizontal.TProgressbar", troughcolor=bg_medium, background="#007acc")
 
+        # Table style (archive browser and other listings)
+        style.configure("Treeview", background="#101010", fieldbackground="#101010", foreground=text_color,
+                        font=(FONT_MONO, 9), rowheight=20)
+        style.configure("Treeview.Heading", background=bg_medium, foreground="#4db8ff", font=(FONT_MAIN, 9, "bold"))
+        style.map("Treeview", background=[('selected', accent_color)])
+
     # =========================================================================
     # SCROLLABLE TAB HELPER
     # =========================================================================
@@ -348,35 +464,45 @@ class HDKCommander(tk.Tk):
         ttk.Label(r4, textvariable=self.project_path, foreground="#ffd700", font=(FONT_MONO, 10)).pack(side="left", padx=5, fill="x", expand=True)
         ttk.Button(r4, text="Browse Folder...", command=self.select_project, width=15).pack(side="right")
 
+        # Row 5: Tool versions (filled in by the background probe)
+        r5 = ttk.Frame(config_frame)
+        r5.pack(fill="x", pady=3)
+        ttk.Label(r5, text="Tool Versions:", style="SubHeader.TLabel", width=18).pack(side="left")
+        ttk.Label(r5, textvariable=self.tools_status_var, foreground="#888888", font=(FONT_MONO, 9)).pack(side="left", padx=5, fill="x", expand=True)
+        ttk.Button(r5, text="Re-check", command=self.recheck_tools, width=10).pack(side="right")
+
         ttk.Separator(self, orient="horizontal").pack(fill="x", padx=10, pady=5)
 
         # === TABS ===
-        notebook = ttk.Notebook(self)
-        notebook.pack(expand=True, fill="both", padx=10, pady=5)
-
-        tab_extract = ttk.Frame(notebook)
-        notebook.add(tab_extract, text="  EXTRACT  ")
-        self._build_extract_tab(tab_extract)
-
-        tab_create = ttk.Frame(notebook)
-        notebook.add(tab_create, text="  CREATE & PACK  ")
-        self._build_create_tab(tab_create)
-
-        tab_resharc = ttk.Frame(notebook)
-        notebook.add(tab_resharc, text="  RE-SHARC  ")
-        self._build_resharc_tab(tab_resharc)
-
-        tab_luac = ttk.Frame(notebook)
-        notebook.add(tab_luac, text="  LUAC DECOMPILER  ")
-        self._build_luac_tab(tab_luac)
-
-        tab_tools = ttk.Frame(notebook)
-        notebook.add(tab_tools, text="  ADVANCED TOOLS  ")
-        self._build_tools_tab(tab_tools)
-
-        tab_help = ttk.Frame(notebook)
-        notebook.add(tab_help, text="  ENCYCLOPEDIA  ")
-        self._build_help_tab(tab_help)
+        # Only the visible tab is built at startup; the rest are built the
+        # first time they are selected.
+        self.notebook = ttk.Notebook(self)
+        self.notebook.pack(expand=True, fill="both", padx=10, pady=5)
+        self._tab_builders = {}
+
+        for title, builder in (("  EXTRACT  ", self._build_extract_tab),
+                               ("  CREATE & PACK  ", self._build_create_tab),
+                               ("  RE-SHARC  ", self._build_resharc_tab),
+                               ("  LUAC DECOMPILER  ", self._build_luac_tab),
+                               ("  ADVANCED TOOLS  ", self._build_tools_tab),
+                               ("  DASHBOARD  ", self._build_dashboard_tab),
+                               ("  ENCYCLOPEDIA  ", self._build_help_tab)):
+            tab = ttk.Frame(self.notebook)
+            self.notebook.add(tab, text=title)
+            self._tab_builders[str(tab)] = (tab, builder)
+
+        self.notebook.bind("<<NotebookTabChanged>>", lambda e: self._ensure_tab_built(self.notebook.select()))
+        self._ensure_tab_built(self.notebook.select())
+
+        # === JOB PROGRESS ===
+        status_frame = ttk.Frame(self)
+        status_frame.pack(fill="x", padx=10)
+        self.job_progress = ttk.Progressbar(status_frame, mode='determinate', length=220,
+                                            style="Custom.Horizontal.TProgressbar")
+        self.job_progress.pack(side="left")
+        ttk.Label(status_frame, textvariable=self.job_status_var, foreground="#888888",
+                  font=(FONT_MONO, 9)).pack(side="left", padx=10)
+        self.after(500, self._poll_progress)
 
         # === CONSOLE ===
         console_frame = ttk.LabelFrame(self, text=" System Output Log ", padding=5)
@@ -395,6 +521,30 @@ class HDKCommander(tk.Tk):
         if os.path.exists(SETTINGS_FILE):
             self.log("Settings loaded from previous session.", "info")
 
+    def _poll_progress(self):
+        """Refresh the status bar from every running job (polled, so busy jobs never flood the event queue)."""
+        snaps = [progress.snapshot() for progress in active_progress()]
+        if snaps:
+            self.job_progress['value'] = min(s['fraction'] for s in snaps) * 100
+            self.job_status_var.set("   |   ".join(format_progress(s) for s in snaps))
+        elif self.job_status_var.get() != "Idle":
+            self.job_progress['value'] = 0
+            self.job_status_var.set("Idle")
+        self.after(500, self._poll_progress)
+
+    def _ensure_tab_built(self, tab_id):
+        """Build a tab's widgets the first time it is shown."""
+        entry = self._tab_builders.pop(str(tab_id), None)
+        if entry:
+            tab, builder = entry
+            with trace_span(builder.__name__, "ui"):
+                builder(tab)
+
+    def build_all_tabs(self):
+        """Eagerly build every remaining tab (used by the startup benchmark)."""
+        for tab_id in list(self._tab_builders):
+            self._ensure_tab_built(tab_id)
+
     # =========================================================================
     # TAB 1: EXTRACT
     # =========================================================================
@@ -407,6 +557,41 @@ class HDKCommander(tk.Tk):
         btn = ttk.Button(frame, text="SELECT FILE TO EXTRACT", command=self.extract_file_dialog, style="Accent.TButton")
         btn.pack(fill="x", pady=5, ipady=15)
 
+        ttk.Separator(frame, orient="horizontal").pack(fill="x", pady=10)
+
+        ttk.Label(frame, text="Browse Archive Contents", style="SubHeader.TLabel").pack(anchor="w", pady=(5, 5))
+        ttk.Label(frame, text="Reads only the table of contents of a .bar / .sharc and lets you pull out\n"
+                  "single entries (or a glob like 0A1B*) without extracting the whole archive.",
+                  foreground="#888888").pack(anchor="w", pady=(0, 5))
+
+        btn_browse = ttk.Button(frame, text="BROWSE ARCHIVE (TOC ONLY)", command=self.browse_archive_dialog)
+        btn_browse.pack(fill="x", pady=5, ipady=8)
+
+        ttk.Separator(frame, orient="horizontal").pack(fill="x", pady=10)
+
+        ttk.Label(frame, text="Deduplication Store", style="SubHeader.TLabel").pack(anchor="w", pady=(5, 5))
+        ttk.Label(frame, text="Files shared between scenes are kept once and linked as reflinks (Btrfs/XFS). The store\n"
+                  "must be on the same drive as your scenes. Use 'Unshare' before editing hardlinked files.",
+                  foreground="#888888").pack(anchor="w", pady=(0, 5))
+        ttk.Checkbutton(frame, text="Deduplicate after every extraction (also used by One-Click Build)",
+                        variable=self.extract_dedup, command=self._save_settings).pack(anchor="w", pady=(0, 3))
+        ttk.Checkbutton(frame, text="Use read-only hardlinks on drives without reflinks (NTFS, ext4)",
+                        variable=self.dedup_hardlink, command=self._save_settings).pack(anchor="w", pady=(0, 3))
+
+        store_row = ttk.Frame(frame)
+        store_row.pack(fill="x", pady=(0, 3))
+        ttk.Label(store_row, text="Store folder:").pack(side="left")
+        ttk.Entry(store_row, textvariable=self.dedup_store_var, font=(FONT_MONO, 9)).pack(
+            side="left", fill="x", expand=True, padx=5)
+        ttk.Button(store_row, text="Browse...", command=self._browse_dedup_store).pack(side="left")
+
+        dedup_row = ttk.Frame(frame)
+        dedup_row.pack(fill="x", pady=5)
+        ttk.Button(dedup_row, text="Deduplicate Folder...", command=self.dedup_dialog).pack(
+            side="left", fill="x", expand=True, padx=(0, 5))
+        ttk.Button(dedup_row, text="Unshare Folder (make editable)...", command=self.unshare_dialog).pack(
+            side="left", fill="x", expand=True)
+
     def extract_file_dialog(self):
         if not self._check_binary_ready(self.hdk_path_var, "HDK"): return
 
@@ -428,8 +613,165 @@ class HDKCommander(tk.Tk):
             self.log("Error: Unknown file type.", "error")
             return
 
-        cmd = [archive_type, "x", "-i", filepath, "-o", output_path]
-        self.run_hdk_command(cmd)
+        def run(output_path):
+            cmd = [archive_type, "x", "-i", filepath, "-o", output_path]
+            self.run_hdk_command(cmd, on_success=(lambda: self._dedup_folder(output_path))
+                                 if self.extract_dedup.get() else None)
+        self._preflight_then("extract", filepath, output_path, run)
+
+    # --- Deduplication store ---
+    def _dedup_store(self):
+        return self.dedup_store_var.get().strip() or DEDUP_STORE_DIR
+
+    def _browse_dedup_store(self):
+        folder = filedialog.askdirectory(title="Select Dedup Store Folder (on the same drive as your scenes)")
+        if not folder: return
+        self.dedup_store_var.set(folder)
+        self.log(f"Dedup store set to: {folder}", "info")
+        proj = self.project_path.get()
+        if os.path.isdir(proj) and not same_volume(folder, proj):
+            self.log(f"Warning: the store is on a different drive than the project folder ({proj}); "
+                     "files there cannot be linked to it.", "warning")
+        self._save_settings()
+
+    def _dedup_folder(self, folder):
+        """Worker thread: link duplicates in folder to the shared store and log the report."""
+        store = self._dedup_store()
+        self.update_console(f"Deduplicating {folder}...", "info")
+        try:
+            if not same_volume(store, folder):
+                self.update_console(f"Warning: {folder} is on a different drive than the dedup store ({store}); "
+                                    "nothing can be linked. Choose a store folder on that drive.", "warning")
+                return
+            report = dedup_tree(folder, store, "hardlink" if self.dedup_hardlink.get() else "auto",
+                                log=self.update_console)
+        except Exception as e:
+            self.update_console(f"Dedup failed: {e}", "error")
+            return
+        lines = format_dedup_report(report)
+        self.update_console(lines[0], "success")
+        for line in lines[1:]:
+            self.update_console(line)
+
+    def dedup_dialog(self):
+        folder = filedialog.askdirectory(title="Select Folder to Deduplicate")
+        if not folder: return
+        self.log("-" * 60)
+        threading.Thread(target=lambda: self._dedup_folder(folder), daemon=True).start()
+
+    def unshare_dialog(self):
+        folder = filedialog.askdirectory(title="Select Folder to Unshare")
+        if not folder: return
+
+        def unshare_thread():
+            try:
+                count = unshare_tree(folder)
+                self.update_console(f"Unshared {count} linked file(s) in {folder} — safe to edit in place.", "success")
+            except Exception as e:
+                self.update_console(f"Unshare failed: {e}", "error")
+
+        threading.Thread(target=unshare_thread, daemon=True).start()
+
+    # --- Archive browser ---
+    def browse_archive_dialog(self):
+        filepath = filedialog.askopenfilename(filetypes=[
+            ("Archives", "*.bar *.sharc"),
+            ("BAR Archives", "*.bar"),
+            ("SHARC Archives", "*.sharc"),
+            ("All Files", "*.*"),
+        ])
+        if not filepath: return
+
+        try:
+            header, entries = read_archive_toc(filepath)
+        except (ArchiveFormatError, OSError) as e:
+            self.log(f"Archive browser: {e}", "error")
+            messagebox.showerror("Cannot Read TOC",
+                f"{os.path.basename(filepath)}:\n{e}\n\n"
+                "Use 'SELECT FILE TO EXTRACT' for a full extraction instead.")
+            return
+
+        self.log(f"Archive browser: {os.path.basename(filepath)} — {header['num_files']} entries "
+                 f"({header['endian']}-endian, {format_size(header['file_size'])})", "info")
+        self._open_archive_browser(filepath, header, entries)
+
+    def _open_archive_browser(self, filepath, header, entries):
+        win = tk.Toplevel(self)
+        win.title(f"Archive Browser — {os.path.basename(filepath)}")
+        win.geometry("820x560")
+        win.configure(bg="#1e1e1e")
+
+        frame = ttk.Frame(win, padding=10)
+        frame.pack(fill="both", expand=True)
+
+        total_size = sum(e['size'] for e in entries)
+        ttk.Label(frame, text=os.path.basename(filepath), style="Header.TLabel").pack(anchor="w")
+        ttk.Label(frame, text=f"{len(entries)} entries  |  {format_size(total_size)} uncompressed  |  "
+                  f"archive {format_size(header['file_size'])}  |  timestamp {header['timestamp']}",
+                  foreground="#888888").pack(anchor="w", pady=(0, 8))
+
+        # --- Filter row ---
+        filter_row = ttk.Frame(frame)
+        filter_row.pack(fill="x", pady=(0, 5))
+        ttk.Label(filter_row, text="Glob filter:").pack(side="left")
+        glob_var = tk.StringVar(value="*")
+        ttk.Entry(filter_row, textvariable=glob_var, font=(FONT_MONO, 9)).pack(side="left", fill="x", expand=True, padx=5)
+
+        # --- Entry table ---
+        table_frame = ttk.Frame(frame)
+        table_frame.pack(fill="both", expand=True)
+        columns = ("name", "known", "compression", "size", "compressed", "offset")
+        tree = ttk.Treeview(table_frame, columns=columns, show="headings", selectmode="extended")
+        for col, label, width in [("name", "Hashed Name", 100), ("known", "Known Name", 230),
+                                  ("compression", "Compression", 90), ("size", "Size", 90),
+                                  ("compressed", "Stored", 90), ("offset", "Offset", 100)]:
+            tree.heading(col, text=label)
+            tree.column(col, width=width, anchor="w")
+        scroll = ttk.Scrollbar(table_frame, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scroll.set)
+        tree.pack(side="left", fill="both", expand=True)
+        scroll.pack(side="right", fill="y")
+
+        by_iid = {}
+
+        def refresh(*_):
+            tree.delete(*tree.get_children())
+            by_iid.clear()
+            shown = select_archive_entries(entries, glob_var.get() or "*")
+            for entry in shown:
+                iid = tree.insert("", tk.END, values=(
+                    entry['name'], self.name_dict.lookup(entry['name']) or "", entry['compression'], format_size(entry['size']),
+                    format_size(entry['compressed_size']), f"0x{entry['offset']:08X}"))
+                by_iid[iid] = entry
+
+        glob_var.trace_add("write", refresh)
+        refresh()
+
+        def extract(selected):
+            if not selected:
+                messagebox.showinfo("Nothing Selected", "Select entries (or adjust the glob) first.", parent=win)
+                return
+            output_dir = filedialog.askdirectory(title="Extract selected entries to...", parent=win,
+                                                 initialdir=os.path.dirname(filepath))
+            if not output_dir: return
+
+            self.log(f"Archive browser: extracting {len(selected)} of {len(entries)} entries...", "info")
+
+            def extract_thread():
+                try:
+                    written = extract_archive_entries(filepath, selected, output_dir)
+                    self.update_console(f">>> Extracted {len(written)} entries to {output_dir} <<<", "success")
+                except (ArchiveFormatError, OSError) as e:
+                    self.update_console(f"Selective extract failed: {e}", "error")
+
+            threading.Thread(target=extract_thread, daemon=True).start()
+
+        btn_row = ttk.Frame(frame)
+        btn_row.pack(fill="x", pady=(8, 0))
+        ttk.Button(btn_row, text="Extract Selected", style="Accent.TButton",
+                   command=lambda: extract([by_iid[i] for i in tree.selection()])).pack(side="left", fill="x", expand=True, padx=(0, 5))
+        ttk.Button(btn_row, text="Extract All Matching Glob",
+                   command=lambda: extract(list(by_iid.values()))).pack(side="left", fill="x", expand=True)
 
     # =========================================================================
     # TAB 2: CREATE & PACK
@@ -445,7 +787,6 @@ class HDKCommander(tk.Tk):
         input_row = ttk.Frame(frame)
         input_row.pack(fill="x", pady=(0, 10))
 
-        self.pack_input_var = tk.StringVar(value="No folder selected")
         ttk.Label(input_row, textvariable=self.pack_input_var, foreground="#ffd700", font=(FONT_MONO, 9)).pack(side="left", fill="x", expand=True)
         ttk.Button(input_row, text="Browse...", command=self._browse_pack_input, width=10).pack(side="right")
 
@@ -454,17 +795,28 @@ class HDKCommander(tk.Tk):
         # --- Options ---
         ttk.Label(frame, text="2. Options:", style="SubHeader.TLabel").pack(anchor="w", pady=(5, 5))
 
-        self.auto_compress = tk.BooleanVar(value=False)
         chk_comp = ttk.Checkbutton(frame, text="Auto-Optimize: Compress assets before packing (slower build)", variable=self.auto_compress)
         chk_comp.pack(anchor="w", pady=(0, 5))
 
-        self.compress_algo = tk.StringVar(value="lzma")
         algo_frame = ttk.Frame(frame)
-        algo_frame.pack(anchor="w", pady=(0, 10))
+        algo_frame.pack(anchor="w", pady=(0, 5))
         ttk.Label(algo_frame, text="  Algorithm: ").pack(side="left")
         ttk.Radiobutton(algo_frame, text="LZMA (default, better ratio)", variable=self.compress_algo, value="lzma").pack(side="left", padx=5)
         ttk.Radiobutton(algo_frame, text="ZLib (faster)", variable=self.compress_algo, value="zlib").pack(side="left", padx=5)
 
+        minify_row = ttk.Frame(frame)
+        minify_row.pack(fill="x", pady=(0, 5))
+        ttk.Checkbutton(minify_row, text="Minify XML (comments / whitespace, in a staging copy)",
+                        variable=self.minify_xml).pack(side="left")
+        ttk.Checkbutton(minify_row, text="Lua source too", variable=self.minify_lua).pack(side="left", padx=10)
+
+        prune_row = ttk.Frame(frame)
+        prune_row.pack(fill="x", pady=(0, 10))
+        ttk.Checkbutton(prune_row, text="Leave out assets nothing in the scene references",
+                        variable=self.prune_unused).pack(side="left")
+        ttk.Button(prune_row, text="Find Unused Assets", command=self.unused_assets_dialog).pack(side="right")
+        ttk.Button(prune_row, text="Size Profile", command=self.size_profile_dialog).pack(side="right", padx=5)
+
         ttk.Separator(frame, orient="horizontal").pack(fill="x", pady=5)
 
         # --- Pack Buttons ---
@@ -483,6 +835,61 @@ class HDKCommander(tk.Tk):
         btn_pkg = ttk.Button(frame, text="Pack Folder → .PKG (Installable Package)", command=lambda: self.pack_dialog("pkg"))
         btn_pkg.pack(fill="x", pady=5, ipady=5)
 
+        multi_row = ttk.Frame(frame)
+        multi_row.pack(fill="x", pady=(5, 0))
+        ttk.Label(multi_row, text="Several formats at once:").pack(side="left")
+        for fmt, var in self.multi_formats.items():
+            ttk.Checkbutton(multi_row, text=f".{fmt.upper()}", variable=var).pack(side="left", padx=5)
+        ttk.Button(multi_row, text="Pack Selected Formats...", command=self.multi_pack_dialog).pack(
+            side="right", fill="x", expand=True, padx=(10, 0))
+        self.multi_packer = None
+
+        ttk.Separator(frame, orient="horizontal").pack(fill="x", pady=10)
+
+        # --- Watch mode ---
+        ttk.Label(frame, text="Watch Mode (auto-rebuild on save)", style="SubHeader.TLabel").pack(anchor="w", pady=(5, 5))
+        ttk.Label(frame, text="Repacks the folder above a moment after you save a file in it. With Auto-Optimize,\n"
+                  "only the changed files are recompressed (into a cached copy — your folder stays editable).",
+                  foreground="#888888").pack(anchor="w", pady=(0, 5))
+
+        watch_row = ttk.Frame(frame)
+        watch_row.pack(fill="x", pady=(0, 5))
+        ttk.Label(watch_row, text="Format:").pack(side="left")
+        ttk.Combobox(watch_row, textvariable=self.watch_format_var, width=8, state="readonly",
+                     values=["sdat", "bar", "sharc", "pkg"]).pack(side="left", padx=5)
+        ttk.Label(watch_row, textvariable=self.watch_status_var, foreground="#ffd700").pack(side="left", padx=10)
+
+        self.watch_btn = ttk.Button(frame, text="START WATCHING", command=self.watch_start, style="Accent.TButton")
+        self.watch_btn.pack(fill="x", pady=5, ipady=5)
+        ttk.Button(frame, text="STOP WATCHING", command=self.watch_stop,
+                   style="Danger.TButton").pack(fill="x", pady=(0, 5))
+        self.watcher = None
+
+        ttk.Separator(frame, orient="horizontal").pack(fill="x", pady=10)
+
+        # --- One-click offline build ---
+        ttk.Label(frame, text="One-Click Offline Build (many scenes)", style="SubHeader.TLabel").pack(anchor="w", pady=(5, 5))
+        ttk.Label(frame, text="Extract → Map → Offline Patch → Compress → Pack .sdat for every selected archive.\n"
+                  "Uses the Map, Offline Patch and Auto-Optimize options above; unchanged stages are reused from cache.",
+                  foreground="#888888").pack(anchor="w", pady=(0, 5))
+
+        pipe_row = ttk.Frame(frame)
+        pipe_row.pack(fill="x", pady=(0, 5))
+        ttk.Label(pipe_row, text="Scenes in parallel:").pack(side="left")
+        ttk.Scale(pipe_row, from_=1, to=8, variable=self.pipeline_workers_var,
+                  orient=tk.HORIZONTAL, length=150).pack(side="left", padx=10)
+        pipe_workers_label = ttk.Label(pipe_row, text=str(self.pipeline_workers_var.get()))
+        pipe_workers_label.pack(side="left")
+        self.pipeline_workers_var.trace_add("write", lambda *_: pipe_workers_label.config(
+            text=str(self.pipeline_workers_var.get())))
+
+        self.pipeline_btn = ttk.Button(frame, text="SELECT SCENES & BUILD OFFLINE .SDATs",
+                                       command=self.pipeline_dialog, style="Accent.TButton")
+        self.pipeline_btn.pack(fill="x", pady=5, ipady=8)
+        ttk.Button(frame, text="STOP BUILD (after current stages)", command=self.pipeline_stop,
+                   style="Danger.TButton").pack(fill="x", pady=(0, 5))
+        self.pipeline = None
+
     def _browse_pack_input(self):
         initial_dir = None
         proj = self.project_path.get()
@@ -503,11 +910,7 @@ class HDKCommander(tk.Tk):
             messagebox.showerror("Error", "Please select a folder to pack using the 'Browse...' button in the Create & Pack tab.")
             return
 
-        base_name = os.path.basename(input_dir)
-        if base_name.endswith("_extracted"):
-            base_name = base_name.replace("_extracted", "")
-        base_name, _ = os.path.splitext(base_name)
-        clean_default_name = f"{base_name}.{format_type}"
+        clean_default_name = clean_output_name(input_dir, format_type)
 
         initial_dir = None
         proj = self.project_path.get()
@@ -524,44 +927,337 @@ class HDKCommander(tk.Tk):
         )
         if not output_file: return
 
-        if self.auto_compress.get():
-            self._batch_compress(input_dir)
+        def run(output_file, source=input_dir, cleanup=None):
+            """cleanup (removing a private staging copy) runs once the pack has finished or failed."""
+            cmd = [format_type, "c", "-i", source, "-o", output_file]
+            if self.auto_compress.get():
+                self._batch_compress(source, then=lambda: self.run_hdk_command(cmd, on_done=cleanup), on_error=cleanup)
+            else:
+                self.run_hdk_command(cmd, on_done=cleanup)
+
+        prune, minify, lua = self.prune_unused.get(), self.minify_xml.get() or self.minify_lua.get(), self.minify_lua.get()
+
+        def stage_then_run(output_file):
+            """Pruning and minifying build a staging copy off the UI thread; the pack runs from it."""
+            def stage_thread():
+                source, cleanup = input_dir, None
+                try:
+                    if prune:
+                        report = self._analyze_assets(input_dir)
+                        source = stage_used_assets(input_dir, report)
+                        cleanup = lambda stage=source: shutil.rmtree(stage, ignore_errors=True)
+                        self.update_console(f"Leaving out {len(report['unused'])} unreferenced file(s) "
+                                            f"({format_size(report['unused_bytes'])}).", "info")
+                    if minify:
+                        self.update_console("Minifying XML" + (" and Lua" if lua else "") + "...", "info")
+                        if source == input_dir:
+                            source, report = stage_minified(input_dir, lua=lua)
+                            cleanup = lambda stage=source: shutil.rmtree(stage, ignore_errors=True)
+                        else:
+                            report = minify_tree(source, lua=lua)
+                        lines = format_minify_report(report)
+                        self.update_console(lines[0], "success")
+                        for line in lines[1:]:
+                            self.update_console(line)
+                except (OSError, ValueError) as e:
+                    self.update_console(f"Pack cancelled: {e}", "error")
+                    if cleanup:
+                        cleanup()
+                    return
+                self.after(0, lambda: run(output_file, source, cleanup))
+            threading.Thread(target=stage_thread, daemon=True).start()
+
+        self._preflight_then("pack", input_dir, output_file, stage_then_run if prune or minify else run)
+
+    def multi_pack_dialog(self):
+        if not self._check_binary_ready(self.hdk_path_var, "HDK"): return
+        if self.multi_packer is not None:
+            messagebox.showwarning("Busy", "A multi-format pack is already running.")
+            return
+        input_dir = self.pack_input_var.get()
+        if not os.path.isdir(input_dir):
+            messagebox.showerror("Error", "Please select a folder to pack using the 'Browse...' button in the Create & Pack tab.")
+            return
+        formats = [fmt for fmt, var in self.multi_formats.items() if var.get()]
+        if not formats:
+            messagebox.showinfo("No Formats", "Tick at least one format to pack.")
+            return
+        proj = self.project_path.get()
+        output_dir = filedialog.askdirectory(title="Select Output Folder",
+                                             initialdir=proj if os.path.isdir(proj) else os.path.dirname(input_dir))
+        if not output_dir: return
+
+        lua_dir = self.luac_output_var.get()
+        settings = {'scratch_dir': self.scratch_dir_var.get().strip(), 'scratch_min_mb': self._scratch_min_mb()}
+        packer = self.multi_packer = MultiPack(self.hdk_path_var.get(), input_dir, output_dir, formats,
+                                               compress=self.auto_compress.get(), algo=self.compress_algo.get(),
+                                               prune=self.prune_unused.get(),
+                                               lua_dirs=[lua_dir] if os.path.isdir(lua_dir) else [],
+                                               minify=self.minify_xml.get(), minify_lua=self.minify_lua.get(),
+                                               settings=settings, log=self.update_console)
+        self.log("=" * 60, "info")
+        self.log(f"MULTI-FORMAT PACK: {', '.join(os.path.basename(packer.output_path(f)) for f in formats)} "
+                 f"→ {output_dir}", "info")
+
+        def pack_thread():
+            try:
+                results = packer.run()
+            except (OSError, ValueError) as e:
+                self.update_console(f"Multi-format pack failed: {e}", "error")
+                return
+            finally:
+                self.multi_packer = None
+            if all(r['ok'] for r in results.values()):
+                self.update_console(f"\n>>> SUCCESS: {len(results)} archive(s) built <<<", "success")
+            else:
+                self.update_console(f"\n!!! {sum(not r['ok'] for r in results.values())} of {len(results)} "
+                                    "format(s) FAILED !!!", "error")
+        threading.Thread(target=pack_thread, daemon=True).start()
+
+    def _analyze_assets(self, folder):
+        """Worker thread: asset graph of a pack folder, using the LUAC tab's output folder for decompiled scripts."""
+        lua_dir = self.luac_output_var.get()
+        lua_dirs = [lua_dir] if os.path.isdir(lua_dir) else []
+        self.update_console(f"Building asset reference graph for {folder}...", "info")
+        return analyze_assets(folder, lua_dirs)
+
+    def size_profile_dialog(self):
+        input_dir = self.pack_input_var.get()
+        folder = filedialog.askdirectory(title="Select Extracted or Pack Folder to Profile",
+                                         initialdir=input_dir if os.path.isdir(input_dir) else None)
+        if not folder: return
+        self.log("-" * 60)
+        self.log(f"Profiling asset sizes in {folder}...", "info")
+
+        def profile_thread():
+            try:
+                profile = profile_assets(folder)
+            except OSError as e:
+                self.update_console(f"Size profile failed: {e}", "error")
+                return
+            self.update_console(f"Profiled {profile['files']} files ({format_size(profile['total_bytes'])}).", "success")
+            self.after(0, lambda: self._open_size_profile(profile))
+        threading.Thread(target=profile_thread, daemon=True).start()
+
+    def _open_size_profile(self, profile):
+        win = tk.Toplevel(self)
+        win.title(f"Size Profile — {os.path.basename(profile['root'])}")
+        win.geometry("860x560")
+        win.configure(bg="#1e1e1e")
+
+        frame = ttk.Frame(win, padding=10)
+        frame.pack(fill="both", expand=True)
+        ttk.Label(frame, text=os.path.basename(profile['root']), style="Header.TLabel").pack(anchor="w")
+        ttk.Label(frame, text=f"{profile['files']} files  |  {format_size(profile['total_bytes'])}  |  "
+                  f"{len(profile['textures'])} DDS textures  |  zlib estimate is sampled and only ranks types. "
+                  "Click a column to sort.", foreground="#888888").pack(anchor="w", pady=(0, 8))
+
+        notebook = ttk.Notebook(frame)
+        notebook.pack(fill="both", expand=True)
+
+        def table(title, columns, rows):
+            """Treeview of rows (tuples of raw values); `columns` is (key, label, width, formatter)."""
+            tab = ttk.Frame(notebook)
+            notebook.add(tab, text=title)
+            tree = ttk.Treeview(tab, columns=[c[0] for c in columns], show="headings", selectmode="browse")
+            scroll = ttk.Scrollbar(tab, orient="vertical", command=tree.yview)
+            tree.configure(yscrollcommand=scroll.set)
+            tree.pack(side="left", fill="both", expand=True)
+            scroll.pack(side="right", fill="y")
+            order = {'col': None, 'reverse': False}
+
+            def fill(sort_index=None):
+                if sort_index is not None:
+                    order['reverse'] = not order['reverse'] if order['col'] == sort_index else sort_index > 0
+                    order['col'] = sort_index
+                    rows.sort(key=lambda r: (r[sort_index] is None, r[sort_index]), reverse=order['reverse'])
+                tree.delete(*tree.get_children())
+                for row in rows:
+                    tree.insert("", tk.END, values=[fmt(v) if v is not None else "—"
+                                                    for v, (_, _, _, fmt) in zip(row, columns)])
+            for i, (key, label, width, _) in enumerate(columns):
+                tree.heading(key, text=label, command=lambda i=i: fill(i))
+                tree.column(key, width=width, anchor="w")
+            fill()
+
+        text = str
+        size = format_size
+        table("By Type", [("type", "Type", 90, text), ("files", "Files", 60, text), ("bytes", "Size", 90, size),
+                          ("share", "Share", 70, lambda v: f"{v * 100:.1f}%"),
+                          ("ratio", "zlib Est.", 70, lambda v: f"{v:.2f}"), ("est", "Est. Packed", 90, size),
+                          ("largest", "Largest File", 340, text)],
+              [(r['type'], r['files'], r['bytes'], r['share'], r['est_ratio'], r['est_bytes'],
+                f"{r['largest']['path']} ({format_size(r['largest']['size'])})") for r in profile['types']])
+        table("Textures", [("path", "Texture", 340, text), ("size", "Size", 90, size), ("width", "Width", 60, text),
+                           ("height", "Height", 60, text), ("format", "Format", 90, text), ("mips", "Mips", 50, text)],
+              [(t['path'], t['size'], t['width'], t['height'], t['format'], t['mips']) for t in profile['textures']])
+        table("Largest Files", [("type", "Type", 70, text), ("path", "File", 520, text), ("size", "Size", 100, size)],
+              [(ext, f['path'], f['size']) for ext, files in profile['largest'].items() for f in files])
+
+        def export():
+            path = filedialog.asksaveasfilename(title="Export Size Profile", defaultextension=".json", parent=win,
+                                                initialfile=f"{os.path.basename(profile['root'])}_sizes.json",
+                                                filetypes=[("JSON", "*.json")])
+            if not path: return
+            try:
+                save_asset_profile(profile, path)
+                self.log(f"Size profile saved to {path}", "success")
+            except OSError as e:
+                messagebox.showerror("Export Failed", str(e), parent=win)
 
-        cmd = [format_type, "c", "-i", input_dir, "-o", output_file]
-        self.run_hdk_command(cmd)
+        ttk.Button(frame, text="Export JSON...", command=export).pack(fill="x", pady=(8, 0))
 
-    def _batch_compress(self, directory):
+    def unused_assets_dialog(self):
+        input_dir = self.pack_input_var.get()
+        if not os.path.isdir(input_dir):
+            messagebox.showerror("Error", "Please select a folder to pack using the 'Browse...' button first.")
+            return
+        self.log("-" * 60)
+
+        def analyze_thread():
+            try:
+                report = self._analyze_assets(input_dir)
+            except OSError as e:
+                self.update_console(f"Asset analysis failed: {e}", "error")
+                return
+            lines = format_asset_report(report, limit=50)
+            self.update_console(lines[0], "success" if not report['unreadable'] else "warning")
+            for line in lines[1:]:
+                self.update_console(line)
+        threading.Thread(target=analyze_thread, daemon=True).start()
+
+    def _batch_compress(self, directory, then=None, on_error=None):
+        """Compress off the UI thread (progress shows in the status bar), then run `then` on the UI thread
+        (or on_error in the worker thread if compression failed)."""
         hdk_path = self.hdk_path_var.get()
         algo = self.compress_algo.get()
         self.log("=" * 60, "info")
         self.log(f"AUTO-OPTIMIZE: Compressing assets with {algo.upper()} before packing...", "info")
 
-        extensions = ['.bar', '.havok', '.hkx', '.dds', '.xml']
-        count = 0
+        def compress_thread():
+            try:
+                batch = self._distributed_batch("compress", find_compressible(directory), {'args': {'algo': algo}},
+                                                {'hdk': hdk_path})
+                if batch:
+                    count = sum(1 for error in batch.run().values() if not error)
+                else:
+                    count = batch_compress(hdk_path, directory, algo)
+                self.update_console(f"Optimization Complete. Compressed {count} files.", "success")
+                if then:
+                    self.after(0, then)
+            except Exception as e:
+                self.update_console(f"CRITICAL: {e}", "error")
+                if on_error:
+                    on_error()
 
-        for root, dirs, files in os.walk(directory):
-            for file in files:
-                has_known_ext = any(file.lower().endswith(ext) for ext in extensions)
-                has_no_ext = "." not in file
+        threading.Thread(target=compress_thread, daemon=True).start()
 
-                if has_known_ext or has_no_ext:
-                    full_path = os.path.join(root, file)
-                    temp_path = full_path + ".tmp"
+    def watch_start(self):
+        if not self._check_binary_ready(self.hdk_path_var, "HDK"): return
+        if self.watcher is not None:
+            messagebox.showwarning("Busy", "Already watching a folder. Stop it first.")
+            return
+        input_dir = self.pack_input_var.get()
+        if input_dir == "No folder selected" or not os.path.isdir(input_dir):
+            messagebox.showerror("Error", "Please select a folder to pack using the 'Browse...' button in the Create & Pack tab.")
+            return
 
-                    try:
-                        startupinfo = self._get_startupinfo()
-                        subprocess.run(
-                            [hdk_path, "compress", "c", "-a", algo, "-i", full_path, "-o", temp_path],
-                            check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
-                            startupinfo=startupinfo
-                        )
-                        shutil.move(temp_path, full_path)
-                        count += 1
-                    except Exception:
-                        if os.path.exists(temp_path):
-                            os.remove(temp_path)
-
-        self.log(f"Optimization Complete. Compressed {count} files.", "success")
+        format_type = self.watch_format_var.get()
+        output_file = filedialog.asksaveasfilename(
+            defaultextension=f".{format_type}",
+            filetypes=[(f"{format_type.upper()} File", f"*.{format_type}")],
+            initialfile=clean_output_name(input_dir, format_type),
+            initialdir=os.path.dirname(input_dir)
+        )
+        if not output_file: return
+
+        def on_build(result):
+            stamp = time.strftime("%H:%M:%S")
+            status = f"Last build {stamp} ({result['seconds']}s)" if result['ok'] else f"Build FAILED at {stamp}"
+            self.after(0, lambda: self.watch_status_var.set(status))
+
+        self.log("=" * 60, "info")
+        self.log(f"WATCH MODE: {input_dir} → {output_file}", "info")
+        self.watcher = FolderWatcher(self.hdk_path_var.get(), input_dir, output_file, format_type,
+                                     compress=self.auto_compress.get(), algo=self.compress_algo.get(),
+                                     log=self.update_console, on_build=on_build)
+        self.watch_btn.config(state='disabled')
+        self.watch_status_var.set("Building...")
+
+        def watch_thread():
+            try:
+                builds = self.watcher.run()
+                self.update_console(f">>> WATCH MODE STOPPED after {builds} build(s) <<<", "info")
+            except Exception as e:
+                self.update_console(f"CRITICAL: {e}", "error")
+            finally:
+                self.watcher = None
+                self.after(0, lambda: (self.watch_btn.config(state='normal'), self.watch_status_var.set("Not watching")))
+
+        threading.Thread(target=watch_thread, daemon=True).start()
+
+    def watch_stop(self):
+        if self.watcher is not None:
+            self.watcher.stop_requested = True
+        else:
+            self.log("Not watching any folder.", "info")
+
+    def pipeline_dialog(self):
+        if not self._check_binary_ready(self.hdk_path_var, "HDK"): return
+        if self.pipeline is not None:
+            messagebox.showwarning("Busy", "A build is already running.")
+            return
+
+        inputs = filedialog.askopenfilenames(title="Select Scenes to Build", filetypes=[
+            ("All Home Files", "*.sdat *.bar *.sharc *.pkg"),
+            ("SDAT Files", "*.sdat"),
+        ])
+        if not inputs: return
+        output_dir = filedialog.askdirectory(title="Select Output Folder for Rebuilt Archives",
+                                             initialdir=os.path.dirname(inputs[0]))
+        if not output_dir: return
+
+        options = {
+            'format': "sdat",
+            'algo': self.compress_algo.get(),
+            'compress': self.auto_compress.get(),
+            'full_map': self.map_full_scan.get(),
+            'patch_rules': self.patch_rules_var.get().strip(),
+            'dedup': self.extract_dedup.get(),
+            'dedup_store': self._dedup_store(),
+            'dedup_mode': "hardlink" if self.dedup_hardlink.get() else "auto",
+            'minify': self.minify_xml.get() or self.minify_lua.get(),
+            'minify_lua': self.minify_lua.get(),
+        }
+        workers = max(1, int(self.pipeline_workers_var.get()))
+        self._save_settings()
+
+        self.log("=" * 60, "info")
+        self.log(f"OFFLINE BUILD: {len(inputs)} scene(s), {workers} in parallel → {output_dir}", "info")
+        self.pipeline = ScenePipeline(self.hdk_path_var.get(), inputs, output_dir, options, self.name_dict,
+                                      log=self.update_console, workers=workers)
+        self.pipeline_btn.config(state='disabled')
+
+        def pipeline_thread():
+            try:
+                results = self.pipeline.run()
+                ok = sum(1 for r in results.values() if r)
+                tag = "success" if ok == len(results) else "warning"
+                self.update_console(f"\n>>> OFFLINE BUILD COMPLETE — {ok}/{len(results)} scene(s) built <<<", tag)
+            except Exception as e:
+                self.update_console(f"CRITICAL: {e}", "error")
+            finally:
+                self.pipeline = None
+                self.after(0, lambda: self.pipeline_btn.config(state='normal'))
+
+        threading.Thread(target=pipeline_thread, daemon=True).start()
+
+    def pipeline_stop(self):
+        if self.pipeline is not None:
+            self.pipeline.stop_requested = True
+            self.log("Stopping build after the running stages finish...", "warning")
+        else:
+            self.log("No build in progress.", "info")
 
     # =========================================================================
     # TAB 3: RE-SHARC
@@ -625,8 +1321,7 @@ class HDKCommander(tk.Tk):
         folder = filedialog.askdirectory(title="Select Folder to Scan for .sdat Files")
         if not folder: return
 
-        sdat_files = [os.path.join(folder, f) for f in os.listdir(folder)
-                      if f.lower().endswith(".sdat") and ".normalized." not in f.lower()]
+        sdat_files = find_sdat_files(folder)
 
         if not sdat_files:
             messagebox.showinfo("No Files Found", f"No .sdat files found in:\n{folder}")
@@ -640,39 +1335,25 @@ class HDKCommander(tk.Tk):
 
     def _run_resharc(self, file_list):
         resharc_path = self.resharc_path_var.get()
-        full_cmd = [resharc_path] + file_list
 
         self.log(f"COMMAND: {os.path.basename(resharc_path)} {' '.join(os.path.basename(f) for f in file_list)}")
 
         def target():
             try:
-                startupinfo = self._get_startupinfo()
-                process = subprocess.Popen(
-                    full_cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=False,
-                    startupinfo=startupinfo
-                )
-                stdout, stderr = process.communicate()
-                out_str = stdout.decode('utf-8', errors='ignore')
-                err_str = stderr.decode('utf-8', errors='ignore')
+                returncode, out_str, err_str, outputs = run_resharc(resharc_path, file_list)
 
                 if out_str.strip(): self.update_console(out_str)
                 if err_str.strip(): self.update_console("LOG: " + err_str)
 
-                if process.returncode == 0:
+                if returncode == 0:
                     self.update_console("\n>>> RE-SHARC COMPLETE <<<", "success")
-                    for f in file_list:
-                        base = os.path.splitext(f)[0]
-                        norm_sdat = base + ".normalized.sdat"
-                        norm_txt = base + ".normalized.txt"
-                        if os.path.exists(norm_sdat):
-                            self.update_console(f"  Output: {norm_sdat}", "success")
-                        if os.path.exists(norm_txt):
-                            self.update_console(f"  Timestamp: {norm_txt}", "info")
+                    for output in outputs:
+                        if output['sdat']:
+                            self.update_console(f"  Output: {output['sdat']}", "success")
+                        if output['timestamp']:
+                            self.update_console(f"  Timestamp: {output['timestamp']}", "info")
                 else:
-                    self.update_console(f"\n!!! RE-SHARC FAILED (Code {process.returncode}) !!!", "error")
+                    self.update_console(f"\n!!! RE-SHARC FAILED (Code {returncode}) !!!", "error")
 
             except FileNotFoundError:
                 self.update_console("CRITICAL: hdk-resharc executable not found!", "error")
@@ -701,7 +1382,6 @@ class HDKCommander(tk.Tk):
         proj_row = ttk.Frame(frame)
         proj_row.pack(fill="x", pady=3)
         ttk.Label(proj_row, text="LUAC Source Folder:", width=20).pack(side="left")
-        self.luac_project_var = tk.StringVar(value="No folder selected")
         ttk.Label(proj_row, textvariable=self.luac_project_var, foreground="#ffd700", font=(FONT_MONO, 9)).pack(side="left", fill="x", expand=True, padx=5)
         ttk.Button(proj_row, text="Browse...", command=self._browse_luac_project, width=10).pack(side="right")
 
@@ -709,7 +1389,6 @@ class HDKCommander(tk.Tk):
         out_row = ttk.Frame(frame)
         out_row.pack(fill="x", pady=3)
         ttk.Label(out_row, text="Decompiled Output:", width=20).pack(side="left")
-        self.luac_output_var = tk.StringVar(value="No folder selected")
         ttk.Label(out_row, textvariable=self.luac_output_var, foreground="#ffd700", font=(FONT_MONO, 9)).pack(side="left", fill="x", expand=True, padx=5)
         ttk.Button(out_row, text="Browse...", command=self._browse_luac_output, width=10).pack(side="right")
 
@@ -717,10 +1396,9 @@ class HDKCommander(tk.Tk):
         worker_row = ttk.Frame(frame)
         worker_row.pack(fill="x", pady=(5, 5))
         ttk.Label(worker_row, text="Parallel Workers:").pack(side="left")
-        self.luac_workers_var = tk.IntVar(value=4)
         ttk.Scale(worker_row, from_=1, to=16, variable=self.luac_workers_var,
                   orient=tk.HORIZONTAL, length=200).pack(side="left", padx=10)
-        self.luac_workers_label = ttk.Label(worker_row, text="4")
+        self.luac_workers_label = ttk.Label(worker_row, text=str(self.luac_workers_var.get()))
         self.luac_workers_label.pack(side="left")
         self.luac_workers_var.trace_add("write", lambda *_: self.luac_workers_label.config(
             text=str(self.luac_workers_var.get())))
@@ -742,6 +1420,11 @@ class HDKCommander(tk.Tk):
                                         command=self.luac_stop, style="Danger.TButton")
         self.luac_stop_btn.pack(fill="x", pady=5, ipady=5)
 
+        tree_row = ttk.Frame(frame)
+        tree_row.pack(fill="x", pady=(5, 0))
+        ttk.Checkbutton(tree_row, text="Include file sizes", variable=self.luac_tree_sizes).pack(side="left")
+        ttk.Checkbutton(tree_row, text="Include SHA-1 hashes (slower)", variable=self.luac_tree_hashes).pack(side="left", padx=15)
+
         btn_tree = ttk.Button(frame, text="EXPORT DIRECTORY TREE (.txt + .json)",
                               command=self.luac_export_tree)
         btn_tree.pack(fill="x", pady=5, ipady=5)
@@ -763,14 +1446,12 @@ class HDKCommander(tk.Tk):
         kw_row = ttk.Frame(frame)
         kw_row.pack(fill="x", pady=3)
         ttk.Label(kw_row, text="Keywords (comma-separated):").pack(side="left")
-        self.luac_keywords_var = tk.StringVar(value="save, load, persist")
         kw_entry = ttk.Entry(kw_row, textvariable=self.luac_keywords_var, font=(FONT_MONO, 9))
         kw_entry.pack(side="left", fill="x", expand=True, padx=5)
 
         loc_row = ttk.Frame(frame)
         loc_row.pack(fill="x", pady=3)
         ttk.Label(loc_row, text="Search in:").pack(side="left")
-        self.luac_search_location = tk.StringVar(value="Output")
         ttk.Radiobutton(loc_row, text="Source Folder (raw .luac)", variable=self.luac_search_location, value="Project").pack(side="left", padx=10)
         ttk.Radiobutton(loc_row, text="Output Folder (decompiled .lua)", variable=self.luac_search_location, value="Output").pack(side="left", padx=10)
 
@@ -808,7 +1489,7 @@ class HDKCommander(tk.Tk):
 
         def scan_thread():
             try:
-                luac_files = list(Path(project_dir).rglob('*.luac'))
+                luac_files = find_luac_files(project_dir)
                 self.luac_stats = {'success': 0, 'failed': 0, 'skipped': 0, 'total': len(luac_files)}
                 self._update_luac_stats()
                 self.update_console(f"Found {len(luac_files)} .luac files.", "success")
@@ -839,6 +1520,11 @@ class HDKCommander(tk.Tk):
         if not unluac or "NOT FOUND" in unluac or not os.path.exists(unluac):
             messagebox.showerror("Error", "Unluac JAR not found!\n\nPlease set the path using 'Change...' at the top of the window.")
             return
+        problems = [p for p in (tool_problem(self.tool_health, 'java'), tool_problem(self.tool_health, 'unluac'))
+                    if p] if self.tool_health else []
+        if problems and not messagebox.askyesno("Tool Health Check",
+                "\n".join(problems) + "\n\nDecompilation will probably fail. Run anyway?"):
+            return
 
         if self.luac_is_running:
             messagebox.showwarning("Busy", "Decompilation already in progress.")
@@ -849,59 +1535,24 @@ class HDKCommander(tk.Tk):
         self.log("=" * 60, "info")
         self.log("Starting LUAC decompilation...", "info")
 
-        def decompile_thread():
-            try:
-                project_path = Path(project_dir)
-                output_path = Path(output_dir)
-                luac_files = list(project_path.rglob('*.luac'))
-
-                self.luac_stats = {'success': 0, 'failed': 0, 'skipped': 0, 'total': len(luac_files)}
-                self._update_luac_stats()
-
-                for luac_file in luac_files:
-                    if not self.luac_is_running:
-                        break
+        workers = max(1, int(self.luac_workers_var.get()))
 
-                    relative = luac_file.relative_to(project_path)
-                    lua_out = output_path / relative.with_suffix('.lua')
-                    lua_out.parent.mkdir(parents=True, exist_ok=True)
+        def on_progress(stats):
+            self.luac_stats = stats
+            self.after(0, self._update_luac_stats)
 
-                    if lua_out.exists():
-                        self.luac_stats['skipped'] += 1
-                        self.update_console(f"  Skipped (exists): {relative}")
-                    else:
-                        try:
-                            startupinfo = self._get_startupinfo()
-                            result = subprocess.run(
-                                ['java', '-jar', unluac, str(luac_file)],
-                                capture_output=True, text=True, encoding='utf-8', errors='ignore',
-                                check=True, startupinfo=startupinfo
-                            )
-                            with open(lua_out, 'w', encoding='utf-8') as f:
-                                f.write(result.stdout)
-                            self.luac_stats['success'] += 1
-                            self.update_console(f"  Decompiled: {relative}", "success")
-                        except FileNotFoundError:
-                            self.update_console("CRITICAL: 'java' not found. Is Java installed and in PATH?", "error")
-                            self.luac_is_running = False
-                            break
-                        except subprocess.CalledProcessError as e:
-                            self.luac_stats['failed'] += 1
-                            err_msg = e.stderr.strip() if e.stderr else "Unknown error"
-                            self.update_console(f"  Failed: {relative} — {err_msg}", "error")
-                        except Exception as e:
-                            self.luac_stats['failed'] += 1
-                            self.update_console(f"  Error: {relative} — {e}", "error")
-
-                    self.after(0, self._update_luac_stats)
-
-                if self.luac_is_running:
-                    s = self.luac_stats
+        def decompile_thread():
+            try:
+                s = self._decompile_distributed(unluac, project_dir, output_dir, on_progress)
+                if s is None:
+                    s = decompile_luac(unluac, project_dir, output_dir, workers, log=self.update_console,
+                                       should_stop=lambda: not self.luac_is_running, on_progress=on_progress)
+                if not s['stopped']:
                     self.update_console(
                         f"\n>>> DECOMPILATION COMPLETE — "
                         f"{s['success']} OK / {s['failed']} Failed / {s['skipped']} Skipped <<<", "success")
                 else:
-                    self.update_console("\n--- Decompilation stopped by user ---", "warning")
+                    self.update_console("\n--- Decompilation stopped ---", "warning")
 
             except Exception as e:
                 self.update_console(f"CRITICAL: {e}", "error")
@@ -911,7 +1562,34 @@ class HDKCommander(tk.Tk):
 
         threading.Thread(target=decompile_thread, daemon=True).start()
 
+    def _decompile_distributed(self, unluac, project_dir, output_dir, on_progress):
+        """Decompile on the build workers when the batch is large enough; None to decompile locally."""
+        options = {'project_dir': project_dir, 'output_dir': output_dir}
+        all_files = find_luac_files(project_dir)
+        batch = self._distributed_batch("decompile", distributed_items("decompile", [project_dir], options), options,
+                                        {'unluac': unluac})
+        if not batch:
+            return None
+        skipped = len(all_files) - len(batch.items)
+        stats = {'success': 0, 'failed': 0, 'skipped': skipped, 'total': len(all_files), 'stopped': False}
+
+        def progress(done, total):
+            failed = sum(1 for error in batch.results.values() if error)
+            on_progress(dict(stats, success=done - failed, failed=failed))
+        batch.on_progress = progress
+        self.luac_batch = batch
+        try:
+            results = batch.run()
+        finally:
+            self.luac_batch = None
+        stats['failed'] = sum(1 for error in results.values() if error)
+        stats['success'] = len(results) - stats['failed']
+        stats['stopped'] = batch.stop_requested
+        return stats
+
     def luac_stop(self):
+        if self.luac_batch:
+            self.luac_batch.stop_requested = True
         if self.luac_is_running:
             self.luac_is_running = False
             self.log("Stopping decompilation...", "warning")
@@ -943,44 +1621,13 @@ class HDKCommander(tk.Tk):
             return
 
         self.log("Exporting directory tree...", "info")
+        sizes, hashes = self.luac_tree_sizes.get(), self.luac_tree_hashes.get()
 
         def export_thread():
             try:
-                base_save = Path(save_path).with_suffix('')
-
-                # TXT (human-readable)
-                txt_path = base_save.with_suffix('.txt')
-                tree_lines = []
-                for root, dirs, files in os.walk(project_dir):
-                    level = root.replace(project_dir, '').count(os.sep)
-                    indent = '    ' * level
-                    tree_lines.append(f'{indent}[DIR] {os.path.basename(root)}/')
-                    sub_indent = '    ' * (level + 1)
-                    for f in sorted(files):
-                        tree_lines.append(f'{sub_indent}{f}')
-                with open(txt_path, 'w', encoding='utf-8') as f:
-                    f.write('\n'.join(tree_lines))
+                txt_path, json_path = export_tree(project_dir, save_path, sizes=sizes, hashes=hashes)
                 self.update_console(f"  Tree (TXT): {txt_path}", "success")
-
-                # JSON (machine-readable)
-                def path_to_dict(p):
-                    d = {'name': os.path.basename(p), 'type': 'directory'}
-                    children_dirs = sorted([
-                        path_to_dict(os.path.join(p, c))
-                        for c in os.listdir(p) if os.path.isdir(os.path.join(p, c))
-                    ], key=lambda x: x['name'])
-                    children_files = sorted([
-                        {'name': c, 'type': 'file'}
-                        for c in os.listdir(p) if os.path.isfile(os.path.join(p, c))
-                    ], key=lambda x: x['name'])
-                    d['children'] = children_dirs + children_files
-                    return d
-
-                json_path = base_save.with_suffix('.json')
-                with open(json_path, 'w', encoding='utf-8') as f:
-                    json.dump(path_to_dict(project_dir), f, indent=4)
                 self.update_console(f"  Tree (JSON): {json_path}", "success")
-
                 self.update_console(">>> TREE EXPORT COMPLETE <<<", "success")
 
             except Exception as e:
@@ -1012,30 +1659,14 @@ class HDKCommander(tk.Tk):
 
         def search_thread():
             try:
-                search_path = Path(target_dir)
-                results = {}
-
-                files_to_search = [p for p in search_path.rglob('*')
-                                   if p.is_file() and p.suffix in ('.lua', '.luac')]
-
-                for file in files_to_search:
-                    try:
-                        with open(file, 'r', encoding='utf-8', errors='ignore') as f:
-                            content = f.read().lower()
-                        found = [(kw, content.count(kw)) for kw in keywords if kw in content]
-                        if found:
-                            results[str(file.relative_to(search_path))] = found
-                    except Exception:
-                        pass
+                results = search_keywords(target_dir, keywords)
 
                 if results:
                     self.update_console("\n--- KEYWORD SEARCH RESULTS ---", "info")
-                    sorted_results = sorted(results.items(),
-                                            key=lambda item: sum(c for _, c in item[1]), reverse=True)
-                    for file_path, matches in sorted_results:
+                    for file_path, matches in results:
                         total = sum(c for _, c in matches)
                         self.update_console(f"\n  {file_path} ({total} matches):", "success")
-                        for kw, count in sorted(matches, key=lambda x: x[1], reverse=True):
+                        for kw, count in matches:
                             self.update_console(f"    '{kw}': {count} times")
                     self.update_console(f"\nFound matches in {len(results)} file(s).", "info")
                 else:
@@ -1056,20 +1687,102 @@ class HDKCommander(tk.Tk):
         ttk.Label(frame, text="Map Tool (Restore File Names)", style="Header.TLabel").pack(anchor="w")
         ttk.Label(frame, text="Recovers original file paths from hash-named archive entries.").pack(anchor="w", pady=(0, 5))
 
-        self.map_full_scan = tk.BooleanVar()
         chk_map = ttk.Checkbutton(frame, text="Use Full Regex Scan (slower, more accurate)", variable=self.map_full_scan)
         chk_map.pack(anchor="w", pady=(0, 3))
 
         uuid_frame = ttk.Frame(frame)
         uuid_frame.pack(fill="x", pady=(0, 5))
         ttk.Label(uuid_frame, text="UUID (for objects only):").pack(side="left")
-        self.map_uuid_var = tk.StringVar(value="")
         uuid_entry = ttk.Entry(uuid_frame, textvariable=self.map_uuid_var, width=45, font=(FONT_MONO, 9))
         uuid_entry.pack(side="left", padx=5)
         ttk.Label(uuid_frame, text="(leave blank for scenes)", foreground="#888888").pack(side="left")
 
+        ttk.Checkbutton(frame, textvariable=self.map_names_label, variable=self.map_use_names).pack(anchor="w", pady=(0, 3))
+
+        map_worker_row = ttk.Frame(frame)
+        map_worker_row.pack(fill="x", pady=(0, 5))
+        ttk.Label(map_worker_row, text="Parallel maps (batch):").pack(side="left")
+        ttk.Scale(map_worker_row, from_=1, to=8, variable=self.map_workers_var,
+                  orient=tk.HORIZONTAL, length=150).pack(side="left", padx=10)
+        map_workers_label = ttk.Label(map_worker_row, text=str(self.map_workers_var.get()))
+        map_workers_label.pack(side="left")
+        self.map_workers_var.trace_add("write", lambda *_: map_workers_label.config(
+            text=str(self.map_workers_var.get())))
+
         btn_map = ttk.Button(frame, text="Map Directory (Renames hashed files)", command=self.map_dialog)
         btn_map.pack(fill="x", pady=5)
+        btn_map_batch = ttk.Button(frame, text="Batch Map (every subfolder of a folder)", command=self.map_batch_dialog)
+        btn_map_batch.pack(fill="x", pady=(0, 5))
+
+        ttk.Separator(frame, orient="horizontal").pack(fill="x", pady=10)
+
+        # ---- OFFLINE PATCH ----
+        ttk.Label(frame, text="Offline Patch (Rewrite URLs in XML / Lua / Text)", style="Header.TLabel").pack(anchor="w")
+        ttk.Label(frame, text="One rule per line:  find => replace   (prefix find with re: for a regex).").pack(anchor="w", pady=(0, 5))
+
+        self.patch_rules_text = tk.Text(frame, height=4, bg="#101010", fg="#00ff00", insertbackground="white",
+                                        font=(FONT_MONO, 9))
+        self.patch_rules_text.pack(fill="x", pady=(0, 5))
+        self.patch_rules_text.insert("1.0", self.patch_rules_var.get())
+        self.patch_rules_text.bind("<KeyRelease>", lambda e: self.patch_rules_var.set(
+            self.patch_rules_text.get("1.0", tk.END).strip()))
+
+        ttk.Checkbutton(frame, text="Incremental (only re-scan files changed since the last patch)",
+                        variable=self.patch_incremental).pack(anchor="w", pady=(0, 3))
+
+        patch_row = ttk.Frame(frame)
+        patch_row.pack(fill="x", pady=5)
+        ttk.Button(patch_row, text="Dry Run (count matches)", command=lambda: self.patch_dialog(dry_run=True)).pack(
+            side="left", fill="x", expand=True, padx=(0, 5))
+        ttk.Button(patch_row, text="Apply Patch to Folder...", command=lambda: self.patch_dialog(dry_run=False)).pack(
+            side="left", fill="x", expand=True)
+
+        ttk.Separator(frame, orient="horizontal").pack(fill="x", pady=10)
+
+        # ---- VERSION DIFF ----
+        ttk.Label(frame, text="Compare Versions (Merkle Diff)", style="Header.TLabel").pack(anchor="w")
+        ttk.Label(frame, text="Lists added / removed / changed files. Unchanged folders are skipped by hash, and\n"
+                  "manifests are cached, so re-comparing only re-hashes files that changed since last time.").pack(anchor="w", pady=(0, 5))
+
+        diff_row = ttk.Frame(frame)
+        diff_row.pack(fill="x", pady=5)
+        ttk.Button(diff_row, text="Compare Two Folders...", command=lambda: self.diff_dialog(archive=False)).pack(
+            side="left", fill="x", expand=True, padx=(0, 5))
+        ttk.Button(diff_row, text="Compare Folder with Archive...", command=lambda: self.diff_dialog(archive=True)).pack(
+            side="left", fill="x", expand=True)
+
+        ttk.Separator(frame, orient="horizontal").pack(fill="x", pady=10)
+
+        # ---- LIBRARY VERIFICATION ----
+        ttk.Label(frame, text="Library Verification", style="Header.TLabel").pack(anchor="w")
+        ttk.Label(frame, text="Checks that every .sdat / .pkg under a folder still extracts (optionally repacks and\n"
+                  "round-trips). Results are journaled, so a stopped or crashed run resumes where it left off.").pack(anchor="w", pady=(0, 5))
+
+        verify_opts = ttk.Frame(frame)
+        verify_opts.pack(fill="x", pady=(0, 3))
+        ttk.Checkbutton(verify_opts, text="Repack + compare (slower)", variable=self.verify_repack).pack(side="left")
+        ttk.Checkbutton(verify_opts, text="Resume from journal", variable=self.verify_resume).pack(side="left", padx=15)
+
+        verify_row = ttk.Frame(frame)
+        verify_row.pack(fill="x", pady=(0, 5))
+        ttk.Label(verify_row, text="Archives in parallel:").pack(side="left")
+        ttk.Scale(verify_row, from_=1, to=8, variable=self.verify_workers_var,
+                  orient=tk.HORIZONTAL, length=150).pack(side="left", padx=10)
+        verify_workers_label = ttk.Label(verify_row, text=str(self.verify_workers_var.get()))
+        verify_workers_label.pack(side="left")
+        self.verify_workers_var.trace_add("write", lambda *_: verify_workers_label.config(
+            text=str(self.verify_workers_var.get())))
+
+        self.verify_progress = ttk.Progressbar(frame, mode='determinate', style="Custom.Horizontal.TProgressbar")
+        self.verify_progress.pack(fill="x", pady=(0, 5))
+
+        verify_btns = ttk.Frame(frame)
+        verify_btns.pack(fill="x", pady=5)
+        self.verify_btn = ttk.Button(verify_btns, text="Verify Library...", command=self.verify_library_dialog)
+        self.verify_btn.pack(side="left", fill="x", expand=True, padx=(0, 5))
+        ttk.Button(verify_btns, text="Stop", command=self.verify_stop, style="Danger.TButton").pack(
+            side="left", fill="x", expand=True)
+        self.verifier = None
 
         ttk.Separator(frame, orient="horizontal").pack(fill="x", pady=10)
 
@@ -1078,7 +1791,6 @@ class HDKCommander(tk.Tk):
 
         algo_frame2 = ttk.Frame(frame)
         algo_frame2.pack(anchor="w", pady=(5, 5))
-        self.tool_compress_algo = tk.StringVar(value="lzma")
         ttk.Label(algo_frame2, text="Algorithm: ").pack(side="left")
         ttk.Radiobutton(algo_frame2, text="LZMA (default)", variable=self.tool_compress_algo, value="lzma").pack(side="left", padx=5)
         ttk.Radiobutton(algo_frame2, text="ZLib", variable=self.tool_compress_algo, value="zlib").pack(side="left", padx=5)
@@ -1087,6 +1799,8 @@ class HDKCommander(tk.Tk):
         btn_comp.pack(fill="x", pady=2)
         btn_decomp = ttk.Button(frame, text="Decompress File", command=lambda: self.compress_dialog("d"))
         btn_decomp.pack(fill="x", pady=2)
+        btn_preview = ttk.Button(frame, text="Preview Decompressed (EdgeZLib, in-app)", command=self.preview_compressed_dialog)
+        btn_preview.pack(fill="x", pady=2)
 
         ttk.Separator(frame, orient="horizontal").pack(fill="x", pady=10)
 
@@ -1097,7 +1811,6 @@ class HDKCommander(tk.Tk):
         type_frame = ttk.Frame(frame)
         type_frame.pack(fill="x", pady=(0, 5))
         ttk.Label(type_frame, text="Type hint (optional):").pack(side="left")
-        self.crypt_type_var = tk.StringVar(value="auto-detect")
         type_combo = ttk.Combobox(type_frame, textvariable=self.crypt_type_var, width=20, state="readonly",
                                    values=["auto-detect", "odc", "xml", "scene-list", "lua", "bar", "pem", "hcdb"])
         type_combo.pack(side="left", padx=5)
@@ -1116,19 +1829,286 @@ class HDKCommander(tk.Tk):
         btn_inspect = ttk.Button(frame, text="Inspect .PKG File (View Metadata)", command=self.inspect_pkg_dialog)
         btn_inspect.pack(fill="x", pady=5)
 
+        ttk.Separator(frame, orient="horizontal").pack(fill="x", pady=10)
+
+        # ---- DISK SPACE ----
+        ttk.Label(frame, text="Disk Space & Scratch Volume", style="Header.TLabel").pack(anchor="w")
+        ttk.Label(frame, text="Extracts and packs estimate their output size first (archive headers, or the folder size\n"
+                  "for packs) and are refused before writing anything if the target drive is too full. With a\n"
+                  "scratch folder on another drive, such jobs write there instead, as do all jobs above the size below.").pack(anchor="w", pady=(0, 5))
+
+        scratch_row = ttk.Frame(frame)
+        scratch_row.pack(fill="x", pady=(0, 3))
+        ttk.Label(scratch_row, text="Scratch folder:").pack(side="left")
+        ttk.Entry(scratch_row, textvariable=self.scratch_dir_var, font=(FONT_MONO, 9)).pack(
+            side="left", fill="x", expand=True, padx=5)
+        ttk.Button(scratch_row, text="Browse...", command=self._browse_scratch_dir).pack(side="left")
+
+        scratch_min_row = ttk.Frame(frame)
+        scratch_min_row.pack(fill="x", pady=(0, 5))
+        ttk.Label(scratch_min_row, text="Always use scratch for jobs over (MB, 0 = only when needed):").pack(side="left")
+        ttk.Spinbox(scratch_min_row, from_=0, to=1048576, increment=1024, width=9,
+                    textvariable=self.scratch_min_var).pack(side="left", padx=5)
+
+        ttk.Separator(frame, orient="horizontal").pack(fill="x", pady=10)
+
+        # ---- RESOURCE GOVERNOR ----
+        ttk.Label(frame, text="Resource Governor (Background Priority)", style="Header.TLabel").pack(anchor="w")
+        support = governor_support()
+        ttk.Label(frame, text="Every hdk / Java / Re-SHARC process starts under its job type's profile, so long batches\n"
+                  "leave the UI and RPCS3 responsive. Nice 0-19 (higher = lower priority), CPUs like 2-7 or 0,2,4\n"
+                  f"(blank = all), memory in MB (0 = no limit). Supported here: I/O priority {'yes' if support['io'] else 'no'}, "
+                  f"CPU affinity {'yes' if support['cpus'] else 'no'}, memory ceiling {support['memory_mb']}.").pack(anchor="w", pady=(0, 5))
+
+        grid = ttk.Frame(frame)
+        grid.pack(anchor="w", pady=(0, 5))
+        for col, title in enumerate(("Job", "Nice", "I/O", "CPUs", "Memory MB")):
+            ttk.Label(grid, text=title, foreground="#888888").grid(row=0, column=col, sticky="w", padx=(0, 10))
+        for row, (kind, variables) in enumerate(self.resource_vars.items(), start=1):
+            ttk.Label(grid, text=kind).grid(row=row, column=0, sticky="w", padx=(0, 10))
+            ttk.Spinbox(grid, from_=0, to=19, width=4, textvariable=variables['nice']).grid(row=row, column=1, sticky="w", padx=(0, 10))
+            ttk.Combobox(grid, textvariable=variables['io'], values=IO_PRIORITIES, width=8, state="readonly").grid(
+                row=row, column=2, sticky="w", padx=(0, 10))
+            ttk.Entry(grid, textvariable=variables['cpus'], width=10).grid(row=row, column=3, sticky="w", padx=(0, 10))
+            ttk.Spinbox(grid, from_=0, to=65536, increment=256, width=7, textvariable=variables['memory_mb']).grid(
+                row=row, column=4, sticky="w")
+
+        governor_btns = ttk.Frame(frame)
+        governor_btns.pack(fill="x", pady=5)
+        ttk.Button(governor_btns, text="Apply Profiles", command=self.apply_resource_profiles).pack(
+            side="left", fill="x", expand=True, padx=(0, 5))
+        ttk.Button(governor_btns, text="Reset to Defaults", command=self.reset_resource_profiles).pack(
+            side="left", fill="x", expand=True)
+
+        ttk.Separator(frame, orient="horizontal").pack(fill="x", pady=10)
+
+        # ---- BUILD WORKERS ----
+        ttk.Label(frame, text="Build Workers (Distributed Batches)", style="Header.TLabel").pack(anchor="w")
+        ttk.Label(frame, text="Start `hdk_launcher.py --headless worker --host 0.0.0.0 --token <secret>` on other machines,\n"
+                  f"then list them here as host:port (comma-separated). Auto-Optimize and LUAC batches of {DISTRIBUTE_MIN_ITEMS}+\n"
+                  "files are split across them. Files are streamed unless every machine sees the same paths (shared\n"
+                  "storage, which workers only accept for folders given with --shared-root).").pack(
+            anchor="w", pady=(0, 5))
+
+        workers_row = ttk.Frame(frame)
+        workers_row.pack(fill="x", pady=(0, 3))
+        ttk.Label(workers_row, text="Workers:").pack(side="left")
+        ttk.Entry(workers_row, textvariable=self.workers_var, font=(FONT_MONO, 9)).pack(
+            side="left", fill="x", expand=True, padx=5)
+        ttk.Label(workers_row, text="Token:").pack(side="left")
+        ttk.Entry(workers_row, textvariable=self.worker_token_var, show="*", width=14).pack(side="left", padx=5)
+
+        workers_opts = ttk.Frame(frame)
+        workers_opts.pack(fill="x", pady=(0, 3))
+        ttk.Checkbutton(workers_opts, text="Send large batches to workers", variable=self.use_workers).pack(side="left")
+        ttk.Checkbutton(workers_opts, text="Shared storage (same paths everywhere)",
+                        variable=self.worker_shared).pack(side="left", padx=10)
+        ttk.Button(frame, text="Check Workers", command=self.check_workers).pack(fill="x", pady=5)
+
+    def _browse_scratch_dir(self):
+        folder = filedialog.askdirectory(title="Select Scratch Folder (ideally on another drive)")
+        if folder:
+            self.scratch_dir_var.set(folder)
+            self.log(f"Scratch folder set to: {folder} ({format_size(free_space(folder))} free)", "info")
+            self._save_settings()
+
+    def _scratch_min_mb(self):
+        try:
+            return max(0, int(self.scratch_min_var.get()))
+        except tk.TclError:
+            return 0
+
+    def _preflight_then(self, kind, source, output, proceed):
+        """Check disk space for an extract / pack off the UI thread, then call proceed(output path) on the UI
+        thread. The output moves to the scratch folder when needed; if nothing fits, offer to retry later."""
+        settings = {'scratch_dir': self.scratch_dir_var.get().strip(), 'scratch_min_mb': self._scratch_min_mb()}
+        self.log(f"Checking disk space for {os.path.basename(source)}...", "info")
+
+        def check_thread():
+            try:
+                path, check = preflight(kind, source, output, settings, log=self.update_console)
+            except DiskSpaceError as e:
+                message = str(e)
+
+                def ask():
+                    if messagebox.askretrycancel("Not Enough Disk Space",
+                                                 f"{message}\n\nFree up space (or set a scratch folder under Advanced Tools), "
+                                                 "then Retry."):
+                        self._preflight_then(kind, source, output, proceed)
+                    else:
+                        self.log(f"Cancelled: {message}", "error")
+                self.after(0, ask)
+                return
+            except OSError as e:
+                self.update_console(f"Disk space check failed ({e}) — continuing without it.", "warning")
+                path, check = output, None
+            if check:
+                self.update_console(f"Estimated output {format_size(check['needed'])} ({check['method']}), "
+                                    f"{format_size(check['free'])} free.", "info")
+            self.after(0, lambda: proceed(path))
+
+        threading.Thread(target=check_thread, daemon=True).start()
+
+    def _worker_addresses(self):
+        try:
+            return parse_worker_addresses(self.workers_var.get())
+        except ValueError:
+            self.update_console(f"Invalid worker list: {self.workers_var.get()} (expected host:port, ...)", "error")
+            return []
+
+    def _distributed_batch(self, kind, items, options, tools):
+        """A DistributedBatch for `items` when build workers are enabled and the batch is large enough, else None."""
+        addresses = self._worker_addresses() if self.use_workers.get() else []
+        if not addresses or len(items) < DISTRIBUTE_MIN_ITEMS:
+            return None
+        return DistributedBatch(kind, items, addresses, options, token=self.worker_token_var.get(),
+                                shared=self.worker_shared.get(), tools=tools, log=self.update_console)
+
+    def check_workers(self):
+        addresses = self._worker_addresses()
+        if not addresses:
+            messagebox.showinfo("Build Workers", "Enter at least one worker address (host:port).")
+            return
+        self._save_settings()
+        token = self.worker_token_var.get()
+        self.log(f"Checking {len(addresses)} build worker(s)...", "info")
+
+        def probe_thread():
+            for key, info in probe_workers(addresses, token).items():
+                if info.get('ok'):
+                    self.update_console(f"  {key}: {info['name']} ({info['platform']}), {info['capacity']} slot(s), "
+                                        f"runs {', '.join(info['kinds']) or 'nothing (no tools set up)'}; "
+                                        f"{info['done']} done / {info['failed']} failed so far", "success")
+                else:
+                    self.update_console(f"  {key}: unavailable — {info.get('error')}", "error")
+        threading.Thread(target=probe_thread, daemon=True).start()
+
+    def _resource_profile_overrides(self):
+        """Profile values that differ from DEFAULT_RESOURCE_PROFILES (what gets saved to settings)."""
+        overrides = {}
+        for kind, variables in self.resource_vars.items():
+            changed = {}
+            for key, var in variables.items():
+                try:
+                    value = var.get()
+                except tk.TclError:
+                    continue  # half-typed number in a spinbox
+                if value != DEFAULT_RESOURCE_PROFILES[kind][key]:
+                    changed[key] = value
+            if changed:
+                overrides[kind] = changed
+        return overrides
+
+    def apply_resource_profiles(self):
+        for kind, variables in self.resource_vars.items():
+            cpus = variables['cpus'].get().strip()
+            if cpus and not re.fullmatch(r"\d+(-\d+)?(,\d+(-\d+)?)*", cpus.replace(" ", "")):
+                messagebox.showerror("Invalid CPU List", f"{kind}: '{cpus}' is not a CPU list like 0-3 or 0,2,4.")
+                return
+        set_resource_profiles(self._resource_profile_overrides())
+        self._save_settings()
+        self.log("Resource profiles applied to new tool processes.", "success")
+
+    def reset_resource_profiles(self):
+        for kind, variables in self.resource_vars.items():
+            for key, var in variables.items():
+                var.set(DEFAULT_RESOURCE_PROFILES[kind][key])
+        self.apply_resource_profiles()
+
     def map_dialog(self):
         if not self._check_binary_ready(self.hdk_path_var, "HDK"): return
         target_dir = filedialog.askdirectory(title="Select Directory to Map")
         if not target_dir: return
 
-        cmd = ["map", "-i", target_dir]
-        uuid_val = self.map_uuid_var.get().strip()
-        if uuid_val:
-            cmd.extend(["-u", uuid_val])
+        self.log("-" * 60)
         if self.map_full_scan.get():
-            cmd.append("--full")
             self.log("Note: Full regex scan enabled. This may take longer.", "info")
-        self.run_hdk_command(cmd)
+
+        options = (self.map_full_scan.get(), self.map_uuid_var.get().strip(), self.map_use_names.get())
+        threading.Thread(target=lambda: self._map_folder(target_dir, *options, verbose=True), daemon=True).start()
+
+    def map_batch_dialog(self):
+        if not self._check_binary_ready(self.hdk_path_var, "HDK"): return
+        parent_dir = filedialog.askdirectory(title="Select Folder Containing Extracted Folders")
+        if not parent_dir: return
+
+        folders = sorted(os.path.join(parent_dir, d) for d in os.listdir(parent_dir)
+                         if os.path.isdir(os.path.join(parent_dir, d)))
+        if not folders:
+            messagebox.showinfo("No Folders Found", f"No subfolders found in:\n{parent_dir}")
+            return
+
+        workers = max(1, int(self.map_workers_var.get()))
+        options = (self.map_full_scan.get(), self.map_uuid_var.get().strip(), self.map_use_names.get())
+        self.log("=" * 60, "info")
+        self.log(f"Batch Map: {len(folders)} folder(s), {workers} at a time...", "info")
+        self._save_settings()
+
+        def batch_thread():
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(lambda d: self._map_folder(d, *options), folders))
+            ok = sum(1 for r in results if r)
+            tag = "success" if ok == len(folders) else "warning"
+            self.update_console(f"\n>>> BATCH MAP COMPLETE — {ok}/{len(folders)} folders OK, "
+                                f"{len(self.name_dict)} names known <<<", tag)
+
+        threading.Thread(target=batch_thread, daemon=True).start()
+
+    def _map_folder(self, target_dir, full_scan, uuid_val, use_names, verbose=False):
+        try:
+            ok = map_folder(self.hdk_path_var.get(), target_dir, self.name_dict, full_scan, uuid_val, use_names,
+                            log=self.update_console, verbose=verbose)
+        except FileNotFoundError:
+            self.update_console("CRITICAL: Executable not found at the configured path!", "error")
+            return False
+        except Exception as e:
+            self.update_console(f"[{os.path.basename(target_dir)}] CRITICAL ERROR: {e}", "error")
+            return False
+        self.after(0, lambda: self.map_names_label.set(
+            f"Apply learned names first ({len(self.name_dict)} known hashes)"))
+        return ok
+
+    def patch_dialog(self, dry_run):
+        initial_dir = None
+        pack_input = self.pack_input_var.get()
+        if pack_input != "No folder selected" and os.path.isdir(pack_input):
+            initial_dir = pack_input
+        target_dir = filedialog.askdirectory(title="Select Folder to Patch", initialdir=initial_dir)
+        if not target_dir: return
+
+        rules_text = self.patch_rules_var.get()
+        try:
+            parse_patch_rules(rules_text)
+        except (ValueError, re.error) as e:
+            messagebox.showerror("Invalid Rules", str(e))
+            return
+
+        incremental = self.patch_incremental.get()
+        self._save_settings()
+        self.log("=" * 60, "info")
+        self.log(f"OFFLINE PATCH{' (dry run)' if dry_run else ''}: {target_dir}", "info")
+
+        def patch_thread():
+            started = time.perf_counter()
+            try:
+                summary = patch_tree(target_dir, rules_text, dry_run=dry_run, incremental=incremental)
+            except Exception as e:
+                self.update_console(f"Patch failed: {e}", "error")
+                return
+
+            for rel, count in sorted(summary['changed']):
+                self.update_console(f"  {'Would patch' if dry_run else 'Patched'}: {rel} ({count} replacement(s))")
+            for rel, error in summary['errors']:
+                self.update_console(f"  Error: {rel} — {error}", "error")
+            for label, total in summary['rules']:
+                self.update_console(f"  Rule [{label}]: {total} match(es)", "info")
+            elapsed = time.perf_counter() - started
+            self.update_console(
+                f"\n>>> PATCH {'DRY RUN ' if dry_run else ''}COMPLETE — {len(summary['changed'])} file(s) "
+                f"{'would change' if dry_run else 'changed'}, {summary['scanned']} scanned, "
+                f"{summary['skipped']} unchanged since last patch ({elapsed:.2f}s) <<<", "success")
+
+        threading.Thread(target=patch_thread, daemon=True).start()
 
     def compress_dialog(self, mode):
         if not self._check_binary_ready(self.hdk_path_var, "HDK"): return
@@ -1144,9 +2124,143 @@ class HDKCommander(tk.Tk):
         if not out_f: return
 
         algo = self.tool_compress_algo.get()
+        if mode == "d" and algo == "zlib":
+            self._decompress_edgezlib(f, out_f)
+            return
+
         cmd = ["compress", mode, "-a", algo, "-i", f, "-o", out_f]
         self.run_hdk_command(cmd)
 
+    def _decompress_edgezlib(self, f, out_f):
+        """Decode in-process on a thread pool; hand anything we can't parse to hdk."""
+        self.log("-" * 60)
+        self.log(f"EdgeZLib decode ({DECODE_WORKERS} threads): {os.path.basename(f)}")
+
+        def target():
+            started = time.perf_counter()
+            try:
+                written = edgezlib_decompress_file(f, out_f)
+            except ArchiveFormatError as e:
+                self.update_console(f"In-app decoder: {e} — falling back to hdk.", "warning")
+                self.after(0, lambda: self.run_hdk_command(["compress", "d", "-a", "zlib", "-i", f, "-o", out_f]))
+                return
+            except OSError as e:
+                self.update_console(f"CRITICAL ERROR: {e}", "error")
+                return
+            elapsed = time.perf_counter() - started
+            self.update_console(f"Decoded {format_size(written)} in {elapsed:.2f}s → {out_f}")
+            self.update_console("\n>>> SUCCESS <<<", "success")
+
+        threading.Thread(target=target, daemon=True).start()
+
+    def preview_compressed_dialog(self):
+        f = filedialog.askopenfilename(title="Select EdgeZLib-compressed file to preview")
+        if not f: return
+
+        def target():
+            try:
+                data = edgezlib_preview(f)
+            except (ArchiveFormatError, OSError) as e:
+                self.update_console(f"Preview failed: {e}", "error")
+                return
+            self.after(0, lambda: self._show_text_window(f"Preview — {os.path.basename(f)}", format_preview(data)))
+
+        threading.Thread(target=target, daemon=True).start()
+
+    def _show_text_window(self, title, text):
+        win = tk.Toplevel(self)
+        win.title(title)
+        win.geometry("900x600")
+        win.configure(bg="#1e1e1e")
+        view = scrolledtext.ScrolledText(win, wrap=tk.NONE, bg="#101010", fg="#e0e0e0", font=(FONT_MONO, 9))
+        view.pack(fill="both", expand=True, padx=5, pady=5)
+        view.insert(tk.END, text)
+        view.config(state=tk.DISABLED)
+
+    def diff_dialog(self, archive):
+        if archive and not self._check_binary_ready(self.hdk_path_var, "HDK"): return
+        old_path = filedialog.askdirectory(title="Select Original (Old) Folder")
+        if not old_path: return
+        if archive:
+            new_path = filedialog.askopenfilename(title="Select Repacked Archive", filetypes=[
+                ("All Home Files", "*.sdat *.bar *.sharc *.pkg"), ("All Files", "*.*")])
+        else:
+            new_path = filedialog.askdirectory(title="Select New Folder")
+        if not new_path: return
+
+        hdk_path = self.hdk_path_var.get()
+        self.log("=" * 60, "info")
+        self.log(f"DIFF: {old_path}  →  {new_path}", "info")
+
+        def diff_thread():
+            started = time.perf_counter()
+            try:
+                old = manifest_for(old_path, hdk_path, log=self.update_console)
+                new = manifest_for(new_path, hdk_path, log=self.update_console)
+                diff = diff_manifests(old, new)
+            except Exception as e:
+                self.update_console(f"Diff failed: {e}", "error")
+                return
+            for manifest in (old, new):
+                stats = manifest.get('stats', {})
+                self.update_console(f"  {os.path.basename(manifest['root'])}: {stats.get('files', 0)} files, "
+                                    f"{stats.get('hashed', 0)} hashed, {stats.get('reused', 0)} reused from cache")
+            tag = "success" if diff['identical'] else "warning"
+            self.update_console(f">>> DIFF COMPLETE in {time.perf_counter() - started:.1f}s — "
+                                f"{len(diff['added'])} added, {len(diff['removed'])} removed, "
+                                f"{len(diff['changed'])} changed <<<", tag)
+            report = format_diff(diff, old_path, new_path)
+            self.after(0, lambda: self._show_text_window("Version Diff", report))
+
+        threading.Thread(target=diff_thread, daemon=True).start()
+
+    def verify_library_dialog(self):
+        if not self._check_binary_ready(self.hdk_path_var, "HDK"): return
+        if self.verifier is not None:
+            messagebox.showwarning("Busy", "A verification run is already in progress.")
+            return
+        library = filedialog.askdirectory(title="Select Library Folder (.sdat / .pkg)")
+        if not library: return
+
+        workers = max(1, int(self.verify_workers_var.get()))
+        self._save_settings()
+        self.log("=" * 60, "info")
+        self.log(f"VERIFY LIBRARY: {library} ({workers} in parallel"
+                 f"{', repack + compare' if self.verify_repack.get() else ''})", "info")
+
+        def on_progress(done, total):
+            self.after(0, lambda: self.verify_progress.config(maximum=max(total, 1), value=done))
+
+        self.verifier = LibraryVerifier(self.hdk_path_var.get(), library, repack=self.verify_repack.get(),
+                                        workers=workers, resume=self.verify_resume.get(),
+                                        log=self.update_console, on_progress=on_progress)
+        self.verify_btn.config(state='disabled')
+
+        def verify_thread():
+            try:
+                summary = self.verifier.run()
+                tag = "success" if not summary['failures'] and not summary['stopped'] else "warning"
+                state = "STOPPED" if summary['stopped'] else "COMPLETE"
+                self.update_console(f"\n>>> VERIFY {state} — {summary['verified']} OK, {summary['failed']} failed, "
+                                    f"{summary['skipped']} from journal ({summary['total']} total) <<<", tag)
+                for rel in summary['failures']:
+                    self.update_console(f"  Failed: {rel}", "error")
+                self.update_console(f"Journal: {summary['journal']}", "info")
+            except Exception as e:
+                self.update_console(f"CRITICAL: {e}", "error")
+            finally:
+                self.verifier = None
+                self.after(0, lambda: self.verify_btn.config(state='normal'))
+
+        threading.Thread(target=verify_thread, daemon=True).start()
+
+    def verify_stop(self):
+        if self.verifier is not None:
+            self.verifier.stop_requested = True
+            self.log("Stopping verification after the running archives finish...", "warning")
+        else:
+            self.log("No verification in progress.", "info")
+
     def crypt_dialog(self, mode):
         if not self._check_binary_ready(self.hdk_path_var, "HDK"): return
         f = filedialog.askopenfilename()
@@ -1164,7 +2278,133 @@ class HDKCommander(tk.Tk):
         self.run_hdk_command(["pkg", "i", f])
 
     # =========================================================================
-    # TAB 6: ENCYCLOPEDIA
+    # TAB 6: DASHBOARD
+    # =========================================================================
+    def _build_dashboard_tab(self, parent):
+        frame = self._make_scrollable_tab(parent)
+
+        ttk.Label(frame, text="Performance Dashboard", style="Header.TLabel").pack(anchor="w")
+        ttk.Label(frame, text="Every batch job and every hdk / resharc / java process records its wall and CPU time, peak memory,\n"
+                  f"bytes in / out and exit code to {TELEMETRY_FILE}. Select an operation to see its recent runs.",
+                  foreground="#888888").pack(anchor="w", pady=(0, 10))
+
+        btn_row = ttk.Frame(frame)
+        btn_row.pack(fill="x", pady=(0, 5))
+        ttk.Button(btn_row, text="Refresh", command=self.dashboard_refresh).pack(side="left")
+        ttk.Button(btn_row, text="Clear Metrics", command=self.dashboard_clear).pack(side="left", padx=5)
+        self.dashboard_status = ttk.Label(btn_row, text="", foreground="#888888")
+        self.dashboard_status.pack(side="left", padx=10)
+
+        table_frame = ttk.Frame(frame)
+        table_frame.pack(fill="x")
+        columns = ("op", "runs", "failed", "mean", "total", "throughput", "ratio", "rss", "last")
+        self.dashboard_tree = ttk.Treeview(table_frame, columns=columns, show="headings", height=12, selectmode="browse")
+        for col, label, width in [("op", "Operation", 230), ("runs", "Runs", 50), ("failed", "Failed", 55),
+                                  ("mean", "Mean", 70), ("total", "Total", 75), ("throughput", "Throughput", 100),
+                                  ("ratio", "Out/In", 60), ("rss", "Peak RSS", 80), ("last", "Last Run", 140)]:
+            self.dashboard_tree.heading(col, text=label)
+            self.dashboard_tree.column(col, width=width, anchor="w")
+        scroll = ttk.Scrollbar(table_frame, orient="vertical", command=self.dashboard_tree.yview)
+        self.dashboard_tree.configure(yscrollcommand=scroll.set)
+        self.dashboard_tree.pack(side="left", fill="x", expand=True)
+        scroll.pack(side="right", fill="y")
+        self.dashboard_tree.bind("<<TreeviewSelect>>", lambda e: self._draw_dashboard_trend())
+
+        ttk.Label(frame, text="Trend (wall time of recent runs, red = failed)", style="SubHeader.TLabel").pack(anchor="w", pady=(10, 5))
+        self.dashboard_canvas = tk.Canvas(frame, height=160, bg="#101010", highlightthickness=0)
+        self.dashboard_canvas.pack(fill="x")
+        self.dashboard_summary = {}
+        self.dashboard_refresh()
+
+        ttk.Separator(frame, orient="horizontal").pack(fill="x", pady=10)
+        ttk.Label(frame, text="Tracing & Profiling", style="SubHeader.TLabel").pack(anchor="w", pady=(0, 5))
+        ttk.Label(frame, text="Record spans for UI callbacks, jobs, worker tasks, child processes and folder walks, then export\n"
+                  "a Chrome trace (open in chrome://tracing or ui.perfetto.dev). Off by default — it costs a little per callback.",
+                  foreground="#888888").pack(anchor="w", pady=(0, 5))
+        trace_row = ttk.Frame(frame)
+        trace_row.pack(fill="x", pady=(0, 5))
+        self.trace_btn = ttk.Button(trace_row, text="Start Trace", command=self.trace_toggle, width=24)
+        self.trace_btn.pack(side="left")
+        ttk.Button(trace_row, text="Profile Next Job (cProfile)", command=self.profile_next).pack(side="left", padx=5)
+
+    def dashboard_refresh(self):
+        self.dashboard_status.config(text="Loading...")
+
+        def load_thread():
+            records = load_telemetry()
+            summary = summarize_telemetry(records)
+            self.after(0, lambda: self._show_dashboard(summary, len(records)))
+
+        threading.Thread(target=load_thread, daemon=True).start()
+
+    def _show_dashboard(self, summary, record_count):
+        self.dashboard_summary = summary
+        tree = self.dashboard_tree
+        tree.delete(*tree.get_children())
+        for key, row in sorted(summary.items(), key=lambda item: -item[1]['wall']):
+            tree.insert("", "end", iid=key, values=(
+                key, row['runs'], row['failed'], f"{row['mean_wall']:.2f}s", f"{row['wall']:.1f}s",
+                format_rate(row['throughput']),
+                f"{row['mean_ratio']:.2f}" if row['mean_ratio'] else "—",
+                format_size(row['peak_rss']) if row['peak_rss'] else "—", row['last'] or ""))
+        self.dashboard_status.config(text=f"{record_count} records, {len(summary)} operations")
+        self._draw_dashboard_trend()
+
+    def _draw_dashboard_trend(self):
+        canvas = self.dashboard_canvas
+        canvas.delete("all")
+        selection = self.dashboard_tree.selection()
+        row = self.dashboard_summary.get(selection[0]) if selection else None
+        if not row or not row['trend']:
+            canvas.create_text(10, 10, anchor="nw", fill="#888888", text="Select an operation above.")
+            return
+        canvas.update_idletasks()
+        width, height = max(canvas.winfo_width(), 200), int(canvas['height'])
+        longest = max(wall for _, wall, _ in row['trend']) or 1
+        bar = (width - 20) / len(row['trend'])
+        for i, (ts, wall, ok) in enumerate(row['trend']):
+            top = height - 20 - (height - 40) * wall / longest
+            canvas.create_rectangle(10 + i * bar + 1, top, 10 + (i + 1) * bar - 1, height - 20,
+                                    fill="#44ff44" if ok else "#ff4444", outline="")
+        canvas.create_text(10, 5, anchor="nw", fill="#888888", text=f"max {longest:.2f}s")
+        canvas.create_text(10, height - 5, anchor="sw", fill="#888888", text=row['trend'][0][0] or "")
+        canvas.create_text(width - 10, height - 5, anchor="se", fill="#888888", text=row['trend'][-1][0] or "")
+
+    def trace_toggle(self):
+        if not tracing_active():
+            start_tracing()
+            self.trace_btn.config(text="Stop & Export Trace...")
+            self.log("Tracing started. Run the slow operation, then stop and export.", "info")
+            return
+        tracer = stop_tracing()
+        self.trace_btn.config(text="Start Trace")
+        path = filedialog.asksaveasfilename(title="Save Chrome Trace", defaultextension=".json",
+                                            initialfile=f"hdk-trace-{time.strftime('%Y%m%d-%H%M%S')}.json",
+                                            filetypes=[("Chrome Trace", "*.json")])
+        if not path:
+            self.log("Trace discarded.", "warning")
+            return
+        count = tracer.export(path)
+        self.log(f"Trace saved: {path} ({count} events) — open it in ui.perfetto.dev or chrome://tracing.", "success")
+
+    def profile_next(self):
+        def on_done(path, top):
+            self.update_console(f"Profile saved: {path}", "success")
+            self.update_console(top)
+
+        profile_next_job(on_done=on_done)
+        self.log("The next job (compress, decompile, build, verify...) will run under cProfile.", "info")
+
+    def dashboard_clear(self):
+        if not messagebox.askyesno("Clear Metrics", "Delete all recorded performance metrics?"):
+            return
+        for path in (TELEMETRY_FILE, TELEMETRY_FILE + ".1"):
+            if os.path.exists(path):
+                os.remove(path)
+        self.dashboard_refresh()
+
+    # =========================================================================
+    # TAB 7: ENCYCLOPEDIA
     # =========================================================================
     def _build_help_tab(self, parent):
         frame = ttk.Frame(parent, padding=10)
@@ -1273,13 +2513,6 @@ class HDKCommander(tk.Tk):
     # =========================================================================
     # CORE UTILITIES
     # =========================================================================
-    def _get_startupinfo(self):
-        if IS_WINDOWS:
-            si = subprocess.STARTUPINFO()
-            si.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-            return si
-        return None
-
     def _browse_exe(self, name, path_var):
         if IS_WINDOWS:
             ftypes = [("Executable", "*.exe"), ("All Files", "*.*")]
@@ -1305,6 +2538,7 @@ class HDKCommander(tk.Tk):
             path_var.set(f)
             self.log(f"{name} binary set to: {f}", "info")
             self._save_settings()
+            self.recheck_tools(refresh=False)
 
     def _browse_jar(self):
         f = filedialog.askopenfilename(
@@ -1315,6 +2549,7 @@ class HDKCommander(tk.Tk):
             self.unluac_path_var.set(f)
             self.log(f"Unluac JAR set to: {f}", "info")
             self._save_settings()
+            self.recheck_tools(refresh=False)
 
     def select_project(self):
         path = filedialog.askdirectory()
@@ -1325,6 +2560,10 @@ class HDKCommander(tk.Tk):
 
     def _check_binary_ready(self, path_var, label):
         path = path_var.get()
+        if path == "Searching...":
+            messagebox.showinfo("Please Wait",
+                f"Still detecting the {label} binary - try again in a moment.")
+            return False
         if not path or "NOT FOUND" in path:
             messagebox.showerror("Configuration Error",
                 f"{label} binary not found!\n\nPlease click 'Change...' at the top to locate it.")
@@ -1333,9 +2572,16 @@ class HDKCommander(tk.Tk):
             messagebox.showerror("Configuration Error",
                 f"{label} binary path is invalid:\n{path}\n\nPlease click 'Change...' to re-locate it.")
             return False
+        # Cached health check: no extra process, just what the last probe found
+        key = {"HDK": "hdk", "Re-SHARC": "resharc"}.get(label)
+        record = self.tool_health.get(key)
+        if record and record['path'] == os.path.realpath(path) and not record['ok']:
+            return messagebox.askyesno("Tool Health Check",
+                f"{tool_problem(self.tool_health, key)}\n\n"
+                "Jobs will probably fail. Run anyway?")
         return True
 
-    def run_hdk_command(self, args, input_file=None):
+    def run_hdk_command(self, args, input_file=None, on_success=None, on_done=None):
         hdk_path = self.hdk_path_var.get()
         full_cmd = [hdk_path] + args
         self.log("-" * 60)
@@ -1343,40 +2589,31 @@ class HDKCommander(tk.Tk):
 
         def target():
             try:
-                startupinfo = self._get_startupinfo()
-                stdin_val = subprocess.PIPE if input_file else None
                 input_data = None
-
                 if input_file:
-                    self.log(f"Piping input file: {input_file}")
+                    self.update_console(f"Piping input file: {input_file}")
                     with open(input_file, 'rb') as f:
                         input_data = f.read()
 
-                process = subprocess.Popen(
-                    full_cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    stdin=stdin_val,
-                    text=False,
-                    startupinfo=startupinfo
-                )
-
-                stdout, stderr = process.communicate(input=input_data)
-                out_str = stdout.decode('utf-8', errors='ignore')
-                err_str = stderr.decode('utf-8', errors='ignore')
+                returncode, out_str, err_str = run_with_progress(full_cmd, input_data, label=f"hdk {' '.join(args[:2])}")
 
                 if out_str.strip(): self.update_console(out_str)
                 if err_str.strip(): self.update_console("LOG: " + err_str)
 
-                if process.returncode == 0:
+                if returncode == 0:
                     self.update_console("\n>>> SUCCESS <<<", "success")
+                    if on_success:
+                        on_success()
                 else:
-                    self.update_console(f"\n!!! FAILED (Code {process.returncode}) !!!", "error")
+                    self.update_console(f"\n!!! FAILED (Code {returncode}) !!!", "error")
 
             except FileNotFoundError:
                 self.update_console("CRITICAL: Executable not found at the configured path!", "error")
             except Exception as e:
                 self.update_console(f"CRITICAL ERROR: {str(e)}", "error")
+            finally:
+                if on_done:
+                    on_done()
 
         threading.Thread(target=target, daemon=True).start()
 